@@ -0,0 +1,104 @@
+# === accounts.py ===
+# Creating accounts: the user row, one progress row per skill in the registry
+# and one daily row per challenge. /register and `flask provision-users` go
+# through the same provision_users(), which runs one transaction of set-based
+# statements whether it creates one account or a whole team. With
+# DATABASE_SHARDS, provision_sharded() does the same across the directory
+# database and the shards (see db.ShardRouter).
+import json
+
+import challenges
+import skills
+from db import transaction
+
+INSERT_USER_SQL = "INSERT OR IGNORE INTO users (username, password, timezone) VALUES (?, ?, ?)"
+# A shard's copy of the account; the password stays in the directory
+SHARD_USER_SQL = "INSERT INTO users (id, username, password, timezone) VALUES (?, ?, '', ?)"
+
+
+def _values(rows):
+    """``(VALUES (?, ?), ...)`` placeholders and the flattened parameters for ``rows``."""
+    sql = ", ".join("(" + ", ".join("?" * len(row)) + ")" for row in rows)
+    return sql, [value for row in rows for value in row]
+
+
+_skill_rows, _skill_params = _values([(position, skill.name, skill.category)
+                                      for position, skill in enumerate(skills.SKILLS)])
+_challenge_rows, _challenge_params = _values([(challenge,) for challenge in challenges.DAILY_CHALLENGES])
+
+
+def _progress_sql(new_users):
+    # Skills in registry order within each user, so progress ids keep the display order
+    return f'''
+        INSERT INTO progress (user_id, skill, category)
+        SELECT u.id, s.column2, s.column3
+        FROM users u, (VALUES {_skill_rows}) s
+        WHERE {new_users}
+        ORDER BY u.id, s.column1
+    '''
+
+
+def _daily_sql(new_users):
+    return f'''
+        INSERT INTO daily (user_id, challenge)
+        SELECT u.id, c.column1 FROM users u, (VALUES {_challenge_rows}) c
+        WHERE {new_users}
+    '''
+
+
+PROGRESS_SQL, DAILY_SQL = _progress_sql("u.id > ?"), _daily_sql("u.id > ?")
+# Ids allocated by the directory reach a shard in no particular order, so shards name them
+_ID_LIST = "u.id IN (SELECT value FROM json_each(?))"
+SHARD_PROGRESS_SQL, SHARD_DAILY_SQL = _progress_sql(_ID_LIST), _daily_sql(_ID_LIST)
+
+
+def provision_users(conn, accounts):
+    """Create ``accounts``, an iterable of ``(username, password_hash, timezone)``, in one transaction.
+
+    Usernames that are already taken are skipped. Returns ``{username: user_id}``
+    for the accounts that were created.
+    """
+    with transaction(conn):
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+        conn.executemany(INSERT_USER_SQL, accounts)
+        # users.id is AUTOINCREMENT and this transaction holds the writer lock,
+        # so the accounts just created are exactly those above last_id
+        conn.execute(PROGRESS_SQL, _skill_params + [last_id])
+        conn.execute(DAILY_SQL, _challenge_params + [last_id])
+        return dict(conn.execute("SELECT username, id FROM users WHERE id > ?", (last_id,)))
+
+
+def provision_sharded(router, accounts):
+    """provision_users() for a sharded ``db.ShardRouter``. Same arguments and result.
+
+    The directory allocates the ids (and rejects taken usernames) in one
+    transaction, then each shard receives its new users in one more.
+    """
+    accounts = list(accounts)
+    directory = router.directory.connection()
+    with transaction(directory):
+        last_id = directory.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+        directory.executemany(INSERT_USER_SQL, accounts)
+        created = dict(directory.execute("SELECT username, id FROM users WHERE id > ?", (last_id,)))
+
+    timezones = {}
+    for username, _, timezone in accounts:
+        timezones.setdefault(username, timezone)
+    by_shard = {}
+    for username, user_id in created.items():
+        by_shard.setdefault(router.shard_index(user_id), []).append((user_id, username, timezones[username]))
+    try:
+        for index, users in by_shard.items():
+            conn = router.shards[index].connection()
+            ids = json.dumps([user_id for user_id, _, _ in users])
+            with transaction(conn):
+                conn.executemany(SHARD_USER_SQL, users)
+                conn.execute(SHARD_PROGRESS_SQL, _skill_params + [ids])
+                conn.execute(SHARD_DAILY_SQL, _challenge_params + [ids])
+    except BaseException:
+        # An account without its rows cannot be used; free the usernames. Rows
+        # already written to other shards belong to ids that are never reused.
+        with transaction(directory):
+            directory.executemany("DELETE FROM users WHERE id = ?", ((user_id,) for user_id in created.values()))
+        raise
+    return created
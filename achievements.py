@@ -0,0 +1,203 @@
+# === achievements.py ===
+# Title and badge unlock rules, compiled from titles.json and badges.json.
+#
+# Every rule is "input >= threshold", where the input is one number about a
+# user:
+#   ("skill", name)         the level of one skill       titles.json, and badges with {"skill", "level"}
+#   ("category", name)      sum of the category's levels badges with {"category", "level"}
+#   ("total", None)         sum of all skill levels      badges with {"total_level"}
+#   ("streak", challenge)   days in a row a daily        badges with {"challenge", "streak"}
+#                           challenge was completed
+#
+# RuleIndex keeps the rules of each input sorted by threshold. A write that
+# moves an input from A to B only looks at the rules with A < threshold <= B
+# (a bisect), so the cost of a grant does not depend on how many rules exist.
+# Unlocks are kept in the `unlocks` table: earned once, kept even if the
+# level later drops. sync() evaluates every rule for every user, to backfill
+# existing accounts and pick up rules added to the JSON files.
+import hashlib
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import groupby
+
+import challenges
+from db import transaction
+from skills import SKILL_TO_CATEGORY
+
+Rule = namedtuple("Rule", "kind name input threshold")
+
+UNLOCK_SQL = "INSERT OR IGNORE INTO unlocks (user_id, kind, name, unlocked_at) VALUES (?, ?, ?, ?)"
+CATEGORY_LEVELS_SQL = "SELECT category, SUM(level) FROM progress WHERE user_id = ? GROUP BY category"
+STREAK_DAYS_SQL = "SELECT day FROM challenge_log WHERE user_id = ? AND challenge = ? AND day >= ? ORDER BY day"
+
+
+class Thresholds:
+    """Items sorted by the value they require, searchable with bisect."""
+
+    def __init__(self, pairs):
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        self.levels = [level for level, _ in pairs]
+        self.items = [item for _, item in pairs]
+
+    def up_to(self, level):
+        return self.items[:bisect_right(self.levels, level)]
+
+    def between(self, old_level, new_level):
+        """Items with ``old_level < required <= new_level``."""
+        if new_level <= old_level:
+            return []
+        return self.items[bisect_right(self.levels, old_level):bisect_right(self.levels, new_level)]
+
+
+def badge_input(condition):
+    """``(input, threshold)`` for a badges.json ``unlock_condition``."""
+    if "skill" in condition and "level" in condition:
+        return ("skill", condition["skill"]), int(condition["level"])
+    if "category" in condition and "level" in condition:
+        return ("category", condition["category"]), int(condition["level"])
+    if "total_level" in condition:
+        return ("total", None), int(condition["total_level"])
+    if "challenge" in condition and "streak" in condition:
+        return ("streak", condition["challenge"]), int(condition["streak"])
+    raise ValueError(f"Unsupported unlock_condition: {condition!r}")
+
+
+def compile_rules(titles, badges):
+    """Rules for the parsed titles.json (``{skill: {level: title}}``) and badges.json data."""
+    rules = [Rule("title", title, ("skill", skill), int(level))
+             for skill, by_level in titles.items() for level, title in by_level.items()]
+    for badge in badges.get("badges", []):
+        rules.append(Rule("badge", badge["name"], *badge_input(badge.get("unlock_condition", {}))))
+    return rules
+
+
+class RuleIndex:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        by_input = {}
+        for rule in self.rules:
+            by_input.setdefault(rule.input, []).append((rule.threshold, rule))
+        self._index = {key: Thresholds(pairs) for key, pairs in by_input.items()}
+        self.fingerprint = hashlib.sha1("\n".join(sorted(map(repr, self.rules))).encode()).hexdigest()
+
+    def depends_on(self, key):
+        return key in self._index
+
+    def crossed(self, key, old, new):
+        """Rules on ``key`` that moving it from ``old`` to ``new`` satisfies for the first time."""
+        thresholds = self._index.get(key)
+        return thresholds.between(old, new) if thresholds else []
+
+    def satisfied(self, values):
+        """Every rule met by ``values``, a ``{input: value}`` dict covering one user."""
+        return [rule for key, value in values.items() if key in self._index
+                for rule in self._index[key].up_to(value)]
+
+    def longest_streak(self, challenge):
+        thresholds = self._index.get(("streak", challenge))
+        return thresholds.levels[-1] if thresholds else 0
+
+    def has_streaks(self):
+        return any(kind == "streak" for kind, _ in self._index)
+
+
+def record(conn, user_id, rules):
+    """Store ``rules`` as unlocked for the user. Returns the ones that were not unlocked before."""
+    if not rules:
+        return []
+    now = int(time.time())
+    new = []
+    with transaction(conn):
+        for rule in rules:
+            if conn.execute(UNLOCK_SQL, (user_id, rule.kind, rule.name, now)).rowcount:
+                new.append(rule)
+    return new
+
+
+def unlocked(conn, user_id, kind):
+    """Names of the titles or badges the user has unlocked."""
+    return {name for name, in conn.execute("SELECT name FROM unlocks WHERE user_id = ? AND kind = ?",
+                                           (user_id, kind))}
+
+
+def after_levels(conn, index, user_id, changes):
+    """Re-evaluate the rules that ``changes``, ``(skill, old_level, new_level)`` tuples already written, can affect.
+
+    Returns the newly unlocked rules. Category and total levels are read
+    only if a rule depends on them.
+    """
+    candidates, deltas = [], {}
+    for skill, old_level, new_level in changes:
+        if new_level == old_level:
+            continue
+        candidates += index.crossed(("skill", skill), old_level, new_level)
+        category = SKILL_TO_CATEGORY.get(skill)
+        deltas[("category", category)] = deltas.get(("category", category), 0) + new_level - old_level
+        deltas[("total", None)] = deltas.get(("total", None), 0) + new_level - old_level
+
+    affected = [key for key, delta in deltas.items() if delta and index.depends_on(key)]
+    if affected:
+        sums = dict(conn.execute(CATEGORY_LEVELS_SQL, (user_id,)))
+        for key in affected:
+            new = sum(sums.values()) if key[0] == "total" else sums.get(key[1], 0)
+            candidates += index.crossed(key, new - deltas[key], new)
+    return record(conn, user_id, candidates)
+
+
+def after_challenge(conn, index, user_id, challenge, today):
+    """Re-evaluate the streak rules of ``challenge`` after it was completed ``today``. Returns new unlocks."""
+    key = ("streak", challenge)
+    if not index.depends_on(key):
+        return []
+    # Only as far back as the longest streak any rule asks for
+    since = (date.fromisoformat(today) - timedelta(days=index.longest_streak(challenge))).isoformat()
+    days = [day for day, in conn.execute(STREAK_DAYS_SQL, (user_id, challenge, since))]
+    current = challenges.streaks({challenge: days}, today)[challenge]["current"]
+    return record(conn, user_id, index.crossed(key, current - 1, current))
+
+
+def _user_values(conn, index):
+    """``(user_id, {input: value})`` for every user with progress, in user order."""
+    streaks = {}
+    if index.has_streaks():
+        rows = conn.execute("SELECT user_id, challenge, day FROM challenge_log ORDER BY user_id, challenge, day")
+        for (user_id, challenge), group in groupby(rows, key=lambda row: row[:2]):
+            longest = challenges.streaks({challenge: [day for _, _, day in group]}, date.min.isoformat())
+            streaks.setdefault(user_id, {})[("streak", challenge)] = longest[challenge]["longest"]
+
+    rows = conn.execute("SELECT user_id, skill, category, level FROM progress ORDER BY user_id")
+    for user_id, group in groupby(rows, key=lambda row: row[0]):
+        values = dict(streaks.pop(user_id, {}))
+        total = 0
+        for _, skill, category, level in group:
+            values[("skill", skill)] = level
+            values[("category", category)] = values.get(("category", category), 0) + level
+            total += level
+        values[("total", None)] = total
+        yield user_id, values
+    yield from streaks.items()
+
+
+def sync(conn, index):
+    """Record every unlock any user qualifies for but does not have yet. Returns how many were added.
+
+    Streak rules count the longest streak ever, which is what the streak had
+    to reach at some point for the incremental path to unlock it.
+    """
+    now = int(time.time())
+    rows = [(user_id, rule.kind, rule.name, now)
+            for user_id, values in _user_values(conn, index) for rule in index.satisfied(values)]
+    with transaction(conn):
+        added = conn.executemany(UNLOCK_SQL, rows).rowcount
+        conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('unlock_rules', ?)", (index.fingerprint,))
+    return added
+
+
+def sync_if_changed(conn, index):
+    """sync() unless it already ran for exactly these rules. Returns how many unlocks were added."""
+    row = conn.execute("SELECT value FROM config WHERE key = 'unlock_rules'").fetchone()
+    if row and row[0] == index.fingerprint:
+        return 0
+    return sync(conn, index)
@@ -0,0 +1,159 @@
+# === analytics.py ===
+# XP over time from the xp_events ledger. Buckets (day, ISO week, month) are
+# cut at local midnight in the user's timezone; their boundaries are passed to
+# SQLite as a VALUES table so each (bucket, skill) total is one range sum over
+# the covering (user_id, skill, created_at, xp) index, and a window function
+# adds the running total. Nothing is loaded into Python beyond one output row
+# at a time.
+#
+# Exports stream the raw events with keyset pagination, so memory stays flat
+# no matter how long a user's history is.
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import challenges
+from skills import SKILL_TO_CATEGORY
+
+BUCKETS = ("day", "week", "month")
+GROUPS = ("skill", "category")
+
+# Bucket starts are bound as parameters; keep well below SQLite's 32766 limit
+MAX_BUCKETS = 3700
+
+EXPORT_CHUNK_SIZE = 5000
+
+
+def bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, bucket):
+    if bucket == "week":
+        return day + timedelta(days=7)
+    if bucket == "month":
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def default_since(until, bucket):
+    """Start of the default range: 30 days, 12 weeks or 12 months before ``until``."""
+    if bucket == "day":
+        return until - timedelta(days=29)
+    if bucket == "week":
+        return until - timedelta(weeks=11)
+    # The month after until's, a year earlier; for December that is January of the same year
+    return date(until.year, 1, 1) if until.month == 12 else date(until.year - 1, until.month + 1, 1)
+
+
+def to_epoch(day, timezone=None):
+    """Unix seconds of local midnight at the start of ``day``."""
+    zone = ZoneInfo(timezone) if challenges.valid_timezone(timezone) else None
+    moment = datetime.combine(day, time())
+    return int((moment.replace(tzinfo=zone) if zone else moment.astimezone()).timestamp())
+
+
+def buckets(since, until, bucket, timezone=None):
+    """``[(label, start_epoch, stop_epoch)]`` covering the days ``since``..``until`` inclusive."""
+    result = []
+    day = bucket_start(since, bucket)
+    while day <= until and len(result) < MAX_BUCKETS:
+        following = next_bucket(day, bucket)
+        result.append((day.isoformat(), to_epoch(day, timezone), to_epoch(following, timezone)))
+        day = following
+    return result
+
+
+def series(conn, user_id, bucket_rows, group="skill", skills=None):
+    """Yield ``(bucket, key, xp, running_xp)`` per bucket and skill (or category).
+
+    Empty buckets are left out; ``running_xp`` accumulates from the first bucket.
+    """
+    skills = [skill for skill in (skills or SKILL_TO_CATEGORY) if skill in SKILL_TO_CATEGORY]
+    if not bucket_rows or not skills:
+        return
+    params = [value for row in bucket_rows for value in row]
+    params += [value for skill in skills for value in (skill, SKILL_TO_CATEGORY[skill])]
+    buckets_sql = ", ".join("(?, ?, ?)" for _ in bucket_rows)
+    skills_sql = ", ".join("(?, ?)" for _ in skills)
+    key = "s.category" if group == "category" else "s.skill"
+
+    # A scalar subquery per (bucket, skill) is a range sum over the
+    # (user_id, skill, created_at, xp) index; a plain join + GROUP BY would
+    # sort every event instead.
+    rows = conn.execute(f'''
+        WITH buckets (label, start, stop) AS (VALUES {buckets_sql}),
+        skills (skill, category) AS (VALUES {skills_sql}),
+        per_skill AS (
+            SELECT b.label, b.start, s.skill, s.category,
+                   (SELECT SUM(e.xp) FROM xp_events e
+                    WHERE e.user_id = ? AND e.skill = s.skill
+                      AND e.created_at >= b.start AND e.created_at < b.stop) AS xp
+            FROM buckets b, skills s
+        ),
+        totals AS (
+            SELECT label, start, {key} AS key, SUM(xp) AS xp
+            FROM per_skill s
+            WHERE xp IS NOT NULL
+            GROUP BY start, key
+        )
+        SELECT label, key, xp, SUM(xp) OVER (PARTITION BY key ORDER BY start) AS running_xp
+        FROM totals
+        ORDER BY start, key
+    ''', params + [user_id])
+    yield from rows
+
+
+def events(conn, user_id, start=None, stop=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the user's ``(timestamp, skill, xp)`` events in time order, one chunk in memory at a time.
+
+    Timestamps are formatted as ISO 8601 UTC by SQLite, which is much cheaper
+    than doing it per row in Python.
+    """
+    after = (start - 1 if start is not None else -1, 2 ** 63 - 1)
+    stop = stop if stop is not None else 2 ** 63 - 1
+    while True:
+        rows = conn.execute('''
+            SELECT created_at, id, strftime('%Y-%m-%dT%H:%M:%SZ', created_at, 'unixepoch'), skill, xp
+            FROM xp_events
+            WHERE user_id = ? AND (created_at, id) > (?, ?) AND created_at < ?
+            ORDER BY created_at, id
+            LIMIT ?
+        ''', (user_id, after[0], after[1], stop, chunk_size)).fetchall()
+        for _, _, timestamp, skill, xp in rows:
+            yield timestamp, skill, xp
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][:2]
+
+
+def stream_csv(header, rows):
+    """Encode rows as CSV text, yielding one chunk per 1000 rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % 1000 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_json(prefix, items, suffix="]}"):
+    """Encode ``prefix`` + a JSON array of ``items`` + ``suffix`` without building the whole document."""
+    yield prefix
+    chunk = []
+    for count, item in enumerate(items):
+        chunk.append(("," if count else "") + json.dumps(item, separators=(",", ":")))
+        if len(chunk) == 1000:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk) + suffix
@@ -1,157 +1,297 @@
 # === app.py ===
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_socketio import SocketIO, emit
-import sqlite3
-from dotenv import load_dotenv
+# Run with `python app.py` for development. Production serving goes through
+# the application factory under gunicorn, see gunicorn.conf.py; the CLI
+# commands take the same factory: flask --app "app:create_app()" migrate
 import os
-import json
-
-with open(os.path.join(os.path.dirname(__file__), 'titles.json')) as f:
-    TITLES = json.load(f)
-
-with open(os.path.join(os.path.dirname(__file__), 'badges.json')) as f:
-    BADGES = json.load(f)
-
-# Define shared data outside the functions
-descriptions = {
-    "Red": "Physical skills like strength and endurance.",
-    "Blue": "Mental skills like intelligence, focus, and creativity.",
-    "Green": "Lifestyle and physical control like dexterity and vitality.",
-    "Gold": "Meta skills like discipline and consistency."
-}
-
-earning_guide = {
-    "Red": "🏋️ Gym, 🏃 Running, cardio workouts",
-    "Blue": "📖 Reading, 🧠 Deep work, 🎮 Logic games",
-    "Green": "🎻 Instruments, 🎯 Dexterity tasks, 🍎 Healthy living",
-    "Gold": "📅 Habit streaks, ✅ Daily goals"
-}
-
-skill_descriptions = {
-    "Strength": "Train your muscles and improve lifting capacity.",
-    "Endurance": "Boost cardiovascular health and stamina.",
-    "Mobility": "Improve flexibility, range of motion, and posture.",
-    "Speed": "Increase sprint performance and reaction time.",
-    "Intelligence": "Expand your knowledge and learn new topics.",
-    "Concentration": "Sharpen your focus and resist distractions.",
-    "Logic": "Improve problem-solving and analytical thinking.",
-    "Creativity": "Enhance artistic expression and idea generation.",
-    "Dexterity": "Improve hand-eye coordination and precise movement.",
-    "Vitality": "Maintain high physical energy through health habits.",
-    "Recovery": "Support muscle repair and prevent fatigue.",
-    "Affection": "Foster emotional connection and care for others.",
-    "Discipline": "Stick to habits and routines with consistency.",
-    "Planning": "Organize tasks and set achievable goals.",
-    "Reflection": "Gain insight through self-review and thought.",
-    "Good deeds": "Act with kindness and contribute positively."
-}
-
-skill_guides = {
-    "Strength": "🏋️ Weightlifting, bodyweight strength exercises",
-    "Endurance": "🏃 Running, cycling, long-distance workouts",
-    "Mobility": "🧘 Yoga, stretching routines, mobility drills",
-    "Speed": "⏱ Sprinting drills, agility training",
-    "Intelligence": "📚 Read books, take courses, learn new skills (languages, science, etc.)",
-    "Concentration": "🧠 Practice deep work (30+ min), mindfulness, no-phone blocks",
-    "Logic": "♟ Solve puzzles, do math problems, write code, play strategy games",
-    "Creativity": "🎨 Draw, write, compose music, brainstorm, design projects",
-    "Dexterity": "🎯 Play an instrument, juggle, craft, do precise movements or sports like tennis",
-    "Vitality": "💧 Track hydration, sleep 7–8h, eat balanced meals, avoid junk food",
-    "Recovery": "🛀 Do deep stretching, foam rolling, breathing exercises, quality sleep",
-    "Affection": "💞 Send kind messages, call loved ones, spend quality time with someone",
-    "Discipline": "📅 Complete daily routines, habit streaks, wake-up on time",
-    "Planning": "📝 Write to-do lists, plan your week, track long-term goals",
-    "Reflection": "🪞Journal your thoughts, write lessons from the day, meditate on choices",
-    "Good deeds": "🤝 Help someone, donate, volunteer, pick up trash, small acts of kindness"
-}
 
+# eventlet/gevent have to patch the standard library before anything else is imported
+if os.getenv("SOCKETIO_ASYNC_MODE") == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif os.getenv("SOCKETIO_ASYNC_MODE") == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+from datetime import date, datetime, timedelta
+from flask import Flask, Response, abort, make_response, render_template, request, jsonify, session, redirect, stream_with_context, url_for
+from flask_socketio import SocketIO, join_room
+from dotenv import load_dotenv
+import atexit
+import csv
+import functools
+import json
+import time
+
+import click
+
+import accounts
+import achievements
+import analytics
+import db
+import ingest
+import ledger
+import challenges
+import compression
+import messagequeue
+import metrics
+import migrations
+import passwords
+import ratelimit
+import selections
+import shards
+import skills
+import writebehind
+from assets import AssetPipeline
+from cache import FragmentCache, LRUCache, ReadModelCache, make_backend
+from catalog import BADGES_PATH, TITLES_PATH, CatalogLoader
+from leaderboard import ShardedLeaderboards, board_name
+from db import get_db, user_db, user_dbs
+
+# Titles and badges are indexed once and reloaded when the JSON files change
+catalog_loader = CatalogLoader(TITLES_PATH, BADGES_PATH)
 
 load_dotenv()  # Load environment variables from a .env file
 
 app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", "default_secret_key")  # Use a default if SECRET_KEY is not set
-socketio = SocketIO(app)
+
+# Bound to the app by create_app(), once the async mode and message queue are known
+socketio = SocketIO()
+
+# Salted password hashes, computed on a bounded thread pool; create_app() applies the settings
+password_hasher = passwords.PasswordHasher()
+
+# One per live thread or greenlet; a count that keeps climbing is a leak
+metrics.REGISTRY.register(metrics.Gauges("sqlite_connections", "Open SQLite connections in this process.",
+                                         db.connection_stats))
+
+# Per-user dashboard snapshots, invalidated by every route that writes to them.
+# create_app() swaps in the configured backend.
+dashboard_cache = ReadModelCache(LRUCache(), namespace="dashboard")
+metrics.REGISTRY.register(metrics.Gauges("dashboard_cache", "Dashboard snapshot cache counters.", dashboard_cache.stats))
+
+# Coalesces rapid XP grants when XP_WRITE_BEHIND is on; started by create_app()
+xp_buffer = writebehind.XPBuffer()
+metrics.REGISTRY.register(metrics.Gauges("xp_write_behind", "Write-behind XP buffer counters.", xp_buffer.stats))
+
+# Per-user token buckets and the bounded queue in front of the write routes,
+# used when RATE_LIMIT_ENABLED is on; create_app() applies the settings
+rate_limiter = ratelimit.RateLimiter()
+write_queue = ratelimit.AdmissionQueue()
+metrics.REGISTRY.register(metrics.Gauges("write_rate_limit", "Per-user write rate limit counters.", rate_limiter.stats))
+metrics.REGISTRY.register(metrics.Gauges("write_admission", "Write admission queue depth and rejections.",
+                                         write_queue.stats))
+
+# Resized AVIF/WebP badge and icon artwork, built by `flask build-assets`
+asset_pipeline = AssetPipeline(app.static_folder)
+
+
+def asset_sources():
+    """Every image that goes through the picture macro: badge artwork and the category icons."""
+    paths = list(catalog_loader.get().badge_images.values())
+    icons = os.path.join(app.static_folder, "images", "icons")
+    paths += [f"images/icons/{name}" for name in os.listdir(icons) if name.startswith("icon_") and name.endswith(".png")]
+    return paths
+
+
+# Navigation and card pages loop over the categories from the skill registry
+app.jinja_env.globals["category_names"] = skills.CATEGORY_NAMES
+
+
+@app.template_global()
+def responsive_image(path):
+    return asset_pipeline.picture(path, lambda p: f"{app.static_url_path}/{p}")
+
+
+# Parts of the card, titles and badges pages that are the same for every user
+fragment_cache = FragmentCache()
+metrics.REGISTRY.register(metrics.Gauges("template_fragments", "Template fragment cache counters.", fragment_cache.stats))
+
+
+@app.template_global()
+def cached_fragment(*key, caller):
+    # Templates are re-read while they are being edited, so fragments must be too
+    if app.jinja_env.auto_reload:
+        return caller()
+    return fragment_cache(*key, caller=caller)
+
+
+# Registered before the other hooks, so it runs last and sees their headers
+@app.after_request
+def compress(response):
+    if app.config["COMPRESS_RESPONSES"]:
+        compression.compress_response(response, request.accept_encodings, app.config["COMPRESS_MIN_SIZE"])
+    return response
+
+
+@app.after_request
+def cache_built_assets(response):
+    # Built file names carry their content hash, so they can be cached forever
+    if request.path.startswith(f"{app.static_url_path}/{asset_pipeline.build_dir}/") and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    return response
+
+
+# Ranks are served from in-memory indexes that follow the XP ledger
+leaderboards = ShardedLeaderboards()
+
+
+def user_room(user_id):
+    return f"user:{user_id}"
+
+
+def notify_user(user_id, event, data):
+    """Send a Socket.IO event to every open tab of one user, and nobody else."""
+    socketio.emit(event, data, to=user_room(user_id))
+    metrics.socketio_emits.inc(event)
+
+
+def announce_unlocks(user_id, unlocked):
+    """Push newly unlocked titles and badges to the user's open tabs."""
+    for rule in unlocked:
+        notify_user(user_id, 'unlocked', {"kind": rule.kind, "name": rule.name})
+        app.logger.info("%s unlocked user=%s name=%r input=%s threshold=%s",
+                        rule.kind, user_id, rule.name, rule.input, rule.threshold)
+    if unlocked:
+        # One animation at a time, titles first
+        rule = min(unlocked, key=lambda rule: rule.kind != "title")
+        notify_user(user_id, 'show_title_animation',
+                    {'message': f'🎉 New {rule.kind.capitalize()} Unlocked: {rule.name} 🎉'})
+
+
+def award_levels(user_id, changes):
+    """Record and announce what ``(skill, old_level, new_level)`` changes just written unlocked."""
+    announce_unlocks(user_id, achievements.after_levels(user_db(user_id), catalog_loader.get().rules, user_id, changes))
+
+
+@socketio.on('connect')
+def on_connect(auth=None):
+    # Sockets share the Flask session cookie; anonymous connections are refused
+    user_id = session.get('user_id')
+    if user_id is None:
+        return False
+    join_room(user_room(user_id))
+
 
 def init_db():
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                password TEXT NOT NULL
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                skill TEXT NOT NULL,
-                category TEXT NOT NULL,
-                xp INTEGER DEFAULT 0,
-                level INTEGER DEFAULT 1, 
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS daily (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                challenge TEXT NOT NULL,
-                completed BOOLEAN DEFAULT 0,
-                UNIQUE(user_id, challenge),
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-
-        
-        # Create a table to track the last reset date
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS config (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS selected_titles (
-            user_id INTEGER PRIMARY KEY,
-            selected_titles TEXT,
-            selected_badges TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS selected_badges (
-            user_id INTEGER PRIMARY KEY,
-            selected_titles TEXT,
-            selected_badges TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')        
-
-        # Initialize the last reset date if it doesn't exist
-        c.execute("INSERT OR IGNORE INTO config (key, value) VALUES ('last_reset_date', ?)", ("1970-01-01",))
-
-        # Check if the reset is needed
-        c.execute("SELECT value FROM config WHERE key = 'last_reset_date'")
-        last_reset_date = c.fetchone()[0]
-        current_date = datetime.now().strftime("%Y-%m-%d")
-
-        if current_date != last_reset_date:
-            # Reset daily challenges
-            c.execute("UPDATE daily SET completed = 0")
-            conn.commit()
-
-            # Update the last reset date
-            c.execute("UPDATE config SET value = ? WHERE key = 'last_reset_date'", (current_date,))
+    # Daily challenges reset lazily by completion date, so startup only migrates
+    for pool in db.get_router().pools():
+        migrations.migrate(pool.connection())
+    # Backfills unlocks when the rules in titles.json/badges.json have changed
+    for conn in user_dbs():
+        achievements.sync_if_changed(conn, catalog_loader.get().rules)
+    if app.config["BUILD_ASSETS_ON_STARTUP"] and asset_pipeline.available:
+        asset_pipeline.build(asset_sources())
+
+
+def _flag(name, default=""):
+    return os.getenv(name, default) not in ("", "0")
+
+
+def env_config():
+    """Settings from the environment (and .env); ``create_app(config)`` overrides any of them."""
+    return {
+        "SECRET_KEY": os.getenv("SECRET_KEY", "default_secret_key"),  # Use a default if SECRET_KEY is not set
+        "DATABASE": os.getenv("DATABASE_PATH", db.DEFAULT_DATABASE),
+        # Spread users' rows over this many SQLite files next to DATABASE, which
+        # then keeps only the accounts; 0 keeps everything in DATABASE. After
+        # changing it, run `flask rebalance-shards` before starting the app.
+        "DATABASE_SHARDS": int(os.getenv("DATABASE_SHARDS", "0")),
+        # METRICS_ENABLED turns on per-request instrumentation and /metrics;
+        # PROFILER_ENABLED adds the /debug/profile sampling profiler
+        "METRICS_ENABLED": _flag("METRICS_ENABLED"),
+        "PROFILER_ENABLED": _flag("PROFILER_ENABLED"),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        # threading, eventlet or gevent (auto-detected when unset). eventlet and
+        # gevent also need the variable at import time, for the monkey patching.
+        "SOCKETIO_ASYNC_MODE": os.getenv("SOCKETIO_ASYNC_MODE") or None,
+        # redis://..., anything kombu speaks, or sqlite:///path as a local
+        # stand-in: lets several workers and the CLI emit to the same clients
+        "SOCKETIO_MESSAGE_QUEUE": os.getenv("SOCKETIO_MESSAGE_QUEUE") or None,
+        # Browsers skip long-polling, which needs sticky sessions behind several workers
+        "SOCKETIO_WEBSOCKET_ONLY": _flag("SOCKETIO_WEBSOCKET_ONLY"),
+        "DASHBOARD_CACHE_URL": os.getenv("DASHBOARD_CACHE_URL"),
+        "DASHBOARD_CACHE_SIZE": int(os.getenv("DASHBOARD_CACHE_SIZE", "10000")),
+        "DASHBOARD_CACHE_TTL": float(os.getenv("DASHBOARD_CACHE_TTL", "30")),
+        "BUILD_ASSETS_ON_STARTUP": _flag("BUILD_ASSETS_ON_STARTUP"),
+        # scrypt (built in) or argon2 (needs argon2-cffi); cost as in passwords.DEFAULT_COSTS.
+        # At most PASSWORD_WORKERS hashes run at once (0 hashes on the request
+        # thread, one at a time); beyond PASSWORD_MAX_PENDING waiting ones,
+        # logins get a 503.
+        "PASSWORD_SCHEME": os.getenv("PASSWORD_SCHEME", "scrypt"),
+        "PASSWORD_COST": int(os.getenv("PASSWORD_COST", "0")) or None,
+        "PASSWORD_WORKERS": int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        "PASSWORD_MAX_PENDING": int(os.getenv("PASSWORD_MAX_PENDING", "256")),
+        # /add_xp and /delete_xp answer from memory and write in batches, every
+        # XP_FLUSH_INTERVAL_MS or once XP_FLUSH_MAX_EVENTS grants are waiting
+        "XP_WRITE_BEHIND": _flag("XP_WRITE_BEHIND"),
+        "XP_FLUSH_INTERVAL_MS": int(os.getenv("XP_FLUSH_INTERVAL_MS", "50")),
+        "XP_FLUSH_MAX_EVENTS": int(os.getenv("XP_FLUSH_MAX_EVENTS", "200")),
+        # gzip (or brotli, if installed) for text responses of COMPRESS_MIN_SIZE
+        # bytes or more; turn off when a proxy in front already compresses
+        "COMPRESS_RESPONSES": _flag("COMPRESS_RESPONSES", "1"),
+        "COMPRESS_MIN_SIZE": int(os.getenv("COMPRESS_MIN_SIZE", "1024")),
+        # Each user may write RATE_LIMIT_PER_SECOND times a second on average,
+        # RATE_LIMIT_BURST times in a row; RATE_LIMIT_URL (redis://... or
+        # sqlite:///path) shares the buckets between workers. At most
+        # WRITE_CONCURRENCY writes run at once per process and WRITE_QUEUE_SIZE
+        # wait, each up to WRITE_QUEUE_TIMEOUT_MS; the rest get a 429.
+        "RATE_LIMIT_ENABLED": _flag("RATE_LIMIT_ENABLED"),
+        "RATE_LIMIT_PER_SECOND": float(os.getenv("RATE_LIMIT_PER_SECOND", "5")),
+        "RATE_LIMIT_BURST": int(os.getenv("RATE_LIMIT_BURST", "20")),
+        "RATE_LIMIT_URL": os.getenv("RATE_LIMIT_URL") or None,
+        "WRITE_CONCURRENCY": int(os.getenv("WRITE_CONCURRENCY", "4")),
+        "WRITE_QUEUE_SIZE": int(os.getenv("WRITE_QUEUE_SIZE", "64")),
+        "WRITE_QUEUE_TIMEOUT_MS": int(os.getenv("WRITE_QUEUE_TIMEOUT_MS", "2000")),
+        # Seconds browsers may reuse /static files before revalidating; built
+        # images have hashed names and are cached for a year regardless
+        "SEND_FILE_MAX_AGE_DEFAULT": int(os.getenv("STATIC_MAX_AGE", "3600")),
+    }
 
 
+def create_app(config=None):
+    """Configure the application from the environment plus ``config`` and return it.
+
+    The routes are registered on the module-level ``app``, so there is one
+    application per process and this may only be called once. It does not
+    touch the schema: ``python app.py`` and the CLI run ``init_db()``, and
+    under gunicorn the master migrates once before forking (gunicorn.conf.py).
+    """
+    if app.config.get("CONFIGURED"):
+        raise RuntimeError("create_app() has already been called in this process")
+    app.config.update(env_config())
+    app.config.update(config or {})
+    app.config["DATABASE"] = os.path.abspath(app.config["DATABASE"])
+    app.logger.setLevel(app.config["LOG_LEVEL"].upper())
+
+    db.init_app(app, factory=metrics.InstrumentedConnection if app.config["METRICS_ENABLED"] else None)
+    metrics.init_app(app)
+    dashboard_cache.backend = make_backend(app.config["DASHBOARD_CACHE_URL"],
+                                           maxsize=app.config["DASHBOARD_CACHE_SIZE"],
+                                           ttl=app.config["DASHBOARD_CACHE_TTL"])
+    socketio.init_app(app, async_mode=app.config["SOCKETIO_ASYNC_MODE"],
+                      transports=["websocket"] if app.config["SOCKETIO_WEBSOCKET_ONLY"] else None,
+                      **messagequeue.socketio_options(app.config["SOCKETIO_MESSAGE_QUEUE"]))
+    password_hasher.configure(app.config["PASSWORD_SCHEME"], app.config["PASSWORD_COST"],
+                              app.config["PASSWORD_WORKERS"], app.config["PASSWORD_MAX_PENDING"],
+                              async_mode=socketio.async_mode)
+    if app.config["XP_WRITE_BEHIND"]:
+        xp_buffer.interval = app.config["XP_FLUSH_INTERVAL_MS"] / 1000
+        xp_buffer.max_events = app.config["XP_FLUSH_MAX_EVENTS"]
+        xp_buffer.start(user_db, catalog_loader.get, xp_flushed)
+        # gunicorn.conf.py also closes it when a worker is stopped
+        atexit.register(xp_buffer.close)
+    if app.config["RATE_LIMIT_ENABLED"]:
+        rate_limiter.rate = app.config["RATE_LIMIT_PER_SECOND"]
+        rate_limiter.burst = app.config["RATE_LIMIT_BURST"]
+        rate_limiter.buckets = ratelimit.make_buckets(app.config["RATE_LIMIT_URL"])
+        write_queue.concurrency = app.config["WRITE_CONCURRENCY"]
+        write_queue.max_waiting = app.config["WRITE_QUEUE_SIZE"]
+        write_queue.timeout = app.config["WRITE_QUEUE_TIMEOUT_MS"] / 1000
+    app.config["CONFIGURED"] = True
+    return app
 
 
 @app.route("/")
@@ -161,20 +301,75 @@ def index():
     return redirect(url_for('login'))
 
 
+def too_many_logins():
+    response = make_response("Too many logins in progress, please try again", 503)
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def too_many_writes(error, wait):
+    response = jsonify(success=False, error=error)
+    response.status_code = 429
+    response.headers["Retry-After"] = str(ratelimit.retry_after(wait))
+    return response
+
+
+def write_limited(view):
+    """Rate-limit a route that writes per user, and run it through the write admission queue."""
+    @functools.wraps(view)
+    def limited(*args, **kwargs):
+        if not app.config["RATE_LIMIT_ENABLED"]:
+            return view(*args, **kwargs)
+        user_id = session.get('user_id')
+        wait = rate_limiter.hit(f"user:{user_id}" if user_id is not None else f"addr:{request.remote_addr}")
+        if wait:
+            return too_many_writes("Too many requests, please slow down", wait)
+        try:
+            write_queue.acquire()
+        except ratelimit.Overloaded as e:
+            app.logger.info("write shed path=%s user=%s reason=%s", request.path, user_id, e.reason)
+            return too_many_writes("Server busy, please try again", e.retry_after)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            write_queue.release()
+    return limited
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
 
-        conn = sqlite3.connect("database.db")
-        c = conn.cursor()
-        c.execute("SELECT id FROM users WHERE username = ? AND password = ?", (username, password))
-        user = c.fetchone()
-        conn.close()
-
-        if user:
+        conn = get_db()
+        user = conn.execute("SELECT id, password FROM users WHERE username = ?", (username,)).fetchone()
+        try:
+            if user is None:
+                verified = password_hasher.reject(password)
+            else:
+                verified = password_hasher.verify(user[1], password)
+                # Plaintext from before hashing, or an older cost: upgrade while the password is at hand.
+                # The compare-and-set skips the write if the password changed in the meantime.
+                if verified and password_hasher.needs_rehash(user[1]):
+                    try:
+                        conn.execute("UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                                     (password_hasher.hash(password), user[0], user[1]))
+                    except passwords.PoolBusy:
+                        pass  # upgraded on a later login instead
+        except passwords.PoolBusy:
+            return too_many_logins()
+
+        if verified:
             session['user_id'] = user[0]
+            # Keep the timezone used for daily challenge dates current
+            timezone = request.form.get('timezone')
+            if challenges.valid_timezone(timezone):
+                changed = user_db(user[0]).execute("UPDATE users SET timezone = ? WHERE id = ? AND timezone IS NOT ?",
+                                                   (timezone, user[0], timezone)).rowcount
+                if changed:
+                    # The cached dashboard snapshot carries the timezone for today's challenges
+                    dashboard_cache.invalidate(user[0])
             return redirect(url_for('dashboard'))  # or card_red, etc.
         else:
             return "Login failed"
@@ -186,233 +381,233 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+
+def provision(rows):
+    """Create accounts through accounts.provision_users(), or across the shards with DATABASE_SHARDS."""
+    router = db.get_router()
+    if router.sharded:
+        return accounts.provision_sharded(router, rows)
+    return accounts.provision_users(get_db(), rows)
+
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
-        password = request.form['password']
-        conn = sqlite3.connect("database.db")
-        c = conn.cursor()
-        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-        user_id = c.lastrowid
-
-        skills = [
-            ("Strength", "Red"), ("Endurance", "Red"), ("Mobility", "Red"), ("Speed", "Red"),
-            ("Intelligence", "Blue"), ("Concentration", "Blue"), ("Logic", "Blue"), ("Creativity", "Blue"),
-            ("Dexterity", "Green"), ("Vitality", "Green"), ("Recovery", "Green"), ("Affection", "Green"),
-            ("Discipline", "Gold"), ("Planning", "Gold"), ("Reflection", "Gold"), ("Good deeds", "Gold")
-        ]
-        for skill, category in skills:
-            c.execute("INSERT INTO progress (user_id, skill, category) VALUES (?, ?, ?)", (user_id, skill, category))
-        
-        daily_challenges = ["Gym", "Running", "Reading", "Work"]
-        for challenge in daily_challenges:
-            c.execute("INSERT INTO daily (user_id, challenge, completed) VALUES (?, ?, ?)", (user_id, challenge, 0))
-
-        conn.commit()
-        conn.close()
+        try:
+            # Hashed before the transaction so the writer lock is not held for it
+            password = password_hasher.hash(request.form['password'])
+        except passwords.PoolBusy:
+            return too_many_logins()
+        timezone = request.form.get('timezone')
+        created = provision([(username, password, timezone if challenges.valid_timezone(timezone) else None)])
+        if username not in created:
+            return "Username already taken"
+
         return redirect(url_for('login'))
 
     return render_template("register.html")
 
 
+DASHBOARD_SQL = '''
+    SELECT 0, id, skill, category, xp, level FROM progress WHERE user_id = :user_id
+    UNION ALL
+    SELECT 1, challenge, challenge, NULL, completed_on, NULL FROM daily WHERE user_id = :user_id
+    UNION ALL
+    SELECT 2, id, username, timezone, NULL, NULL FROM users WHERE id = :user_id
+    UNION ALL
+    SELECT CASE kind WHEN 'title' THEN 3 ELSE 4 END, position, name, NULL, NULL, NULL
+    FROM user_selections WHERE user_id = :user_id
+    ORDER BY 1, 2
+'''
+
+
+def load_dashboard(user_id):
+    """Everything the dashboard shows for one user, read in a single statement.
+
+    The second column only orders rows within each part: skills in creation
+    order, challenges by name, picked titles and badges in the order picked. Challenges carry their completion date rather
+    than a done flag so a cached snapshot stays correct across midnight.
+    """
+    snapshot = {"stats": [], "daily_challenges": [], "username": None, "timezone": None,
+                "selected_titles": [], "selected_badges": []}
+    rows = user_db(user_id).execute(DASHBOARD_SQL, {"user_id": user_id})
+
+    for part, _, name, category, value, level in rows:
+        if part == 0:
+            snapshot["stats"].append([name, category, value, level])
+        elif part == 1:
+            snapshot["daily_challenges"].append([name, value])
+        elif part == 2:
+            snapshot["username"] = name
+            snapshot["timezone"] = category
+        elif part == 3:
+            snapshot["selected_titles"].append(name)
+        elif part == 4:
+            snapshot["selected_badges"].append(name)
+    return snapshot
+
+
 @app.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
     user_id = session['user_id']
-    # Query skills for this user only
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT skill, category, xp, level FROM progress WHERE user_id = ?", (user_id,))
-        stats = c.fetchall()
-        c.execute("SELECT challenge, completed FROM daily WHERE user_id = ?", (user_id,))
-        daily_challenges = c.fetchall()
-        c.execute("SELECT username FROM users WHERE id = ?", (user_id,))
-        username = c.fetchone()[0]
-        c.execute("SELECT selected_titles FROM selected_titles WHERE user_id = ?", (user_id,))
-        row = c.fetchone()
-        if row and row[0]:
-            selected_titles = json.loads(row[0])
-        else:
-            selected_titles = []
-        c.execute("SELECT selected_badges FROM selected_badges WHERE user_id = ?", (user_id,))
-        row = c.fetchone()
-        if row and row[0]:
-            selected_badges = json.loads(row[0])
-        else:
-            selected_badges = []
-
-    title_info = {}
-    for skill, titles in TITLES.items():
-        for level, title in titles.items():
-            title_info[title] = {
-                "skill": skill,
-                "level": int(level)
-            }
-
-    badge_images = {}
-    for badge in BADGES.get("badges", []):
-        badge_images[badge["name"]] = badge["image"]
-
-    skill_to_category = {
-        "Strength": "Red", "Endurance": "Red", "Mobility": "Red", "Speed": "Red",
-        "Intelligence": "Blue", "Concentration": "Blue", "Logic": "Blue", "Creativity": "Blue",
-        "Dexterity": "Green", "Vitality": "Green", "Recovery": "Green", "Affection": "Green",
-        "Discipline": "Gold", "Planning": "Gold", "Reflection": "Gold", "Good deeds": "Gold"
-    }
+    snapshot = dashboard_cache.get_or_load(user_id, lambda: load_dashboard(user_id))
+    today = challenges.user_today(snapshot["timezone"])
+    daily_challenges = [(challenge, 1 if completed_on == today else 0)
+                        for challenge, completed_on in snapshot["daily_challenges"]]
+
+    catalog = catalog_loader.get()
 
     return render_template(
         "dashboard.html",
-        stats=stats,
+        stats=xp_buffer.overlay(user_id, snapshot["stats"]),
         daily_challenges=daily_challenges,
-        username=username,
-        selected_titles=selected_titles,
-        selected_badges=selected_badges,
-        title_info=title_info,
-        badge_images=badge_images,
-        skill_to_category=skill_to_category
+        username=snapshot["username"],
+        selected_titles=snapshot["selected_titles"],
+        selected_badges=snapshot["selected_badges"],
+        title_info=catalog.title_info,
+        badge_images=catalog.badge_images,
+        skill_to_category=catalog.skill_to_category
     )
 
 
-@app.route("/card_red")
-def card_red():
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        user_id = session['user_id']
-        c.execute("SELECT skill, category, xp, level FROM progress WHERE category = 'Red' AND user_id = ?", (user_id,))
-        stats = c.fetchall()
+# Folded into the card page ETag so cached pages are refetched after the template changes
+CARD_TEMPLATE_VERSION = int(os.path.getmtime(os.path.join(app.root_path, "templates", "card.html")))
 
-    return render_template(
-        "card_red.html", 
-        stats=stats, 
-        descriptions=descriptions, 
-        earning_guide=earning_guide,
-        skill_descriptions=skill_descriptions,
-        skill_guides=skill_guides
-    )
 
-@app.route("/card_blue")
-def card_blue():
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        user_id = session['user_id']
-        c.execute("SELECT skill, category, xp, level FROM progress WHERE category = 'Blue' AND user_id = ?", (user_id,))
-        stats = c.fetchall()
+def progress_validators(user_id):
+    """``(version, last_modified)`` of a user's progress; both change on every XP write."""
+    row = user_db(user_id).execute("SELECT progress_version, progress_updated_at FROM users WHERE id = ?",
+                                   (user_id,)).fetchone()
+    version, updated_at = row if row else (0, None)
+    last_modified = datetime.fromisoformat(updated_at.replace("Z", "+00:00")) if updated_at else None
+    return version, last_modified
 
-    return render_template(
-        "card_blue.html", 
-        stats=stats, 
-        descriptions=descriptions, 
-        earning_guide=earning_guide,
-        skill_descriptions=skill_descriptions,
-        skill_guides=skill_guides
-    )
 
-@app.route("/card_green")
-def card_green():
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        user_id = session['user_id']
-        c.execute("SELECT skill, category, xp, level FROM progress WHERE category = 'Green' AND user_id = ?", (user_id,))
-        stats = c.fetchall()
+def conditional(etag, last_modified, build):
+    """Answer 304 if the client's copy is current, otherwise ``build()`` the response with validators.
 
-    return render_template(
-        "card_green.html", 
-        stats=stats, 
-        descriptions=descriptions, 
-        earning_guide=earning_guide,
-        skill_descriptions=skill_descriptions,
-        skill_guides=skill_guides
-    )
+    The version check happens before ``build`` runs, so a revalidation costs
+    one primary-key lookup and no rendering.
+    """
+    if request.if_none_match:
+        # Weak, because compression turns the ETag weak (compression.py)
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since and request.if_modified_since >= last_modified)
 
-@app.route("/card_gold")
-def card_gold():
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        user_id = session['user_id']
-        c.execute("SELECT skill, category, xp, level FROM progress WHERE category = 'Gold' AND user_id = ?", (user_id,))
-        stats = c.fetchall()
+    response = Response(status=304) if fresh else build()
+    if not isinstance(response, Response):
+        response = make_response(response)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Browsers keep the copy but must revalidate before reusing it
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
-    return render_template(
-        "card_gold.html", 
-        stats=stats, 
-        descriptions=descriptions, 
-        earning_guide=earning_guide,
-        skill_descriptions=skill_descriptions,
-        skill_guides=skill_guides
+
+def buffered_suffix(user_id):
+    """ETag part for grants still in the write-behind buffer, which the progress version does not count yet."""
+    stamp = xp_buffer.stamp(user_id)
+    return f"+{stamp}" if stamp else ""
+
+
+def category_stats(user_id, category):
+    return user_db(user_id).execute(
+        "SELECT skill, category, xp, level FROM progress WHERE category = ? AND user_id = ?", (category, user_id)
+    ).fetchall()
+
+
+@app.route("/card/<category>")
+def card(category):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    category = skills.category(category)
+    if category is None:
+        abort(404)
+
+    user_id = session['user_id']
+    version, last_modified = progress_validators(user_id)
+    etag = f"card-{CARD_TEMPLATE_VERSION}-{user_id}-{version}{buffered_suffix(user_id)}-{category}"
+
+    return conditional(etag, last_modified, lambda: render_template(
+        "card.html",
+        category=category,
+        stats=xp_buffer.overlay(user_id, category_stats(user_id, category)),
+        category_skills=skills.skills_in(category),
+        category_info=skills.CATEGORIES_BY_NAME[category],
+        skill_info=skills.SKILLS_BY_NAME
+    ))
+
+
+@app.route("/card_<category>")
+def legacy_card(category):
+    # Old per-color URLs (/card_red, ...) from bookmarks
+    return redirect(url_for('card', category=category), code=301)
+
+
+@app.route("/api/stats")
+def api_stats():
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    user_id = session['user_id']
+
+    category = request.args.get('category')
+    if category:
+        category = skills.category(category)
+        if category is None:
+            return jsonify(success=False, error="Unknown category"), 404
+
+    version, last_modified = progress_validators(user_id)
+    etag = f"stats-{user_id}-{version}{buffered_suffix(user_id)}-{category or 'all'}"
+
+    def build():
+        if category:
+            rows = category_stats(user_id, category)
+        else:
+            rows = user_db(user_id).execute(
+                "SELECT skill, category, xp, level FROM progress WHERE user_id = ? ORDER BY id", (user_id,)
+            ).fetchall()
+        rows = xp_buffer.overlay(user_id, rows)
+        return jsonify(
+            category=category,
+            version=version,
+            stats=[{"skill": skill, "category": cat, "xp": xp, "level": level, "xp_to_next_level": level * 100}
+                   for skill, cat, xp, level in rows],
         )
 
+    return conditional(etag, last_modified, build)
+
 @app.route('/titles')
 def titles():
     user_id = session.get('user_id')    
     if not user_id:
         return redirect(url_for('login'))
 
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT skill, level FROM progress WHERE user_id = ?", (user_id,))
-        stats = c.fetchall()
-        c.execute("SELECT selected_titles FROM selected_titles WHERE user_id = ?", (user_id,))
-        row = c.fetchone()
-        current_selected_titles = json.loads(row[0]) if row and row[0] else []
+    conn = user_db(user_id)
+    current_selected_titles = selections.selected(conn, user_id, "title")
+    unlocked = achievements.unlocked(conn, user_id, "title")
 
-    user_levels = {skill: level for skill, level in stats}
+    # Grouped by skill in titles.json order, lowest level first
+    catalog = catalog_loader.get()
     unlocked_titles = {}
+    for skill, by_level in catalog.titles.items():
+        earned = sorted((int(level), title) for level, title in by_level.items() if title in unlocked)
+        if earned:
+            unlocked_titles[skill] = earned
 
-    for skill, level in user_levels.items():
-        available_titles = TITLES.get(skill, {})
-        unlocked = [
-            (int(req_level), title)
-            for req_level, title in available_titles.items()
-            if level >= int(req_level)
-        ]
-        if unlocked:
-            unlocked_titles[skill] = sorted(unlocked)
-    
-    skill_to_category= {
-        "Strength": "Red", "Endurance": "Red", "Mobility": "Red", "Speed": "Red",
-        "Intelligence": "Blue", "Concentration": "Blue", "Logic": "Blue", "Creativity": "Blue",
-        "Dexterity": "Green", "Vitality": "Green", "Recovery": "Green", "Affection": "Green",
-        "Discipline": "Gold", "Planning": "Gold", "Reflection": "Gold", "Good deeds": "Gold"
-    }
-
-    return render_template("titles.html", unlocked_titles=unlocked_titles, skill_to_category=skill_to_category, current_selected_titles=current_selected_titles,user_id=user_id)
+    return render_template("titles.html", unlocked_titles=unlocked_titles, skill_to_category=catalog.skill_to_category, current_selected_titles=current_selected_titles,user_id=user_id)
 
 
 @app.route('/update_selected_titles', methods=['POST'])
+@write_limited
 def update_selected_titles():
-    if request.method == 'POST':
-        data = request.get_json()
-        user_id = session.get('user_id')
-        title = data['title']
-        print(title)
-        action = data['action']
-        print(action)
-
-        with sqlite3.connect("database.db") as conn:
-            c = conn.cursor()
-            c.execute("SELECT selected_titles FROM selected_titles WHERE user_id = ?", (user_id,))
-            row = c.fetchone()
-
-            if row and row[0]:
-                selected_titles = json.loads(row[0])
-            else:
-                selected_titles = []
-
-            # Add or remove the title based on the action
-            if action == 'add' and title not in selected_titles:
-                selected_titles.append(title)
-            elif action == 'remove' and title in selected_titles:
-                selected_titles.remove(title)
-
-            # Save the updated selection back into the database
-            selected_json = json.dumps(selected_titles)
-            c.execute("INSERT OR REPLACE INTO selected_titles (user_id, selected_titles) VALUES (?, ?)",(user_id, selected_json))
-            conn.commit()
-
-    return jsonify({"status": "success"}), 200
+    return update_selection("title", request.get_json(silent=True) or {})
 
 
 @app.route("/badges")
@@ -421,76 +616,63 @@ def badges():
     if not user_id:
         return redirect(url_for('login'))
 
-    with sqlite3.connect("database.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT skill, level FROM progress WHERE user_id = ?", (user_id,))
-        stats = c.fetchall()
-        c.execute("SELECT selected_badges FROM selected_badges WHERE user_id = ?", (user_id,))
-        row = c.fetchone()
-        current_selected_badges = json.loads(row[0]) if row and row[0] else []
-
-    unlocked_badges = []
-
-    for badge in BADGES.get("badges", []):
-        unlock_condition = badge.get("unlock_condition", {})
-        skill = unlock_condition.get("skill")
-        required_level = unlock_condition.get("level")
-
-        # Check if the user meets the unlock condition
-        for skill_name, level in stats:
-            if skill_name == skill and level >= required_level:
-                unlocked_badges.append({
-                    "name": badge.get("name"),
-                    "description": badge.get("description"),
-                    "image": badge.get("image"),
-                    "category": unlock_condition.get("skill"),
-                })
-
-    skill_to_category= {
-        "Strength": "Red", "Endurance": "Red", "Mobility": "Red", "Speed": "Red",
-        "Intelligence": "Blue", "Concentration": "Blue", "Logic": "Blue", "Creativity": "Blue",
-        "Dexterity": "Green", "Vitality": "Green", "Recovery": "Green", "Affection": "Green",
-        "Discipline": "Gold", "Planning": "Gold", "Reflection": "Gold", "Good deeds": "Gold"
-    }
+    conn = user_db(user_id)
+    current_selected_badges = selections.selected(conn, user_id, "badge")
+    unlocked = achievements.unlocked(conn, user_id, "badge")
 
-    return render_template("badges.html", unlocked_badges=unlocked_badges, skill_to_category=skill_to_category, user_id=user_id, current_selected_badges=current_selected_badges)
+    catalog = catalog_loader.get()
+    unlocked_badges = [entry for name, entry in catalog.badge_info.items() if name in unlocked]
+
+    return render_template("badges.html", unlocked_badges=unlocked_badges, skill_to_category=catalog.skill_to_category, user_id=user_id, current_selected_badges=current_selected_badges)
 
 
 @app.route('/update_selected_badges', methods=['POST'])
+@write_limited
 def update_selected_badges():
-    if request.method == 'POST':
-        data = request.get_json()
-        user_id = session.get('user_id')
-        badge = data['title'] 
-        print(badge)
-        action = data['action']
-        print(action)
-
-        with sqlite3.connect("database.db") as conn:
-            c = conn.cursor()
-            c.execute("SELECT selected_badges FROM selected_badges WHERE user_id = ?", (user_id,))
-            row = c.fetchone()
-
-            if row and row[0]:
-                selected_badges = json.loads(row[0])
-            else:
-                selected_badges = []
+    return update_selection("badge", request.get_json(silent=True) or {})
+
 
-            # Add or remove the title based on the action
-            if action == 'add' and badge not in selected_badges:
-                selected_badges.append(badge)
-            elif action == 'remove' and badge in selected_badges:
-                selected_badges.remove(badge)
+def selectable():
+    catalog = catalog_loader.get()
+    return {"title": catalog.title_info, "badge": catalog.badge_images}
 
-            # Save the updated selection back into the database
-            selected_json = json.dumps(selected_badges)
-            print(selected_json)
-            c.execute("INSERT OR REPLACE INTO selected_badges (user_id, selected_badges) VALUES (?, ?)",(user_id, selected_json))
-            conn.commit()
 
+def update_selection(kind, data):
+    """Single toggle from the titles and badges pages; both send the name as ``title``."""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify(success=False, error="Not logged in"), 401
+    app.logger.debug("update_selection user=%s kind=%s name=%r action=%s", user_id, kind, data.get('title'),
+                     data.get('action'))
+    try:
+        (_, name, action), = selections.parse_changes(
+            {"changes": [{"kind": kind, "name": data.get('title'), "action": data.get('action')}]}, selectable())
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+
+    if selections.toggle(user_db(user_id), user_id, kind, name, action):
+        dashboard_cache.invalidate(user_id)
     return jsonify({"status": "success"}), 200
 
 
+@app.route('/api/selections', methods=['POST'])
+@write_limited
+def api_selections():
+    """Apply several title/badge toggles in one request and return the resulting picks."""
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    user_id = session['user_id']
+    try:
+        changes = selections.parse_changes(request.get_json(silent=True), selectable())
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+
+    conn = user_db(user_id)
+    if selections.apply(conn, user_id, changes):
+        dashboard_cache.invalidate(user_id)
+    return jsonify(success=True, selected_titles=selections.selected(conn, user_id, "title"),
+                   selected_badges=selections.selected(conn, user_id, "badge"))
+
 
 @app.route('/clear-title-animation')
 def clear_title_animation():
@@ -499,108 +681,427 @@ def clear_title_animation():
 
 
 
+def grant_xp(user_id, skill, amount):
+    """Grant (or remove) XP for /add_xp and /delete_xp. Returns ``(old_level, level, xp)`` or None."""
+    if app.config["XP_WRITE_BEHIND"]:
+        return xp_buffer.grant(user_db(user_id), user_id, skill, amount)
+    # Appends to the XP ledger and updates the progress row under one writer lock
+    result = ledger.apply(user_db(user_id), user_id, skill, amount)
+    if result:
+        dashboard_cache.invalidate(user_id)
+        award_levels(user_id, [(skill, result[0], result[1])])
+    return result
+
+
+def xp_flushed(transitions):
+    """Called by the write-behind buffer once a batch of grants is in the database."""
+    by_user = {}
+    for t in transitions:
+        by_user.setdefault(t["user_id"], []).append((t["skill"], t["old_level"], t["current_level"]))
+    dashboard_cache.invalidate(*by_user)
+    for user_id, changes in by_user.items():
+        award_levels(user_id, changes)
+
+
 @app.route('/add_xp', methods=['POST'])
+@write_limited
 def add_xp():
     data = request.get_json()
     skill = data.get('skill')
-    xp_to_add = int(data.get('xp', 0))
+    try:
+        xp_to_add = ingest.parse_xp(data.get('xp', 0))
+    except ingest.InvalidEvent as e:
+        return jsonify(success=False, error=str(e)), 400
 
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
     user_id = session['user_id']
 
-    # Fetch current XP and level
-    cursor.execute("SELECT xp, level FROM progress WHERE user_id = ? AND skill = ?", (user_id, skill))
-    row = cursor.fetchone()
-
-    if row:
-        new_xp = row[0] + xp_to_add
-        cursor.execute("UPDATE progress SET xp = ? WHERE skill = ? AND user_id = ?", (new_xp, skill, user_id))
-        conn.commit()
-
-        # Fetch level again (in case already updated elsewhere)
-        cursor.execute("SELECT level FROM progress WHERE user_id = ? AND skill = ?", (user_id, skill))
-        current_level = cursor.fetchone()[0]
-        old_level = current_level
-
-        # Level-up loop
-        while new_xp >= current_level * 100:
-            current_level += 1
-            new_xp -= (current_level - 1) * 100
-            cursor.execute("UPDATE progress SET level = ?, xp = ? WHERE user_id = ? AND skill = ?",
-                           (current_level, new_xp, user_id, skill))
-            conn.commit()
-
-        # ====== TITLE CHECK & SOCKET EMIT ======
-        available_titles = TITLES.get(skill, {})
-        title_triggered = False
-
-        for req_level_str, title in available_titles.items():
-            req_level = int(req_level_str)
-            if old_level < req_level <= current_level:
-                socketio.emit('show_title_animation', {'message': f'🎉 New Title Unlocked: {title} at level {req_level} 🎉'})
-                print(f"🎉 Emitting title unlock animation for {title} at level {req_level}!")
-                title_triggered = True
-                break  # Optional: only trigger one title at a time
-
-        conn.close()
+    result = grant_xp(user_id, skill, xp_to_add)
+
+    if result:
+        # Unlocks are pushed over Socket.IO once the grant is written
+        old_level, current_level, _ = result
         return jsonify({ "old_level": old_level, "current_level": current_level, "skill": skill })
 
     else:
-        conn.close()
         return jsonify(success=False, error="Skill not found"), 404
 
+
+@app.route('/add_xp/batch', methods=['POST'])
+@write_limited
+def add_xp_batch():
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    user_id = session['user_id']
+
+    try:
+        events = ingest.normalize(ingest.parse_payload(request.get_data(), request.content_type or ""), user_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify(success=False, error=str(e)), 400
+
+    events, unknown = ingest.resolve_usernames(get_db(), events)
+    if unknown or any(event[0] != user_id for event in events):
+        return jsonify(success=False, error="Events can only target the logged-in user"), 403
+
+    if app.config["XP_WRITE_BEHIND"]:
+        # Buffered taps came first, so they are written first
+        xp_buffer.flush()
+    result = ingest.apply_events(user_db(user_id), events, catalog_loader.get())
+    dashboard_cache.invalidate(user_id)
+    if app.config["XP_WRITE_BEHIND"]:
+        xp_buffer.forget(user_id)
+
+    award_levels(user_id, [(t["skill"], t["old_level"], t["current_level"]) for t in result["transitions"]])
+
+    return jsonify(success=True, **result)
+
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations (to the shards as well, with DATABASE_SHARDS)."""
+    for pool in db.get_router().pools():
+        conn = pool.connection()
+        applied = migrations.migrate(conn)
+        click.echo(f"{os.path.basename(pool.path)}: " + (f"applied migrations {applied}" if applied else "up to date")
+                   + f", schema version {migrations.current_version(conn)}")
+
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if any hot query has to scan a whole table."""
+    init_db()
+    queries = migrations.HOT_QUERIES + [(DASHBOARD_SQL, {"user_id": 1})]
+    problems = migrations.check_query_plans(get_db(), queries)
+    for sql, tables in problems:
+        click.echo(f"Full scan of {', '.join(tables)}: {' '.join(sql.split())}")
+    if problems:
+        raise click.ClickException(f"{len(problems)} queries are not served by an index")
+    click.echo(f"All {len(queries)} hot queries use an index")
+
+
+@app.cli.command("sync-unlocks")
+def sync_unlocks_command():
+    """Record every title and badge users qualify for but have not unlocked yet.
+
+    Runs by itself at startup when titles.json or badges.json changed; use it
+    after editing them on a running server, or after rebuild-progress.
+    """
+    init_db()
+    added = sum(achievements.sync(conn, catalog_loader.get().rules) for conn in user_dbs())
+    click.echo(f"Recorded {added} new unlocks")
+
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    """Generate the resized AVIF/WebP/PNG variants of badge and icon artwork."""
+    if not asset_pipeline.available:
+        raise click.ClickException("Pillow is required: pip install Pillow")
+    paths = asset_sources()
+    rebuilt, missing = asset_pipeline.build(paths)
+    click.echo(f"Rebuilt {rebuilt} of {len(paths)} images ({', '.join(asset_pipeline.formats)})")
+    for path in missing:
+        click.echo(f"  missing source: {path}")
+
+
+@app.cli.command("import-xp")
+@click.argument("source", type=click.File("r"), default="-")
+def import_xp_command(source):
+    """Import XP events from a JSON or NDJSON file ('-' for stdin).
+
+    Each event needs a user_id or username, a skill and an xp amount, and may
+    carry a timestamp.
+    """
+    init_db()
+    try:
+        events = ingest.normalize(ingest.parse_payload(source.read()))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    events, unknown = ingest.resolve_usernames(get_db(), events)
+    result = ingest.apply_events_routed(user_db, events, catalog_loader.get())
+    # Unlocks reach connected browsers when the server shares SOCKETIO_MESSAGE_QUEUE
+    xp_flushed(result["transitions"])
+
+    click.echo(f"Applied {result['applied']} events, skipped {result['skipped']} for unknown skills")
+    if unknown:
+        click.echo(f"Unknown users: {', '.join(unknown)}")
+    for t in result["transitions"]:
+        if t["current_level"] != t["old_level"]:
+            unlocked = ", ".join(t["titles"] + t["badges"])
+            click.echo(f"  user {t['user_id']} {t['skill']}: level {t['old_level']} -> {t['current_level']}"
+                       + (f" (unlocked {unlocked})" if unlocked else ""))
+
     
+@app.cli.command("provision-users")
+@click.argument("source", type=click.File("r"), default="-")
+def provision_users_command(source):
+    """Create accounts in bulk from a CSV file ('-' for stdin).
+
+    Columns: username, password and an optional IANA timezone; a header row
+    naming them is skipped. Existing usernames are left alone.
+    """
+    init_db()
+    rows = [row for row in csv.reader(source) if row and row[0].strip()]
+    if rows and [cell.strip().lower() for cell in rows[0][:2]] == ["username", "password"]:
+        rows = rows[1:]
+    if any(len(row) < 2 or not row[1] for row in rows):
+        raise click.ClickException("Every row needs a username and a password")
+
+    start = time.perf_counter()
+    hashes = password_hasher.hash_many([row[1] for row in rows])
+    hashed = time.perf_counter() - start
+    timezones = [row[2].strip() if len(row) > 2 else None for row in rows]
+    created = provision([
+        (row[0].strip(), password, timezone if challenges.valid_timezone(timezone) else None)
+        for row, password, timezone in zip(rows, hashes, timezones)
+    ])
+    click.echo(f"Created {len(created)} of {len(rows)} accounts in {time.perf_counter() - start:.1f}s "
+               f"({hashed:.1f}s hashing passwords)")
+    skipped = [row[0].strip() for row in rows if row[0].strip() not in created]
+    if skipped:
+        click.echo(f"Already taken: {', '.join(skipped[:20])}" + (f" and {len(skipped) - 20} more" if len(skipped) > 20 else ""))
+
+
+@app.cli.command("rebuild-progress")
+@click.option("--chunk-size", default=ledger.REPLAY_CHUNK_SIZE, show_default=True, help="Events read per query.")
+@click.option("--dry-run", is_flag=True, help="Only report rows that differ from the ledger.")
+def rebuild_progress_command(chunk_size, dry_run):
+    """Recompute every progress row by replaying the xp_events ledger."""
+    init_db()
+    conns = user_dbs()
+    total = sum(conn.execute("SELECT COUNT(*) FROM xp_events").fetchone()[0] for conn in conns)
+    start = time.perf_counter()
+    drift = []
+    with click.progressbar(length=total, label="Replaying ledger") as bar:
+        for conn in conns:
+            seen = [0]
+
+            def advance(events_so_far):
+                bar.update(events_so_far - seen[0])
+                seen[0] = events_so_far
+
+            drift += ledger.rebuild(conn, chunk_size, advance, dry_run=dry_run)
+    elapsed = time.perf_counter() - start
+
+    for _, user_id, skill, old, new in drift[:20]:
+        click.echo(f"  user {user_id} {skill}: level/xp {old} -> {new}")
+    if len(drift) > 20:
+        click.echo(f"  ... and {len(drift) - 20} more")
+    if not dry_run:
+        dashboard_cache.invalidate(*{user_id for _, user_id, _, _, _ in drift})
+    verb = "would change" if dry_run else "changed"
+    click.echo(f"Replayed {total} events in {elapsed:.1f}s; {verb} {len(drift)} progress rows")
+
+
+@app.cli.command("rebalance-shards")
+@click.option("--batch-size", default=500, show_default=True, help="Users scanned per batch.")
+def rebalance_shards_command(batch_size):
+    """Move users' rows to the shards DATABASE_SHARDS places them on. Run with the app stopped.
+
+    Also splits a single database when sharding is first turned on. Shard
+    files beyond DATABASE_SHARDS are emptied into the others and can be
+    deleted afterwards.
+    """
+    init_db()
+    router = db.get_router()
+    if not router.sharded:
+        raise click.ClickException("Set DATABASE_SHARDS to the number of shards first")
+    drained = []
+    while True:
+        path = db.shard_paths(app.config["DATABASE"], len(router.shards) + len(drained) + 1)[-1]
+        if not os.path.exists(path):
+            break
+        drained.append(db.ConnectionPool(path))
+        migrations.migrate(drained[-1].connection())
+
+    start = time.perf_counter()
+    moved = shards.rebalance(router, drained, batch_size,
+                             lambda total: click.echo(f"\r  moved {total} users", nl=False))
+    click.echo(f"\nMoved {sum(moved.values())} users in {time.perf_counter() - start:.1f}s")
+    for index, count in sorted(moved.items()):
+        click.echo(f"  {os.path.basename(router.shards[index].path)}: {count} users moved in")
+    for pool in drained:
+        pool.close_all()
+        click.echo(f"  {os.path.basename(pool.path)} is empty and can be deleted")
+
+
 @app.route('/delete_xp', methods=['POST'])
+@write_limited
 def delete_xp():
     data = request.get_json()
     skill = data.get('skill')
-    xp_to_delete = int(data.get('xp', 0))
+    try:
+        xp_to_delete = ingest.parse_xp(data.get('xp', 0))
+    except ingest.InvalidEvent as e:
+        return jsonify(success=False, error=str(e)), 400
 
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
     user_id = session['user_id']
-    cursor.execute("SELECT xp, level FROM progress WHERE user_id = ? AND skill = ?", (user_id, skill))
-    row = cursor.fetchone()
-
-    if row:
-        new_xp = row[0] - xp_to_delete
-        cursor.execute("UPDATE progress SET xp = ? WHERE skill = ? AND user_id = ?", (new_xp, skill, user_id))
-        conn.commit()
-        cursor.execute("SELECT level FROM progress WHERE skill = ?", (skill,))
-        current_level = cursor.fetchone()[0]
-        #Need logic to avoid level to go below 1
-        while new_xp < 0: 
-            if current_level == 1: 
-                new_xp = 0
-                cursor.execute("UPDATE progress SET xp = ? WHERE skill = ? AND user_id = ?", (new_xp, skill, user_id))
-                break
-            else:
-                cursor.execute("UPDATE progress SET level = ? WHERE skill = ? AND user_id = ? ", (current_level - 1, skill, user_id))
-                new_xp += (current_level - 1) * 100
-                cursor.execute("UPDATE progress SET xp = ? WHERE skill = ? AND user_id = ?", (new_xp, skill, user_id))
-                current_level -= 1
-        conn.commit()
-        conn.close()
-        return jsonify(success=True, level_down=(new_xp < 0))
+
+    # Level never goes below 1, XP floors at 0; the ledger records what was actually removed
+    result = grant_xp(user_id, skill, -xp_to_delete)
+
+    if result:
+        old_level, current_level, _ = result
+        return jsonify(success=True, level_down=(current_level < old_level))
             
     else:
-        conn.close()
         return jsonify(success=False, error="Skill not found"), 404
 
 @app.route('/daily_challenges', methods=['POST'])
+@write_limited
 def daily_challenges():
     data = request.get_json()
     challenge = data.get('challenge')
-    conn = sqlite3.connect("database.db")
-    cursor = conn.cursor()
     user_id = session['user_id']
-    cursor.execute("UPDATE daily set completed = ?  WHERE challenge = ? AND user_id = ?", (1, challenge, user_id))
-    conn.commit()
-    conn.close()
+    conn = user_db(user_id)
+    timezone = conn.execute("SELECT timezone FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    today = challenges.user_today(timezone)
+
+    if not challenges.complete(conn, user_id, challenge, today):
+        return jsonify(success=False, error="Challenge not found"), 404
+
+    dashboard_cache.invalidate(user_id)
+    announce_unlocks(user_id, achievements.after_challenge(conn, catalog_loader.get().rules, user_id, challenge, today))
     return jsonify(success=True)
-    
+
+
+@app.route('/api/challenges')
+def challenge_history():
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    user_id = session['user_id']
+    days = min(max(request.args.get('days', 30, type=int), 1), 3660)
+
+    conn = user_db(user_id)
+    timezone = conn.execute("SELECT timezone FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    today = challenges.user_today(timezone)
+    # Streaks are counted within the requested window
+    since = (date.fromisoformat(today) - timedelta(days=days)).isoformat()
+    history = challenges.history(conn, user_id, since)
+
+    return jsonify(today=today, history=history, streaks=challenges.streaks(history, today))
+
+
+def requested_board():
+    """The board named by the ?skill= or ?category= query parameter; global if neither is given."""
+    skill = request.args.get('skill')
+    category = request.args.get('category')
+    if category:
+        category = skills.category(category) or category
+    board = board_name(skill=skill, category=category)
+    return board if leaderboards.valid_board(board) else None
+
+
+@app.route('/api/leaderboard')
+def api_leaderboard():
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    board = requested_board()
+    if board is None:
+        return jsonify(success=False, error="Unknown skill or category"), 404
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    conns = user_dbs()
+    return jsonify(board=board,
+                   entries=leaderboards.top(conns, board, limit, offset),
+                   me=leaderboards.rank(conns, board, session['user_id']))
+
+
+@app.route('/api/leaderboard/me')
+def api_leaderboard_rank():
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    board = requested_board()
+    if board is None:
+        return jsonify(success=False, error="Unknown skill or category"), 404
+    return jsonify(board=board, **leaderboards.rank(user_dbs(), board, session['user_id']))
+
+
+def analytics_range(user_id, bucket):
+    """``(since, until, timezone)`` from ?since= / ?until= (YYYY-MM-DD, inclusive, in the user's timezone)."""
+    timezone = user_db(user_id).execute("SELECT timezone FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    until = request.args.get('until')
+    until = date.fromisoformat(until) if until else date.fromisoformat(challenges.user_today(timezone))
+    since = request.args.get('since')
+    since = date.fromisoformat(since) if since else analytics.default_since(until, bucket)
+    return since, until, timezone
+
+
+@app.route('/api/analytics')
+def api_analytics():
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    user_id = session['user_id']
+
+    bucket = request.args.get('bucket', 'week')
+    group = request.args.get('group', 'skill')
+    output = request.args.get('format', 'json')
+    if bucket not in analytics.BUCKETS or group not in analytics.GROUPS or output not in ('json', 'csv'):
+        return jsonify(success=False, error="Invalid bucket, group or format"), 400
+    try:
+        since, until, timezone = analytics_range(user_id, bucket)
+        # Building the buckets is where dates near year 1 or 9999 overflow
+        periods = analytics.buckets(since, until, bucket, timezone)
+    except (ValueError, OverflowError):
+        return jsonify(success=False, error="Dates must be YYYY-MM-DD"), 400
+
+    skill_names = None
+    if request.args.get('skill'):
+        skill_names = [request.args['skill']]
+    elif request.args.get('category'):
+        category = skills.category(request.args['category'])
+        if category is None:
+            return jsonify(success=False, error="Unknown category"), 404
+        skill_names = skills.skills_in(category)
+
+    rows = analytics.series(user_db(user_id), user_id, periods, group, skill_names)
+    if output == 'csv':
+        body = analytics.stream_csv(["bucket", group, "xp", "running_xp"], rows)
+        return Response(stream_with_context(body), mimetype="text/csv")
+
+    header = json.dumps({"bucket": bucket, "group": group, "since": since.isoformat(),
+                         "until": until.isoformat(), "timezone": timezone})
+    items = ({"bucket": label, group: key, "xp": xp, "running_xp": running} for label, key, xp, running in rows)
+    body = analytics.stream_json(header[:-1] + ', "series": [', items)
+    return Response(stream_with_context(body), mimetype="application/json")
+
+
+@app.route('/api/analytics/export')
+def api_analytics_export():
+    """The user's full XP history (or ?since= .. ?until=) as streamed CSV, NDJSON or JSON."""
+    if 'user_id' not in session:
+        return jsonify(success=False, error="Not logged in"), 401
+    user_id = session['user_id']
+
+    output = request.args.get('format', 'csv')
+    if output not in ('csv', 'ndjson', 'json'):
+        return jsonify(success=False, error="Invalid format"), 400
+    start = stop = None
+    try:
+        timezone = user_db(user_id).execute("SELECT timezone FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+        if request.args.get('since'):
+            start = analytics.to_epoch(date.fromisoformat(request.args['since']), timezone)
+        if request.args.get('until'):
+            stop = analytics.to_epoch(date.fromisoformat(request.args['until']) + timedelta(days=1), timezone)
+    except (ValueError, OverflowError):
+        return jsonify(success=False, error="Dates must be YYYY-MM-DD"), 400
+
+    rows = analytics.events(user_db(user_id), user_id, start, stop)
+    headers = {"Content-Disposition": f"attachment; filename=xp-history.{output}"}
+    if output == 'csv':
+        body = analytics.stream_csv(["timestamp", "skill", "xp"], rows)
+        return Response(stream_with_context(body), mimetype="text/csv", headers=headers)
+
+    items = ({"timestamp": timestamp, "skill": skill, "xp": xp} for timestamp, skill, xp in rows)
+    if output == 'ndjson':
+        body = (json.dumps(item) + "\n" for item in items)
+        return Response(stream_with_context(body), mimetype="application/x-ndjson", headers=headers)
+    body = analytics.stream_json('{"events": [', items)
+    return Response(stream_with_context(body), mimetype="application/json", headers=headers)
+
 
 if __name__ == '__main__':
+    # Development server with the debugger and reloader; see gunicorn.conf.py for production
+    create_app()
     init_db()  # Initialize the database at application startup
-    app.run(debug=True)
\ No newline at end of file
+    socketio.run(app, debug=True)
\ No newline at end of file
@@ -0,0 +1,156 @@
+# === assets.py ===
+# Responsive variants of the badge and icon artwork. The source PNGs are
+# ~500px and several hundred KB each but are shown at 64-100px, so every
+# source gets small AVIF/WebP/PNG renditions under static/build/ with the
+# content hash in the file name. Templates pick them through the `picture`
+# macro; the hashed URLs never change content, so they are served as immutable.
+#
+# Pillow is optional: without it, or before `flask build-assets` has run,
+# images fall back to the original files.
+import hashlib
+import io
+import json
+import os
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+WIDTHS = (64, 128, 256)
+
+# Best format first; the browser takes the first <source> type it supports
+FORMATS = ("avif", "webp", "png")
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "png": "image/png"}
+SAVE_OPTIONS = {
+    "avif": {"quality": 60, "speed": 8},
+    "webp": {"quality": 80, "method": 4},
+    "png": {"optimize": True},
+}
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetPipeline:
+    def __init__(self, static_folder, build_dir="build", widths=WIDTHS, formats=FORMATS):
+        self.static_folder = static_folder
+        self.build_dir = build_dir
+        self.widths = widths
+        if Image is not None:
+            Image.init()
+            # AVIF needs a Pillow build with libavif
+            formats = [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+        self.formats = list(formats)
+        self.manifest_path = os.path.join(static_folder, build_dir, "manifest.json")
+        self.manifest = self._load_manifest()
+        self._pictures = {}
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def normalize(path):
+        """Paths relative to the static folder; badges.json stores them as 'static/images/...'."""
+        path = path.lstrip("./")
+        return path[len("static/"):] if path.startswith("static/") else path
+
+    def _fresh(self, entry, source_hash):
+        if not entry or entry["source_hash"] != source_hash:
+            return False
+        return all(os.path.exists(os.path.join(self.static_folder, variant["path"]))
+                   for variants in entry["variants"].values() for variant in variants)
+
+    def _remove_stale(self, old_entry, variants):
+        keep = {variant["path"] for versions in variants.values() for variant in versions}
+        for versions in (old_entry or {}).get("variants", {}).values():
+            for variant in versions:
+                if variant["path"] not in keep:
+                    try:
+                        os.remove(os.path.join(self.static_folder, variant["path"]))
+                    except FileNotFoundError:
+                        pass
+
+    def build(self, paths):
+        """Generate missing or outdated variants for ``paths``.
+
+        Returns ``(rebuilt, missing)``: the number of sources re-encoded and the
+        paths that don't exist on disk (those keep serving nothing but their URL).
+        """
+        if not self.available:
+            raise RuntimeError("Pillow is required to build image variants")
+
+        rebuilt, missing = 0, []
+        for path in sorted({self.normalize(p) for p in paths}):
+            try:
+                with open(os.path.join(self.static_folder, path), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                missing.append(path)
+                continue
+            source_hash = _digest(data)
+            if self._fresh(self.manifest.get(path), source_hash):
+                continue
+
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+            stem, _ = os.path.splitext(path)
+            variants = {}
+            for fmt in self.formats:
+                for width in self.widths:
+                    if width > image.width:
+                        break
+                    height = round(image.height * width / image.width)
+                    buffer = io.BytesIO()
+                    image.resize((width, height), Image.LANCZOS).save(buffer, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+                    rendition = buffer.getvalue()
+                    name = f"{self.build_dir}/{stem}-{width}.{_digest(rendition)[:10]}.{fmt}"
+                    target = os.path.join(self.static_folder, name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with open(target, "wb") as f:
+                        f.write(rendition)
+                    variants.setdefault(fmt, []).append({"width": width, "path": name, "bytes": len(rendition)})
+
+            self._remove_stale(self.manifest.get(path), variants)
+            self.manifest[path] = {"source_hash": source_hash, "bytes": len(data), "variants": variants}
+            rebuilt += 1
+
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self._pictures.clear()
+        return rebuilt, missing
+
+    def picture(self, path, url_for_static):
+        """``{"src", "srcset", "sources"}`` for the picture macro, falling back to the original file."""
+        picture = self._pictures.get(path)
+        if picture is None:
+            picture = self._pictures[path] = self._picture(self.normalize(path), url_for_static)
+        return picture
+
+    def _picture(self, path, url_for_static):
+        entry = self.manifest.get(path)
+        if not entry:
+            return {"src": url_for_static(path), "srcset": "", "sources": []}
+
+        def srcset(fmt):
+            return ", ".join(f"{url_for_static(v['path'])} {v['width']}w" for v in entry["variants"][fmt])
+
+        sources = [{"type": MIME_TYPES[fmt], "srcset": srcset(fmt)}
+                   for fmt in self.formats if fmt != "png" and entry["variants"].get(fmt)]
+        png = entry["variants"].get("png")
+        if not png:
+            return {"src": url_for_static(path), "srcset": "", "sources": sources}
+        # Mid-size PNG as the plain <img> fallback for browsers without srcset
+        return {"src": url_for_static(png[len(png) // 2]["path"]), "srcset": srcset("png"), "sources": sources}
@@ -0,0 +1,88 @@
+# === benchmarks/bench_achievements.py ===
+# Unlock evaluation against thousands of synthetic rules (skill levels,
+# category and total levels, challenge streaks). Per XP write it compares
+#   - a brute-force pass over every rule, as /badges used to do per render,
+#   - the indexed lookup of the rules the change can cross, and
+#   - achievements.after_levels() end to end, with its reads and writes,
+# then times a full sync() backfill.
+#
+#   python benchmarks/bench_achievements.py [--rules 100,1000,10000] [--writes 2000] [--users 1000]
+import argparse
+import random
+import time
+
+from common import SKILLS, seed_users, temp_db_path
+
+import achievements
+import migrations
+from db import ConnectionPool
+from skills import CATEGORY_NAMES, SKILL_TO_CATEGORY
+
+
+def synthetic_rules(count, rng):
+    shapes = [
+        lambda: {"skill": rng.choice(SKILLS)[0], "level": rng.randint(2, 100)},
+        lambda: {"category": rng.choice(CATEGORY_NAMES), "level": rng.randint(5, 400)},
+        lambda: {"total_level": rng.randint(17, 1600)},
+        lambda: {"challenge": "Gym", "streak": rng.randint(2, 365)},
+    ]
+    badges = [{"name": f"Badge {i}", "unlock_condition": rng.choice(shapes)()} for i in range(count)]
+    return achievements.compile_rules({}, {"badges": badges})
+
+
+def brute_force(rules, levels, streak):
+    """Every rule checked against the user's current numbers."""
+    categories, total = {}, 0
+    for skill, level in levels.items():
+        categories[SKILL_TO_CATEGORY[skill]] = categories.get(SKILL_TO_CATEGORY[skill], 0) + level
+        total += level
+    values = {"skill": levels, "category": categories, "total": {None: total}, "streak": {"Gym": streak}}
+    return [rule for rule in rules if values[rule.input[0]].get(rule.input[1], 0) >= rule.threshold]
+
+
+def per_write_us(fn, writes):
+    start = time.perf_counter()
+    for args in writes:
+        fn(*args)
+    return (time.perf_counter() - start) / len(writes) * 1e6
+
+
+def main(args):
+    rng = random.Random(0)
+    conn = ConnectionPool(temp_db_path()).connection()
+    migrations.migrate(conn)
+    user_ids = seed_users(conn, args.users)
+    levels = {skill: rng.randint(1, 60) for skill, _ in SKILLS}
+    writes = [(rng.choice(SKILLS)[0], rng.randint(1, 59)) for _ in range(args.writes)]
+
+    print(f"{'rules':>7} {'brute force':>12} {'indexed':>9} {'after_levels':>13} {'sync':>20}")
+    for count in args.rules:
+        index = achievements.RuleIndex(synthetic_rules(count, rng))
+        brute = per_write_us(lambda skill, old: brute_force(index.rules, levels, 30), writes)
+        indexed = per_write_us(lambda skill, old: [index.crossed(key, old, old + 1) for key in
+                                                   (("skill", skill), ("category", SKILL_TO_CATEGORY[skill]),
+                                                    ("total", None))], writes)
+
+        conn.execute("DELETE FROM unlocks")
+        conn.execute("UPDATE progress SET level = 1")
+        targets = [(rng.choice(user_ids), skill, old) for skill, old in writes]
+
+        def write(user_id, skill, old):
+            conn.execute("UPDATE progress SET level = ? WHERE user_id = ? AND skill = ?", (old + 1, user_id, skill))
+            achievements.after_levels(conn, index, user_id, [(skill, old, old + 1)])
+
+        end_to_end = per_write_us(write, targets)
+        conn.execute("DELETE FROM unlocks")
+        start = time.perf_counter()
+        added = achievements.sync(conn, index)
+        sync_s = time.perf_counter() - start
+        print(f"{count:>7} {brute:>9.1f} us {indexed:>6.1f} us {end_to_end:>10.1f} us "
+              f"{sync_s:>6.2f} s ({added:>7} rows)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Achievement rule evaluation cost with many rules")
+    parser.add_argument("--rules", type=lambda value: [int(n) for n in value.split(",")], default=[100, 1000, 10000])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000)
+    main(parser.parse_args())
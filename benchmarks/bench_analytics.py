@@ -0,0 +1,92 @@
+# === benchmarks/bench_analytics.py ===
+# One user with a long XP history (1M ledger events over three years) and
+# the /api/analytics endpoints on top of it: bucketed series in SQL against
+# a naive fetch-everything-and-loop version, and streamed exports. Peak
+# Python memory is measured with tracemalloc for each.
+#
+#   python benchmarks/bench_analytics.py [--events 1000000] [--years 3]
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from common import SKILLS, load_app, logged_in_client, seed_users
+
+import ledger
+from db import get_db, transaction
+
+
+def generate_history(conn, user_id, count, years, seed=0):
+    rng = random.Random(seed)
+    stop = int(time.time())
+    start = stop - years * 365 * 86400
+    step = (stop - start) / count
+    with transaction(conn):
+        conn.executemany(ledger.INSERT_SQL, ((user_id, rng.choice(SKILLS)[0], rng.randint(1, 100), start + int(i * step))
+                                             for i in range(count)))
+
+
+def measure(fn):
+    """Wall time of one run, then peak Python memory of a second, traced run (tracing slows it down)."""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def naive_weekly(conn, user_id):
+    """Everything into Python, then bucket per event: what a per-request loop would do."""
+    rows = conn.execute("SELECT skill, xp, created_at FROM xp_events WHERE user_id = ?", (user_id,)).fetchall()
+    totals = defaultdict(int)
+    for skill, xp, created_at in rows:
+        week = datetime.fromtimestamp(created_at).strftime("%G-W%V")
+        totals[(week, skill)] += xp
+    return len(totals)
+
+
+def drain(response):
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    return size
+
+
+def main(args):
+    xp_app = load_app()
+    user_id, = seed_users(get_db(), 1)
+    start = time.perf_counter()
+    generate_history(get_db(), user_id, args.events, args.years)
+    print(f"generated {args.events} events over {args.years} years in {time.perf_counter() - start:.1f}s")
+
+    client = logged_in_client(xp_app, f"user{user_id}")
+    since = f"{datetime.now().year - args.years}-01-01"
+
+    rows, elapsed, peak = measure(lambda: naive_weekly(get_db(), user_id))
+    print(f"{'naive weekly (fetchall + loop)':<40} {elapsed * 1e3:8.0f} ms  peak {peak / 2**20:7.1f} MB  {rows} rows")
+
+    cases = [
+        ("series by month", f"/api/analytics?bucket=month&since={since}"),
+        ("series by week", f"/api/analytics?bucket=week&since={since}"),
+        ("series by day", f"/api/analytics?bucket=day&since={since}"),
+        ("series by week, per category", f"/api/analytics?bucket=week&group=category&since={since}"),
+        ("series by week, one skill, CSV", f"/api/analytics?bucket=week&skill=Logic&format=csv&since={since}"),
+        ("export CSV (all events)", "/api/analytics/export?format=csv"),
+        ("export JSON (all events)", "/api/analytics/export?format=json"),
+    ]
+    for label, url in cases:
+        size, elapsed, peak = measure(lambda: drain(client.get(url, buffered=False)))
+        print(f"{label:<40} {elapsed * 1e3:8.0f} ms  peak {peak / 2**20:7.1f} MB  {size / 2**20:7.1f} MB sent")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analytics series and export cost for one long history")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--years", type=int, default=3)
+    main(parser.parse_args())
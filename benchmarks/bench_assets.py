@@ -0,0 +1,97 @@
+# === benchmarks/bench_assets.py ===
+# Builds the responsive badge/icon variants and reports how many image bytes
+# each page costs before (original PNGs) and after (the variant a browser
+# picks from the srcset). Pictures are read back from the rendered HTML, so
+# this also checks that the templates go through the picture macro.
+#
+#   python benchmarks/bench_assets.py [--dpr 2] [--viewport 1280]
+import argparse
+import re
+import time
+
+from common import load_app, logged_in_client, seed_users
+
+import selections
+from db import get_db
+
+PICTURE = re.compile(r"<picture>(.*?)</picture>", re.S)
+SRCSET = re.compile(r'srcset="([^"]*)"')
+SIZES = re.compile(r'sizes="(\d+)(px|vw)"')
+
+
+def display_width(picture, viewport):
+    match = SIZES.search(picture)
+    if not match:
+        return viewport
+    value, unit = int(match.group(1)), match.group(2)
+    return value if unit == "px" else viewport * value // 100
+
+
+def choose(variants, width):
+    """The smallest variant at least ``width`` pixels wide, as a srcset-aware browser would pick."""
+    for variant in variants:
+        if variant["width"] >= width:
+            return variant
+    return variants[-1]
+
+
+def page_bytes(html, pipeline, by_url, dpr, viewport):
+    totals = {"original": 0, "pictures": 0, "unbuilt": 0}
+    for picture in PICTURE.findall(html):
+        totals["pictures"] += 1
+        first_url = SRCSET.search(picture)
+        source = by_url.get(first_url.group(1).split(",")[0].split()[0]) if first_url else None
+        if source is None:
+            totals["unbuilt"] += 1
+            continue
+        entry = pipeline.manifest[source]
+        totals["original"] += entry["bytes"]
+        width = display_width(picture, viewport) * dpr
+        for fmt, variants in entry["variants"].items():
+            totals[fmt] = totals.get(fmt, 0) + choose(variants, width)["bytes"]
+    return totals
+
+
+def main(args):
+    xp_app = load_app()
+    pipeline = xp_app.asset_pipeline
+    with xp_app.app.app_context():
+        paths = xp_app.asset_sources()
+    start = time.perf_counter()
+    rebuilt, missing = pipeline.build(paths)
+    print(f"built {rebuilt} of {len(paths)} images in {time.perf_counter() - start:.1f}s "
+          f"({len(missing)} missing sources, formats {', '.join(pipeline.formats)})")
+
+    by_url = {}
+    for source, entry in pipeline.manifest.items():
+        for variants in entry["variants"].values():
+            for variant in variants:
+                by_url[f"{xp_app.app.static_url_path}/{variant['path']}"] = source
+
+    # One user with every badge unlocked and a few of them on the dashboard
+    conn = get_db()
+    user_id, = seed_users(conn, 1)
+    conn.execute("UPDATE progress SET level = 100 WHERE user_id = ?", (user_id,))
+    badges = list(xp_app.catalog_loader.get().badge_images)[:3]
+    selections.apply(conn, user_id, [("badge", badge, "add") for badge in badges])
+    client = logged_in_client(xp_app, f"user{user_id}")
+
+    print(f"{'page':<12} {'images':>6} {'original':>10}" + "".join(f" {fmt:>9}" for fmt in pipeline.formats)
+          + "   saved (best format)")
+    for page in ("/dashboard", "/badges", "/card/red"):
+        html = client.get(page).get_data(as_text=True)
+        totals = page_bytes(html, pipeline, by_url, args.dpr, args.viewport)
+        best = min((totals.get(fmt, totals["original"]) for fmt in pipeline.formats), default=totals["original"])
+        saved = totals["original"] - best
+        share = saved / totals["original"] if totals["original"] else 0
+        print(f"{page:<12} {totals['pictures']:>6} {totals['original'] / 1024:>8.0f}KB"
+              + "".join(f" {totals.get(fmt, 0) / 1024:>7.0f}KB" for fmt in pipeline.formats)
+              + f"   {saved / 1024:.0f}KB ({share:.0%})"
+              + (f", {totals['unbuilt']} without variants" if totals["unbuilt"] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Image bytes per page with responsive AVIF/WebP variants")
+    parser.add_argument("--dpr", type=int, default=2, help="device pixel ratio used to pick from srcset")
+    parser.add_argument("--viewport", type=int, default=1280, help="viewport width for vw-sized images")
+    main(parser.parse_args())
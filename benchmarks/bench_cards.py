@@ -0,0 +1,38 @@
+# === benchmarks/bench_cards.py ===
+# Card page cost per request: a full render (what every /card_* hit used to
+# do), the JSON stats endpoint, and 304 revalidations of both.
+#
+#   python benchmarks/bench_cards.py [--requests 2000]
+import argparse
+import time
+
+from common import load_app, logged_in_client, register_users
+
+
+def measure(client, path, requests, headers=None):
+    status = size = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers or {})
+        status, size = response.status_code, len(response.data)
+    elapsed = time.perf_counter() - start
+    return status, size, elapsed / requests
+
+
+def main(requests):
+    xp_app = load_app()
+    register_users(xp_app, 1)
+    client = logged_in_client(xp_app, "user0")
+
+    print(f"{'request':<34} {'status':>6} {'bytes':>8} {'latency':>10}")
+    for path in ("/card/red", "/api/stats?category=red"):
+        etag = client.get(path).headers["ETag"]
+        for label, headers in (("full", None), ("revalidated", {"If-None-Match": etag})):
+            status, size, latency = measure(client, path, requests, headers)
+            print(f"{path + ' ' + label:<34} {status:>6} {size:>8} {latency * 1e6:>8.0f}us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Card page and stats API response size and latency")
+    parser.add_argument("--requests", type=int, default=2000)
+    main(parser.parse_args().requests)
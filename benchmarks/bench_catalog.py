@@ -0,0 +1,95 @@
+# === benchmarks/bench_catalog.py ===
+# Per-request cost of the title/badge lookups: the old code rebuilt or scanned
+# the raw JSON on every request, the catalog answers from prebuilt indexes.
+#
+#   python benchmarks/bench_catalog.py [--number 20000]
+import argparse
+import json
+import os
+import random
+import timeit
+
+from common import ROOT, SKILLS
+
+from catalog import CatalogLoader
+from skills import SKILL_TO_CATEGORY
+
+with open(os.path.join(ROOT, "titles.json")) as f:
+    TITLES = json.load(f)
+with open(os.path.join(ROOT, "badges.json")) as f:
+    BADGES = json.load(f)
+
+
+def legacy_dashboard():
+    title_info = {}
+    for skill, titles in TITLES.items():
+        for level, title in titles.items():
+            title_info[title] = {"skill": skill, "level": int(level)}
+    badge_images = {badge["name"]: badge["image"] for badge in BADGES.get("badges", [])}
+    skill_to_category = dict(SKILL_TO_CATEGORY)
+    return title_info, badge_images, skill_to_category
+
+
+def legacy_titles(stats):
+    unlocked_titles = {}
+    for skill, level in stats:
+        unlocked = [(int(req), title) for req, title in TITLES.get(skill, {}).items() if level >= int(req)]
+        if unlocked:
+            unlocked_titles[skill] = sorted(unlocked)
+    return unlocked_titles
+
+
+def legacy_badges(stats):
+    unlocked = []
+    for badge in BADGES.get("badges", []):
+        condition = badge.get("unlock_condition", {})
+        for skill_name, level in stats:
+            if skill_name == condition.get("skill") and level >= condition.get("level"):
+                unlocked.append({"name": badge.get("name"), "description": badge.get("description"),
+                                 "image": badge.get("image"), "category": condition.get("skill")})
+    return unlocked
+
+
+def legacy_add_xp(skill, old_level, new_level):
+    for req, title in TITLES.get(skill, {}).items():
+        if old_level < int(req) <= new_level:
+            return title
+
+
+def main(number):
+    loader = CatalogLoader(os.path.join(ROOT, "titles.json"), os.path.join(ROOT, "badges.json"))
+    rng = random.Random(0)
+    stats = [(skill, rng.randint(1, 60)) for skill, _ in SKILLS]
+
+    def new_dashboard():
+        catalog = loader.get()
+        return catalog.title_info, catalog.badge_images, catalog.skill_to_category
+
+    def new_titles():
+        catalog = loader.get()
+        return {skill: t for skill, level in stats if (t := catalog.titles_unlocked(skill, level))}
+
+    def new_badges():
+        catalog = loader.get()
+        return [badge for skill, level in stats for badge in catalog.badges_unlocked(skill, level)]
+
+    def new_add_xp():
+        crossed = loader.get().titles_crossed("Strength", 19, 31)
+        return crossed[0] if crossed else None
+
+    cases = [
+        ("dashboard", legacy_dashboard, new_dashboard),
+        ("titles", lambda: legacy_titles(stats), new_titles),
+        ("badges", lambda: legacy_badges(stats), new_badges),
+        ("add_xp title check", lambda: legacy_add_xp("Strength", 19, 31), new_add_xp),
+    ]
+    for name, old, new in cases:
+        old_us = timeit.timeit(old, number=number) / number * 1e6
+        new_us = timeit.timeit(new, number=number) / number * 1e6
+        print(f"{name:<20} before {old_us:8.2f} us   after {new_us:8.2f} us   ({old_us / new_us:5.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Title/badge lookup cost per request")
+    parser.add_argument("--number", type=int, default=20000)
+    main(parser.parse_args().number)
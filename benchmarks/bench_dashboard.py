@@ -0,0 +1,61 @@
+# === benchmarks/bench_dashboard.py ===
+# Dashboard read path: the five separate queries the route used to run, the
+# single-statement cold load, and full requests with the snapshot cache warm.
+#
+#   python benchmarks/bench_dashboard.py [--users 200] [--requests 5000]
+import argparse
+import random
+import time
+import timeit
+
+from common import load_app, logged_in_client, seed_users
+
+from db import get_db
+
+
+def legacy_queries(c, user_id):
+    c.execute("SELECT skill, category, xp, level FROM progress WHERE user_id = ?", (user_id,))
+    stats = c.fetchall()
+    c.execute("SELECT challenge, completed FROM daily WHERE user_id = ?", (user_id,))
+    daily = c.fetchall()
+    c.execute("SELECT username FROM users WHERE id = ?", (user_id,))
+    username = c.fetchone()[0]
+    c.execute("SELECT name FROM user_selections WHERE user_id = ? AND kind = 'title' ORDER BY position", (user_id,))
+    titles = [name for name, in c.fetchall()]
+    c.execute("SELECT name FROM user_selections WHERE user_id = ? AND kind = 'badge' ORDER BY position", (user_id,))
+    badges = [name for name, in c.fetchall()]
+    return stats, daily, username, titles, badges
+
+
+def main(args):
+    xp_app = load_app()
+    user_ids = seed_users(get_db(), args.users)
+    cursor = get_db().cursor()
+    number = 2000
+
+    legacy = timeit.timeit(lambda: legacy_queries(cursor, random.choice(user_ids)), number=number) / number
+    cold = timeit.timeit(lambda: xp_app.load_dashboard(random.choice(user_ids)), number=number) / number
+    print(f"cold load: five queries {legacy * 1e6:.1f} us, single statement {cold * 1e6:.1f} us")
+
+    clients = [logged_in_client(xp_app, f"user{user_id}") for user_id in user_ids[:20]]
+    rng = random.Random(0)
+    for label, write_ratio in (("read only", 0.0), ("10% add_xp", 0.1)):
+        xp_app.dashboard_cache.backend._data.clear()
+        xp_app.dashboard_cache.hits = xp_app.dashboard_cache.misses = xp_app.dashboard_cache.invalidations = 0
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            client = rng.choice(clients)
+            if rng.random() < write_ratio:
+                client.post("/add_xp", json={"skill": "Logic", "xp": 5})
+            client.get("/dashboard")
+        elapsed = time.perf_counter() - start
+        stats = xp_app.dashboard_cache.stats()
+        print(f"{label:<12} {args.requests / elapsed:8.0f} dashboards/s  hit ratio {stats['hit_ratio']:.2f}"
+              f"  ({stats['hits']} hits, {stats['misses']} misses, {stats['invalidations']} invalidations)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dashboard read model benchmark")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    main(parser.parse_args())
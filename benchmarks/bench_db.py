@@ -0,0 +1,119 @@
+# === benchmarks/bench_db.py ===
+# Mixed dashboard / add_xp traffic: a new rollback-journal connection per
+# request (the old behaviour) against the pooled WAL connections from db.py,
+# then the same mix through the real Flask routes.
+#
+#   python benchmarks/bench_db.py [--threads 8] [--duration 5] [--users 50]
+import argparse
+import random
+import sqlite3
+
+from common import SKILLS, load_app, logged_in_client, register_users, report, run_threads, temp_db_path
+
+import db
+
+WRITE_RATIO = 0.2
+
+SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL UNIQUE, password TEXT NOT NULL)",
+    "CREATE TABLE progress (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, skill TEXT NOT NULL,"
+    " category TEXT NOT NULL, xp INTEGER DEFAULT 0, level INTEGER DEFAULT 1)",
+    "CREATE TABLE daily (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, challenge TEXT NOT NULL,"
+    " completed BOOLEAN DEFAULT 0, UNIQUE(user_id, challenge))",
+]
+
+
+def seed(path, users):
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for user_id in range(1, users + 1):
+        conn.execute("INSERT INTO users (id, username, password) VALUES (?, ?, 'pw')", (user_id, f"user{user_id}"))
+        conn.executemany("INSERT INTO progress (user_id, skill, category) VALUES (?, ?, ?)",
+                         [(user_id, skill, category) for skill, category in SKILLS])
+    conn.commit()
+    conn.close()
+
+
+def dashboard_queries(conn, user_id):
+    conn.execute("SELECT skill, category, xp, level FROM progress WHERE user_id = ?", (user_id,)).fetchall()
+    conn.execute("SELECT challenge, completed FROM daily WHERE user_id = ?", (user_id,)).fetchall()
+    conn.execute("SELECT username FROM users WHERE id = ?", (user_id,)).fetchone()
+
+
+def add_xp_queries(conn, user_id, skill):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("SELECT xp, level FROM progress WHERE user_id = ? AND skill = ?", (user_id, skill)).fetchone()
+    conn.execute("UPDATE progress SET xp = xp + 10 WHERE user_id = ? AND skill = ?", (user_id, skill))
+    conn.commit()
+
+
+def make_worker(get_conn, release, users):
+    def worker(i, stop):
+        rng = random.Random(i)
+        ops = errors = 0
+        while not stop.is_set():
+            user_id = rng.randint(1, users)
+            conn = get_conn()
+            try:
+                if rng.random() < WRITE_RATIO:
+                    add_xp_queries(conn, user_id, rng.choice(SKILLS)[0])
+                else:
+                    dashboard_queries(conn, user_id)
+                ops += 1
+            except sqlite3.OperationalError:
+                errors += 1
+                if conn.in_transaction:
+                    conn.rollback()
+            finally:
+                release(conn)
+        return ops, errors
+    return worker
+
+
+def bench_connections(args):
+    legacy_path = temp_db_path("legacy.db")
+    seed(legacy_path, args.users)
+    legacy = make_worker(
+        lambda: sqlite3.connect(legacy_path, isolation_level=None, check_same_thread=False),
+        lambda conn: conn.close(),
+        args.users,
+    )
+    report("per-request connect, rollback journal", *run_threads(legacy, args.threads, args.duration))
+
+    pooled_path = temp_db_path("pooled.db")
+    seed(pooled_path, args.users)
+    pool = db.ConnectionPool(pooled_path)
+    pooled = make_worker(pool.connection, lambda conn: None, args.users)
+    report("pooled connections, WAL", *run_threads(pooled, args.threads, args.duration))
+    pool.close_all()
+
+
+def bench_routes(args):
+    xp_app = load_app()
+    usernames = register_users(xp_app, args.users)
+
+    def worker(i, stop):
+        rng = random.Random(i)
+        client = logged_in_client(xp_app, usernames[i % len(usernames)])
+        ops = errors = 0
+        while not stop.is_set():
+            if rng.random() < WRITE_RATIO:
+                response = client.post("/add_xp", json={"skill": rng.choice(SKILLS)[0], "xp": 10})
+            else:
+                response = client.get("/dashboard")
+            ops += 1
+            errors += response.status_code >= 500
+        return ops, errors
+
+    report("Flask routes (dashboard + add_xp)", *run_threads(worker, args.threads, args.duration))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mixed dashboard/add_xp throughput")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+    bench_connections(args)
+    bench_routes(args)
@@ -0,0 +1,57 @@
+# === benchmarks/bench_ingest.py ===
+# Bulk XP ingestion throughput: ingest.apply_events directly (what
+# `flask import-xp` runs) and the /add_xp/batch endpoint with an NDJSON body.
+#
+#   python benchmarks/bench_ingest.py [--users 1000] [--events 200000]
+import argparse
+import json
+import random
+import time
+
+from common import SKILLS, load_app, logged_in_client, seed_users
+
+import ingest
+from db import get_db
+
+
+def make_events(user_ids, count, rng):
+    return [{"user_id": rng.choice(user_ids), "skill": rng.choice(SKILLS)[0], "xp": rng.randint(1, 200),
+             "timestamp": 1700000000 + i} for i in range(count)]
+
+
+def bench_import(xp_app, user_ids, count):
+    raw = make_events(user_ids, count, random.Random(0))
+    payload = "\n".join(json.dumps(event) for event in raw)
+
+    start = time.perf_counter()
+    events = ingest.normalize(ingest.parse_payload(payload, "application/x-ndjson"))
+    parsed = time.perf_counter()
+    result = ingest.apply_events(get_db(), events, xp_app.catalog_loader.get())
+    done = time.perf_counter()
+
+    print(f"import-xp: {count} events, {len(result['transitions'])} skills updated")
+    print(f"  parse {parsed - start:.3f}s, apply {done - parsed:.3f}s -> {count / (done - start):,.0f} events/s")
+
+
+def bench_endpoint(xp_app, user_id, username, count):
+    rng = random.Random(1)
+    payload = "\n".join(json.dumps({"skill": rng.choice(SKILLS)[0], "xp": rng.randint(1, 200)}) for _ in range(count))
+    client = logged_in_client(xp_app, username)
+
+    start = time.perf_counter()
+    response = client.post("/add_xp/batch", data=payload, content_type="application/x-ndjson")
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.get_data(as_text=True)
+    print(f"/add_xp/batch: {count} events in one request -> {count / elapsed:,.0f} events/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk XP ingestion throughput")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=200000)
+    args = parser.parse_args()
+
+    xp_app = load_app()
+    user_ids = seed_users(get_db(), args.users)
+    bench_import(xp_app, user_ids, args.events)
+    bench_endpoint(xp_app, user_ids[0], f"user{user_ids[0]}", args.events // 10)
@@ -0,0 +1,132 @@
+# === benchmarks/bench_leaderboard.py ===
+# Leaderboard rank lookups at a million users: the naive GROUP BY, a COUNT
+# over the leaderboard index, and the in-memory rank index, followed by rank
+# lookups mixed with concurrent XP grants.
+#
+#   python benchmarks/bench_leaderboard.py [--users 1000000] [--threads 4] [--duration 5]
+import argparse
+import random
+import time
+
+from common import SKILLS, report, run_threads, temp_db_path
+
+import ledger
+import migrations
+from db import ConnectionPool, transaction
+from leaderboard import GLOBAL, Leaderboards, board_name
+
+
+def seed(conn, users, seed=0):
+    """Users with random XP in every skill, loaded before migration 6 so it fills the leaderboard table."""
+    rng = random.Random(seed)
+    migrations.migrate(conn, target=5)
+    with transaction(conn):
+        conn.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, ?)",
+                         ((i, f"user{i}", "pw") for i in range(1, users + 1)))
+        conn.executemany("INSERT INTO progress (user_id, skill, category, level, xp) VALUES (?, ?, ?, ?, ?)",
+                         ((i, skill, category, rng.randint(1, 40), rng.randint(0, 99))
+                          for i in range(1, users + 1) for skill, category in SKILLS))
+    migrations.migrate(conn)
+
+
+def timed(fn, samples):
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main(args):
+    pool = ConnectionPool(temp_db_path())
+    conn = pool.connection()
+    start = time.perf_counter()
+    seed(conn, args.users)
+    print(f"seeded {args.users} users in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(1)
+    pick = lambda: rng.randint(1, args.users)  # noqa: E731
+
+    def naive_rank():
+        user_id = pick()
+        conn.execute('''
+            WITH totals AS (SELECT user_id, SUM(50 * level * (level - 1) + xp) AS total FROM progress GROUP BY user_id)
+            SELECT COUNT(*) + 1 FROM totals WHERE total > (SELECT total FROM totals WHERE user_id = ?)
+        ''', (user_id,)).fetchone()
+
+    def count_rank():
+        user_id = pick()
+        total = conn.execute("SELECT total_xp FROM leaderboard WHERE board = 'global' AND user_id = ?",
+                             (user_id,)).fetchone()[0]
+        conn.execute("SELECT COUNT(*) + 1 FROM leaderboard WHERE board = 'global' AND total_xp > ?",
+                     (total,)).fetchone()
+
+    boards = Leaderboards()
+    skill_board = board_name(skill=SKILLS[0][0])
+    for board in (GLOBAL, skill_board):
+        start = time.perf_counter()
+        boards.rank(conn, board, 1)
+        print(f"built the {board} rank index in {time.perf_counter() - start:.2f}s")
+
+    for label, fn, samples in [
+        ("rank: GROUP BY over progress", naive_rank, args.naive_samples),
+        ("rank: COUNT over leaderboard index", count_rank, args.samples // 10),
+        ("rank: in-memory index", lambda: boards.rank(conn, GLOBAL, pick()), args.samples),
+        ("top 10: leaderboard index", lambda: boards.top(conn, GLOBAL, 10), args.samples),
+        ("top 10 at offset 10000", lambda: boards.top(conn, GLOBAL, 10, 10000), args.samples // 10),
+    ]:
+        p50, p99 = timed(fn, samples)
+        print(f"{label:<36} p50 {p50 * 1e3:9.3f} ms   p99 {p99 * 1e3:9.3f} ms")
+
+    def writer(i, stop):
+        local = pool.connection()
+        rng = random.Random(100 + i)
+        ops = 0
+        while not stop.is_set():
+            ledger.apply(local, rng.randint(1, args.users), rng.choice(SKILLS)[0], rng.randint(-50, 200))
+            ops += 1
+        return ops, 0
+
+    def reader(i, stop):
+        local = pool.connection()
+        rng = random.Random(200 + i)
+        ops = 0
+        while not stop.is_set():
+            boards.rank(local, rng.choice((GLOBAL, skill_board)), rng.randint(1, args.users))
+            ops += 1
+        return ops, 0
+
+    counts = {"grants": 0, "ranks": 0}
+
+    def mixed(i, stop):
+        kind, worker = ("grants", writer) if i % 2 == 0 else ("ranks", reader)
+        ops, errors = worker(i, stop)
+        counts[kind] += ops
+        return ops, errors
+
+    ops, errors, elapsed = run_threads(mixed, args.threads, args.duration)
+    report(f"grants + rank lookups ({args.threads} threads)", ops, errors, elapsed)
+    print(f"  {counts['grants'] / elapsed:.0f} grants/s, {counts['ranks'] / elapsed:.0f} rank lookups/s")
+
+    # The index followed the ledger during the run; it must agree with the table
+    mismatches = 0
+    for user_id in random.Random(3).sample(range(1, args.users + 1), 200):
+        for board in (GLOBAL, skill_board):
+            expected = conn.execute(
+                "SELECT COUNT(*) + 1 FROM leaderboard WHERE board = ? AND total_xp > "
+                "(SELECT COALESCE(MAX(total_xp), 0) FROM leaderboard WHERE board = ? AND user_id = ?)",
+                (board, board, user_id)).fetchone()[0]
+            mismatches += boards.rank(conn, board, user_id)["rank"] != expected
+    print(f"rank index vs SQL after concurrent writes: {mismatches} mismatches in 400 lookups")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Leaderboard rank lookups and updates at scale")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--naive-samples", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5.0)
+    main(parser.parse_args())
@@ -0,0 +1,97 @@
+# === benchmarks/bench_ledger.py ===
+# Fills the xp_events ledger with synthetic events, then measures
+#   - the cost of one XP grant (ledger insert + progress update) as the
+#     ledger grows, against a progress-only update, and
+#   - `rebuild-progress` replay throughput over the whole ledger.
+#
+#   python benchmarks/bench_ledger.py [--events 10000000] [--users 10000]
+import argparse
+import random
+import time
+
+from common import SKILLS, seed_users, temp_db_path
+
+import ledger
+import levels
+import migrations
+from db import ConnectionPool, transaction
+
+
+def generate_events(conn, user_ids, count, seed=0):
+    """Insert ``count`` random events, mostly grants with some removals, in time order."""
+    rng = random.Random(seed)
+    skills = [skill for skill, _ in SKILLS]
+    start = int(time.time()) - 365 * 86400
+    step = 365 * 86400 / count
+
+    def rows():
+        for i in range(count):
+            xp = rng.randint(1, 200) if rng.random() < 0.9 else -rng.randint(1, 100)
+            yield rng.choice(user_ids), rng.choice(skills), xp, start + int(i * step)
+
+    # Bulk load without the secondary index, as a restore would
+    conn.execute("DROP INDEX xp_events_user_time")
+    with transaction(conn):
+        conn.executemany(ledger.INSERT_SQL, rows())
+    conn.execute("CREATE INDEX xp_events_user_time ON xp_events (user_id, created_at)")
+
+
+def time_grants(conn, user_ids, samples, with_ledger):
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for _ in range(samples):
+        user_id, skill = rng.choice(user_ids), rng.choice(SKILLS)[0]
+        if with_ledger:
+            ledger.apply(conn, user_id, skill, 10)
+            continue
+        # What /add_xp did before the ledger: read, then overwrite in place
+        with transaction(conn):
+            row_id, xp, level = conn.execute("SELECT id, xp, level FROM progress WHERE user_id = ? AND skill = ?",
+                                             (user_id, skill)).fetchone()
+            level, xp = levels.add_xp(level, xp, 10)
+            conn.execute("UPDATE progress SET level = ?, xp = ? WHERE id = ?", (level, xp, row_id))
+    return (time.perf_counter() - start) / samples
+
+
+def report_grants(conn, user_ids, samples, label):
+    events = conn.execute("SELECT MAX(id) FROM xp_events").fetchone()[0] or 0
+    bare = time_grants(conn, user_ids, samples, with_ledger=False)
+    with_ledger = time_grants(conn, user_ids, samples, with_ledger=True)
+    print(f"grant at {events:>10} events ({label}): progress only {bare * 1e6:7.0f} us, "
+          f"with ledger {with_ledger * 1e6:7.0f} us (+{(with_ledger - bare) * 1e6:.0f} us)")
+
+
+def main(args):
+    conn = ConnectionPool(temp_db_path()).connection()
+    migrations.migrate(conn)
+    user_ids = seed_users(conn, args.users)
+
+    report_grants(conn, user_ids, args.samples, "empty ledger")
+
+    start = time.perf_counter()
+    generate_events(conn, user_ids, args.events)
+    print(f"generated {args.events} events in {time.perf_counter() - start:.1f}s")
+
+    # The synthetic events bypassed progress, so the first rebuild rewrites every row
+    start = time.perf_counter()
+    drift = ledger.rebuild(conn, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"rebuild: replayed {args.events} events in {elapsed:.1f}s "
+          f"({args.events / elapsed:,.0f} events/s), rewrote {len(drift)} progress rows")
+
+    start = time.perf_counter()
+    drift = ledger.rebuild(conn, args.chunk_size, dry_run=True)
+    elapsed = time.perf_counter() - start
+    print(f"verify:  replayed {args.events} events in {elapsed:.1f}s "
+          f"({args.events / elapsed:,.0f} events/s), {len(drift)} rows differ")
+
+    report_grants(conn, user_ids, args.samples, "full ledger")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="XP ledger write overhead and replay throughput")
+    parser.add_argument("--events", type=int, default=10000000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=ledger.REPLAY_CHUNK_SIZE)
+    main(parser.parse_args())
@@ -0,0 +1,62 @@
+# === benchmarks/bench_levels.py ===
+# Checks the closed-form level math in levels.py against the loops add_xp and
+# delete_xp used to run, on random (level, xp, amount) triples, then times
+# both for a large grant.
+#
+#   python benchmarks/bench_levels.py [--cases 200000] [--grant 100000]
+import argparse
+import random
+import timeit
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+import levels
+
+
+def legacy_add(level, xp, amount):
+    new_xp = xp + amount
+    while new_xp >= level * 100:
+        level += 1
+        new_xp -= (level - 1) * 100
+    return level, new_xp
+
+
+def legacy_remove(level, xp, amount):
+    new_xp = xp - amount
+    while new_xp < 0:
+        if level == 1:
+            new_xp = 0
+            break
+        new_xp += (level - 1) * 100
+        level -= 1
+    return level, new_xp
+
+
+def check(cases, seed=0):
+    rng = random.Random(seed)
+    for _ in range(cases):
+        level = rng.randint(1, 200)
+        xp = rng.randrange(level * 100)
+        amount = rng.choice([rng.randint(0, 1000), rng.randint(0, 10 ** 6)])
+        for legacy, closed in ((legacy_add, levels.add_xp), (legacy_remove, levels.remove_xp)):
+            expected = legacy(level, xp, amount)
+            got = closed(level, xp, amount)
+            assert got == expected, f"{closed.__name__}({level}, {xp}, {amount}) = {got}, loop gives {expected}"
+    print(f"closed form matches the legacy loops on {cases} random cases")
+
+
+def bench(grant):
+    number = 2000
+    loop = timeit.timeit(lambda: legacy_add(1, 0, grant), number=number) / number
+    closed = timeit.timeit(lambda: levels.add_xp(1, 0, grant), number=number) / number
+    level, _ = levels.add_xp(1, 0, grant)
+    print(f"grant of {grant} XP (level 1 -> {level}): loop {loop * 1e6:.1f} us, closed form {closed * 1e6:.2f} us")
+    print(f"old add_xp issued {level - 1} UPDATE/COMMIT pairs for this grant, now 1 transaction")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Level engine equivalence check and timing")
+    parser.add_argument("--cases", type=int, default=200000)
+    parser.add_argument("--grant", type=int, default=100000)
+    args = parser.parse_args()
+    check(args.cases)
+    bench(args.grant)
@@ -0,0 +1,55 @@
+# === benchmarks/bench_pages.py ===
+# HTML pages: server time per request with every fragment rendered (as
+# before the fragment cache) and with the user-independent ones from the
+# cache, and bytes on the wire uncompressed, gzip and (if the brotli package
+# is installed) brotli, with the time compression adds. The user has every
+# skill at level 30, so titles and badges are well populated.
+#
+#   python benchmarks/bench_pages.py [--requests 500]
+import argparse
+import time
+
+from common import SKILLS, load_app, logged_in_client, register_users
+
+import compression
+import levels
+
+PATHS = ("/card/red", "/card/blue", "/titles", "/badges", "/dashboard")
+
+
+def measure(client, path, requests, encoding=None):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+    return (time.perf_counter() - start) / requests, len(response.data), response.headers.get("Content-Encoding")
+
+
+def main(requests):
+    xp_app = load_app()
+    register_users(xp_app, 1)
+    client = logged_in_client(xp_app, "user0")
+    for skill, _ in SKILLS:
+        client.post("/add_xp", json={"skill": skill, "xp": levels.xp_to_reach(30)})
+    cached_fragment = xp_app.fragment_cache
+    encodings = ["gzip"] + (["br"] if compression.brotli else [])
+
+    print(f"{'path':<11} {'full render':>12} {'fragments':>10} {'identity':>9} "
+          + " ".join(f"{encoding:>14}" for encoding in encodings))
+    for path in PATHS:
+        xp_app.fragment_cache = lambda *key, caller: caller()
+        full, size, _ = measure(client, path, requests)
+        xp_app.fragment_cache = cached_fragment
+        cached, _, _ = measure(client, path, requests)
+        columns = []
+        for encoding in encodings:
+            latency, compressed, applied = measure(client, path, requests, encoding)
+            columns.append(f"{compressed:>6} +{(latency - cached) * 1e6:>4.0f}us" if applied else f"{'-':>14}")
+        print(f"{path:<11} {full * 1e6:>10.0f}us {cached * 1e6:>8.0f}us {size:>9} " + " ".join(columns))
+    print(f"fragment cache: {cached_fragment.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Page render time and bytes on the wire, per route")
+    parser.add_argument("--requests", type=int, default=500)
+    main(parser.parse_args().requests)
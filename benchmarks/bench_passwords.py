@@ -0,0 +1,79 @@
+# === benchmarks/bench_passwords.py ===
+# Login throughput at different password hashing costs. For each cost, N
+# threads log in as fast as they can through the real /login route while one
+# more thread keeps loading the dashboard, to show what a login storm does to
+# everything else. The hash pool is capped at --workers threads.
+#
+#   python benchmarks/bench_passwords.py [--costs 12,14,15,16] [--threads 8] [--workers 2] [--duration 5]
+import argparse
+import threading
+import time
+
+from common import load_app, logged_in_client, run_threads, seed_users
+
+from db import get_db
+
+
+def percentile_ms(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1e3 if values else 0.0
+
+
+def main(args):
+    xp_app = load_app()
+    hasher = xp_app.password_hasher
+    user_ids = seed_users(get_db(), args.threads)
+    print(f"scrypt, {args.threads} login threads, hash pool of {args.workers}")
+    print(f"{'cost (log2 N)':>13} {'hash ms':>8} {'logins/s':>9} {'login p95 ms':>13} {'dashboard p95 ms':>17} {'idle':>8}")
+
+    dashboard = logged_in_client(xp_app, f"user{user_ids[0]}")
+    for cost in args.costs:
+        hasher.configure("scrypt", cost, args.workers)
+        start = time.perf_counter()
+        stored = hasher.hash("pw")
+        hash_ms = (time.perf_counter() - start) * 1e3
+        get_db().execute("UPDATE users SET password = ?", (stored,))
+
+        idle = []
+        for _ in range(50):
+            start = time.perf_counter()
+            dashboard.get("/dashboard")
+            idle.append(time.perf_counter() - start)
+
+        login_times, page_times = [], []
+        stop_pages = threading.Event()
+
+        def pages():
+            while not stop_pages.is_set():
+                start = time.perf_counter()
+                dashboard.get("/dashboard")
+                page_times.append(time.perf_counter() - start)
+
+        def login(index, stop):
+            client = xp_app.app.test_client()
+            ops = errors = 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = client.post("/login", data={"username": f"user{user_ids[index]}", "password": "pw"})
+                login_times.append(time.perf_counter() - start)
+                ops += 1
+                errors += response.status_code != 302
+            return ops, errors
+
+        page_thread = threading.Thread(target=pages)
+        page_thread.start()
+        ops, errors, elapsed = run_threads(login, args.threads, args.duration)
+        stop_pages.set()
+        page_thread.join()
+        print(f"{cost:>13} {hash_ms:>8.1f} {ops / elapsed:>9.1f} {percentile_ms(login_times, 0.95):>13.1f} "
+              f"{percentile_ms(page_times, 0.95):>17.1f} {percentile_ms(idle, 0.95):>8.1f}"
+              + (f"  ({errors} failed)" if errors else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login throughput and collateral latency per password hashing cost")
+    parser.add_argument("--costs", type=lambda value: [int(n) for n in value.split(",")], default=[12, 14, 15, 16])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5.0)
+    main(parser.parse_args())
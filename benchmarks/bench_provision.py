@@ -0,0 +1,67 @@
+# === benchmarks/bench_provision.py ===
+# Account creation. The database side of one registration as register() used
+# to do it (one INSERT per progress and daily row) against provision_users(),
+# bulk onboarding of many accounts in one call, and the /register route end
+# to end. Passwords are pre-hashed except for the route, which hashes at
+# --cost so the numbers are not all scrypt.
+#
+#   python benchmarks/bench_provision.py [--accounts 10000] [--registrations 500] [--cost 12]
+import argparse
+import time
+
+from common import SKILLS, load_app
+
+import accounts
+import challenges
+from db import get_db, transaction
+
+HASH = "scrypt$ln=15,r=8,p=1$c2FsdA$a2V5"
+
+
+def legacy_register(conn, username):
+    with transaction(conn):
+        c = conn.cursor()
+        c.execute("INSERT INTO users (username, password, timezone) VALUES (?, ?, ?)", (username, HASH, None))
+        user_id = c.lastrowid
+        for skill, category in SKILLS:
+            c.execute("INSERT INTO progress (user_id, skill, category) VALUES (?, ?, ?)", (user_id, skill, category))
+        for challenge in challenges.DAILY_CHALLENGES:
+            c.execute("INSERT INTO daily (user_id, challenge, completed) VALUES (?, ?, ?)", (user_id, challenge, 0))
+
+
+def per_second(count, fn):
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
+
+
+def main(args):
+    xp_app = load_app(PASSWORD_COST=args.cost)
+    conn = get_db()
+    n = args.registrations
+
+    legacy = per_second(n, lambda: [legacy_register(conn, f"legacy{i}") for i in range(n)])
+    single = per_second(n, lambda: [accounts.provision_users(conn, [(f"single{i}", HASH, None)]) for i in range(n)])
+    print(f"{'one account per call, 21 INSERTs':<44} {legacy:>10,.0f} accounts/s")
+    print(f"{'one account per call, provision_users':<44} {single:>10,.0f} accounts/s")
+
+    bulk = per_second(args.accounts, lambda: accounts.provision_users(
+        conn, ((f"bulk{i}", HASH, None) for i in range(args.accounts))))
+    print(f"{f'{args.accounts} accounts in one provision_users call':<44} {bulk:>10,.0f} accounts/s")
+
+    client = xp_app.app.test_client()
+    route = per_second(n, lambda: [client.post("/register", data={"username": f"route{i}", "password": "pw"})
+                                   for i in range(n)])
+    print(f"{f'/register route (scrypt cost {args.cost})':<44} {route:>10,.0f} accounts/s")
+
+    rows = conn.execute("SELECT COUNT(*) FROM progress").fetchone()[0]
+    expected = (3 * n + args.accounts) * len(SKILLS)
+    print(f"progress rows: {rows} (expected {expected})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registration and bulk provisioning throughput")
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--registrations", type=int, default=500)
+    parser.add_argument("--cost", type=int, default=12, help="scrypt log2 N for the /register route")
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+# === benchmarks/bench_ratelimit.py ===
+# Well-behaved users during an abusive burst. --users threads each tap
+# "+10 XP" every --interval ms, as a person would; --abusers threads post
+# /add_xp from their own accounts at --abuse-rate requests a second between
+# them (or as fast as the server answers, if that is slower) and ignore 429s.
+# The abusive load is offered at a fixed rate rather than in a closed loop,
+# because here the clients share the server's process and CPU: a closed loop
+# spinning on instant 429s would mostly measure the clients.
+# Reports the well-behaved users' latency and failures, how many abusive
+# requests got through, and the admission queue counters, with
+# RATE_LIMIT_ENABLED off, with in-process buckets and with buckets shared
+# through the SQLite stand-in.
+#
+# create_app() runs once per process, so each mode runs in a child process.
+#
+#   python benchmarks/bench_ratelimit.py [--users 8] [--abusers 16] [--abuse-rate 1000] [--duration 5]
+import argparse
+import multiprocessing
+import time
+
+from common import SKILLS, logged_in_client, run_threads, seed_users, temp_db_path
+
+import db
+
+MODES = {
+    "unlimited": {"RATE_LIMIT_ENABLED": False},
+    "memory": {"RATE_LIMIT_ENABLED": True},
+    "sqlite": {"RATE_LIMIT_ENABLED": True, "RATE_LIMIT_URL": "sqlite:///" + temp_db_path("limits.db")},
+}
+
+
+def percentile_ms(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1e3 if values else 0.0
+
+
+def run_mode(mode, args, results):
+    from common import load_app
+
+    xp_app = load_app(PASSWORD_COST=10, WRITE_CONCURRENCY=args.concurrency, **MODES[mode])
+    user_ids = seed_users(db.get_db(), args.users + args.abusers)
+    clients = [logged_in_client(xp_app, f"user{user_id}") for user_id in user_ids]
+    skill = SKILLS[0][0]
+    latencies = []
+    abusive = {"ok": 0, "limited": 0}
+
+    def behave(client, stop):
+        ops = errors = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.post("/add_xp", json={"skill": skill, "xp": 10})
+            latencies.append(time.perf_counter() - start)
+            ops += 1
+            errors += response.status_code != 200
+            time.sleep(max(0.0, args.interval / 1000 - (time.perf_counter() - start)))
+        return ops, errors
+
+    def abuse(client, stop):
+        ops = errors = 0
+        period = args.abusers / args.abuse_rate
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            next_at += period
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+            status = client.post("/add_xp", json={"skill": skill, "xp": 10}).status_code
+            abusive["ok" if status == 200 else "limited"] += 1
+            ops += 1
+            errors += status not in (200, 429)
+        return ops, errors
+
+    def worker(index, stop):
+        if index < args.users:
+            return behave(clients[index], stop)
+        return abuse(clients[index], stop)
+
+    _, errors, elapsed = run_threads(worker, args.users + args.abusers, args.duration)
+    behaved = len(latencies)
+    results.put({
+        "mode": mode, "behaved": behaved, "elapsed": elapsed, "errors": errors,
+        "p50": percentile_ms(latencies, 0.50), "p99": percentile_ms(latencies, 0.99),
+        "max": max(latencies) * 1e3 if latencies else 0.0,
+        "abusive_ok": abusive["ok"], "abusive_limited": abusive["limited"],
+        "queue": xp_app.write_queue.stats(),
+    })
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.users} users tapping every {args.interval} ms, {args.abusers} abusive clients "
+          f"at {args.abuse_rate:.0f} req/s, "
+          f"{args.concurrency} concurrent writes")
+    print(f"{'mode':<10} {'users p50 ms':>13} {'p99 ms':>7} {'max ms':>7} {'user reqs':>10} "
+          f"{'abusive ok/s':>13} {'abusive 429':>12} {'shed':>5}")
+    for mode in args.modes:
+        results = context.Queue()
+        child = context.Process(target=run_mode, args=(mode, args, results))
+        child.start()
+        r = results.get()
+        child.join()
+        queue = r["queue"]
+        print(f"{r['mode']:<10} {r['p50']:>13.2f} {r['p99']:>7.2f} {r['max']:>7.1f} {r['behaved']:>10} "
+              f"{r['abusive_ok'] / r['elapsed']:>13.0f} {r['abusive_limited']:>12} "
+              f"{queue['rejected_full'] + queue['rejected_timeout']:>5}"
+              + (f"  ({r['errors']} failed)" if r["errors"] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Well-behaved users' write latency during an abusive burst")
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--abusers", type=int, default=16)
+    parser.add_argument("--interval", type=float, default=250, help="ms between a well-behaved user's taps")
+    parser.add_argument("--abuse-rate", type=float, default=1000, help="abusive requests per second, in total")
+    parser.add_argument("--concurrency", type=int, default=4, help="WRITE_CONCURRENCY")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--modes", type=lambda value: value.split(","), default=list(MODES))
+    main(parser.parse_args())
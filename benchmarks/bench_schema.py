@@ -0,0 +1,63 @@
+# === benchmarks/bench_schema.py ===
+# Generates a database with ~1M progress rows and times the hot per-user
+# queries on the base schema (migration 1) and again after the remaining
+# migrations have added the composite indexes.
+#
+#   python benchmarks/bench_schema.py [--rows 1000000] [--samples 200]
+import argparse
+import random
+import time
+
+from common import SKILLS, seed_users, temp_db_path
+
+import migrations
+from db import ConnectionPool
+
+QUERIES = [
+    ("progress by user", "SELECT skill, category, xp, level FROM progress WHERE user_id = ? ORDER BY id",
+     lambda user_id: (user_id,)),
+    ("progress by category", "SELECT skill, category, xp, level FROM progress WHERE category = 'Red' AND user_id = ?",
+     lambda user_id: (user_id,)),
+    ("add_xp lookup", "SELECT xp, level FROM progress WHERE user_id = ? AND skill = ?",
+     lambda user_id: (user_id, "Logic")),
+]
+
+
+def time_queries(conn, user_ids, samples):
+    rng = random.Random(0)
+    results = {}
+    for name, sql, params in QUERIES:
+        start = time.perf_counter()
+        for _ in range(samples):
+            conn.execute(sql, params(rng.choice(user_ids))).fetchall()
+        results[name] = (time.perf_counter() - start) / samples
+    return results
+
+
+def main(args):
+    conn = ConnectionPool(temp_db_path()).connection()
+    migrations.migrate(conn, target=1)
+
+    users = max(1, args.rows // len(SKILLS))
+    start = time.perf_counter()
+    user_ids = seed_users(conn, users)
+    print(f"generated {users} users / {users * len(SKILLS)} progress rows in {time.perf_counter() - start:.1f}s")
+
+    before = time_queries(conn, user_ids, args.samples)
+    start = time.perf_counter()
+    applied = migrations.migrate(conn)
+    print(f"applied migrations {applied} in {time.perf_counter() - start:.1f}s")
+    after = time_queries(conn, user_ids, args.samples)
+
+    for name, _, _ in QUERIES:
+        print(f"{name:<22} without indexes {before[name] * 1e3:9.3f} ms   with indexes {after[name] * 1e3:7.3f} ms")
+
+    problems = migrations.check_query_plans(conn)
+    print("every hot query uses an index" if not problems else f"full scans: {problems}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot query latency at 1M progress rows")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--samples", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,72 @@
+# === benchmarks/bench_selections.py ===
+# Title/badge toggles: the old read-modify-write of a JSON array per user
+# against single INSERT/DELETE statements on user_selections, for users with
+# a growing number of picks, plus a batch of toggles in one transaction.
+#
+#   python benchmarks/bench_selections.py [--users 1000] [--toggles 2000]
+import argparse
+import json
+import random
+import time
+
+from common import seed_users, temp_db_path
+
+import migrations
+import selections
+from db import ConnectionPool, transaction
+
+LEGACY_TABLE = "CREATE TABLE legacy_titles (user_id INTEGER PRIMARY KEY, selected_titles TEXT, selected_badges TEXT)"
+
+
+def legacy_toggle(conn, user_id, title, action):
+    """What /update_selected_titles did: load the array, edit it, write the whole row back."""
+    with transaction(conn):
+        row = conn.execute("SELECT selected_titles FROM legacy_titles WHERE user_id = ?", (user_id,)).fetchone()
+        picked = json.loads(row[0]) if row and row[0] else []
+        if action == "add" and title not in picked:
+            picked.append(title)
+        elif action == "remove" and title in picked:
+            picked.remove(title)
+        conn.execute("INSERT OR REPLACE INTO legacy_titles (user_id, selected_titles) VALUES (?, ?)",
+                     (user_id, json.dumps(picked)))
+
+
+def timed(fn, toggles):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) / toggles
+
+
+def main(args):
+    conn = ConnectionPool(temp_db_path()).connection()
+    migrations.migrate(conn)
+    conn.execute(LEGACY_TABLE)
+    user_ids = seed_users(conn, args.users)
+    rng = random.Random(0)
+
+    print(f"{'picks per user':>14} {'JSON rewrite':>14} {'row toggle':>12} {'batch of 20':>13}")
+    for picks in (5, 50, 500):
+        names = [f"Title {i}" for i in range(picks)]
+        with transaction(conn):
+            conn.execute("DELETE FROM user_selections")
+            conn.executemany("INSERT OR REPLACE INTO legacy_titles (user_id, selected_titles) VALUES (?, ?)",
+                             ((user_id, json.dumps(names)) for user_id in user_ids))
+            conn.executemany("INSERT INTO user_selections (user_id, kind, name, position) VALUES (?, 'title', ?, ?)",
+                             ((user_id, name, i) for user_id in user_ids for i, name in enumerate(names)))
+        ops = [(rng.choice(user_ids), f"Title {rng.randrange(picks * 2)}", rng.choice(selections.ACTIONS))
+               for _ in range(args.toggles)]
+
+        legacy = timed(lambda: [legacy_toggle(conn, *op) for op in ops], args.toggles)
+        single = timed(lambda: [selections.toggle(conn, user_id, "title", name, action) for user_id, name, action in ops],
+                       args.toggles)
+        batches = [ops[i:i + 20] for i in range(0, len(ops), 20)]
+        batched = timed(lambda: [selections.apply(conn, batch[0][0], [("title", name, action) for _, name, action in batch])
+                                 for batch in batches], args.toggles)
+        print(f"{picks:>14} {legacy * 1e6:>11.0f} us {single * 1e6:>9.0f} us {batched * 1e6:>10.0f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Selection toggles: JSON array rewrite vs normalized rows")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--toggles", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,110 @@
+# === benchmarks/bench_shards.py ===
+# Aggregate XP write throughput against the number of shards. For each
+# --shards count, --users accounts are provisioned across the shards and
+# --processes writer processes (separate processes, so neither the GIL nor
+# one connection pool serializes them) each grant XP to random users through
+# ledger.apply() for --duration seconds. Reports writes per second and the
+# p99 latency of a write, which includes waiting for the shard's writer
+# lock.
+#
+# Writes are only as durable as synchronous=NORMAL by default, where a WAL
+# commit does not wait for the disk; --synchronous FULL makes every commit
+# fsync, which is where one file's single writer hurts most. --dir picks the
+# filesystem (the default temp directory may be a tmpfs without real fsyncs).
+# On machines whose disk acknowledges fsyncs almost instantly (a VM with a
+# write-back cache), --fsync-ms holds the writer lock that much longer on
+# every commit to stand in for a disk that does not.
+#
+#   python benchmarks/bench_shards.py [--shards 1,2,4,8] [--processes 8] [--synchronous FULL] [--dir /var/tmp]
+#                                     [--fsync-ms 2]
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import SKILLS
+
+import accounts
+import db
+import ledger
+import migrations
+
+
+def percentile_ms(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1e3 if values else 0.0
+
+
+class SlowCommitConnection(sqlite3.Connection):
+    """Sleeps for ``delay`` seconds before each commit, with the writer lock still held."""
+
+    delay = 0.0
+
+    def commit(self):
+        time.sleep(self.delay)
+        super().commit()
+
+
+def writer(path, shards, user_ids, args, seed, start_at, results):
+    db.PRAGMAS = db.PRAGMAS + (f"PRAGMA synchronous = {args.synchronous}",)
+    SlowCommitConnection.delay = args.fsync_ms / 1000
+    router = db.ShardRouter(path, shards, SlowCommitConnection if args.fsync_ms else sqlite3.Connection)
+    rng = random.Random(seed)
+    latencies = []
+    time.sleep(max(0.0, start_at - time.time()))
+    stop_at = start_at + args.duration
+    while time.time() < stop_at:
+        user_id = rng.choice(user_ids)
+        start = time.perf_counter()
+        ledger.apply(router.for_user(user_id), user_id, rng.choice(SKILLS)[0], 10)
+        latencies.append(time.perf_counter() - start)
+    router.close_all()
+    results.put(latencies)
+
+
+def run(shards, args):
+    path = os.path.join(tempfile.mkdtemp(prefix="xp-bench-", dir=args.dir), "directory.db")
+    router = db.ShardRouter(path, shards)
+    for pool in router.pools():
+        migrations.migrate(pool.connection())
+    user_ids = list(accounts.provision_sharded(router, [(f"user{i}", "pw", None) for i in range(args.users)]).values())
+    router.close_all()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    # Spawned processes take a while to import; start writing together
+    start_at = time.time() + 2.0
+    children = [context.Process(target=writer, args=(path, shards, user_ids, args, seed, start_at, results))
+                for seed in range(args.processes)]
+    for child in children:
+        child.start()
+    latencies = [latency for _ in children for latency in results.get()]
+    for child in children:
+        child.join()
+    return len(latencies) / args.duration, percentile_ms(latencies, 0.50), percentile_ms(latencies, 0.99)
+
+
+def main(args):
+    print(f"{args.processes} writer processes, {args.users} users, synchronous={args.synchronous}, "
+          f"{os.cpu_count()} CPUs" + (f", {args.fsync_ms} ms simulated fsync" if args.fsync_ms else ""))
+    print(f"{'shards':>6} {'writes/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'vs 1 shard':>11}")
+    baseline = None
+    for shards in args.shards:
+        throughput, p50, p99 = run(shards, args)
+        baseline = baseline or throughput
+        print(f"{shards:>6} {throughput:>9.0f} {p50:>7.2f} {p99:>7.2f} {throughput / baseline:>10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate XP write throughput by shard count")
+    parser.add_argument("--shards", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4, 8])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--synchronous", choices=["OFF", "NORMAL", "FULL"], default="NORMAL")
+    parser.add_argument("--fsync-ms", type=float, default=0, help="extra time the writer lock is held per commit")
+    parser.add_argument("--dir", default=None, help="directory for the databases (default: the temp directory)")
+    main(parser.parse_args())
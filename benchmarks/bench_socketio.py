@@ -0,0 +1,60 @@
+# === benchmarks/bench_socketio.py ===
+# Title-unlock fan-out with many connected sockets. Clients are Flask-SocketIO
+# test clients, so this measures the server-side cost of an emit (room lookup,
+# packet encoding, per-client delivery) without network noise.
+#
+#   python benchmarks/bench_socketio.py [--clients 5000] [--emits 200]
+import argparse
+import time
+
+from common import load_app, seed_users
+
+from db import get_db
+
+
+def connect_clients(xp_app, user_ids):
+    sockets = []
+    for user_id in user_ids:
+        client = xp_app.app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+        sockets.append(xp_app.socketio.test_client(xp_app.app, flask_test_client=client))
+    return sockets
+
+
+def drain(sockets):
+    return sum(len(socket.get_received()) for socket in sockets)
+
+
+def main(args):
+    xp_app = load_app()
+    user_ids = seed_users(get_db(), args.clients)
+
+    start = time.perf_counter()
+    sockets = connect_clients(xp_app, user_ids)
+    print(f"connected {len(sockets)} sockets in {time.perf_counter() - start:.1f}s")
+
+    payload = {"message": "🎉 New Title Unlocked: Gym Goer at level 10 🎉"}
+    with xp_app.app.app_context():
+        start = time.perf_counter()
+        for i in range(args.emits):
+            xp_app.notify_user(user_ids[i % len(user_ids)], "show_title_animation", payload)
+        routed = (time.perf_counter() - start) / args.emits
+        routed_delivered = drain(sockets)
+
+        broadcasts = max(1, args.emits // 20)
+        start = time.perf_counter()
+        for _ in range(broadcasts):
+            xp_app.socketio.emit("show_title_animation", payload)
+        broadcast = (time.perf_counter() - start) / broadcasts
+        broadcast_delivered = drain(sockets)
+
+    print(f"per-user room emit  {routed * 1e6:10.0f} us/unlock, {routed_delivered / args.emits:.1f} messages each")
+    print(f"broadcast emit      {broadcast * 1e6:10.0f} us/unlock, {broadcast_delivered / broadcasts:.0f} messages each")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Socket.IO unlock fan-out latency")
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--emits", type=int, default=200)
+    main(parser.parse_args())
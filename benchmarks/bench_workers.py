@@ -0,0 +1,197 @@
+# === benchmarks/bench_workers.py ===
+# Throughput against the number of server processes sharing one SQLite/WAL
+# database. For each worker count the app is served either by a pre-fork
+# Werkzeug server (N processes accepting on one listening socket, each with
+# its own thread pool, which is what gunicorn's gthread workers do) or by
+# gunicorn itself with gunicorn.conf.py. Load comes from separate client
+# processes running the loadtest.py request mix over keep-alive HTTP.
+#
+#   python benchmarks/bench_workers.py [--workers 1,2,4] [--server prefork|gunicorn] [--mix mixed]
+#                                      [--clients 4] [--threads 8] [--duration 10] [--users 1000]
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from common import ROOT, temp_db_path
+
+from catalog import CatalogLoader
+from loadtest import MIXES, HTTPTransport, VirtualUser, percentile
+
+# Forked processes must not inherit an imported app or an open SQLite
+# connection, so this process never imports app.py: seeding runs in a child
+FORK = multiprocessing.get_context("fork")
+
+
+def seed_database(db_path, users, seed_value):
+    from common import load_app
+    from loadtest import seed
+    seed(load_app(db_path), users, seed_value)
+
+
+def serve(listener, db_path):
+    import logging
+    from werkzeug.serving import make_server
+    import app as xp_app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    xp_app.create_app({"DATABASE": db_path})
+    host, port = listener.getsockname()
+    make_server(host, port, xp_app.app, threaded=True, fd=listener.fileno()).serve_forever()
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"server on port {port} did not come up")
+
+
+def start_prefork(workers, db_path):
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1024)
+    port = listener.getsockname()[1]
+    processes = [FORK.Process(target=serve, args=(listener, db_path), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    listener.close()
+
+    def stop():
+        for process in processes:
+            process.terminate()
+            process.join()
+    return port, stop
+
+
+def start_gunicorn(workers, db_path, async_mode):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, DATABASE_PATH=db_path, WEB_CONCURRENCY=str(workers),
+               BIND=f"127.0.0.1:{port}", SOCKETIO_ASYNC_MODE=async_mode)
+    try:
+        process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:create_app()"],
+                                   cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        raise SystemExit(f"could not start gunicorn: {e}")
+
+    def stop():
+        process.terminate()
+        process.wait()
+    return port, stop
+
+
+def client(port, index, threads, duration, users, mix, results):
+    """One load-generating process; puts ``(latencies, errors)`` on ``results``."""
+    import threading
+
+    catalog = CatalogLoader(os.path.join(ROOT, "titles.json"), os.path.join(ROOT, "badges.json")).get()
+    weights = MIXES[mix]
+    operations, cumulative = list(weights), []
+    for operation in operations:
+        cumulative.append((cumulative[-1] if cumulative else 0) + weights[operation])
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker(thread_index):
+        rng = random.Random(index * 1000 + thread_index)
+        transport = HTTPTransport(port)
+        user = VirtualUser(transport, rng.randint(1, users), catalog, rng)
+        user.login()
+        mine, failed = [], 0
+        while not stop.is_set():
+            operation = rng.choices(operations, cum_weights=cumulative)[0]
+            started = time.perf_counter()
+            try:
+                statuses = user.run(operation)
+            except (OSError, http.client.HTTPException):
+                statuses = [599]
+            mine.append(time.perf_counter() - started)
+            failed += any(status >= 500 for status in statuses)
+        transport.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in pool:
+        thread.join()
+    results.put((latencies, errors[0]))
+
+
+def run_load(port, args):
+    results = FORK.Queue()
+    clients = [FORK.Process(target=client, args=(port, i, args.threads, args.duration, args.users, args.mix, results))
+               for i in range(args.clients)]
+    start = time.perf_counter()
+    for process in clients:
+        process.start()
+    latencies, errors = [], 0
+    for _ in clients:
+        mine, failed = results.get()
+        latencies.extend(mine)
+        errors += failed
+    for process in clients:
+        process.join()
+    return sorted(latencies), errors, time.perf_counter() - start
+
+
+def main(args):
+    db_path = temp_db_path("workers.db")
+    start = time.perf_counter()
+    seeder = multiprocessing.get_context("spawn").Process(target=seed_database, args=(db_path, args.users, args.seed))
+    seeder.start()
+    seeder.join()
+    if seeder.exitcode:
+        raise SystemExit("seeding failed")
+    print(f"seeded {args.users} users in {time.perf_counter() - start:.1f}s; {os.cpu_count()} CPUs; "
+          f"{args.clients} client processes x {args.threads} threads, mix {args.mix}")
+
+    print(f"{'workers':>7} {'ops/s':>8} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in args.workers:
+        if args.server == "gunicorn":
+            port, stop = start_gunicorn(workers, db_path, args.async_mode)
+        else:
+            port, stop = start_prefork(workers, db_path)
+        try:
+            wait_for_port(port)
+            latencies, errors, elapsed = run_load(port, args)
+        finally:
+            stop()
+        throughput = len(latencies) / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>7} {throughput:>8.0f} {throughput / baseline:>7.2f}x "
+              f"{percentile(latencies, 0.50) * 1e3:>8.2f} {percentile(latencies, 0.95) * 1e3:>8.2f} "
+              f"{percentile(latencies, 0.99) * 1e3:>8.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput against worker processes on one SQLite/WAL database")
+    parser.add_argument("--workers", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4])
+    parser.add_argument("--server", choices=("prefork", "gunicorn"), default="prefork")
+    parser.add_argument("--async-mode", choices=("threading", "eventlet", "gevent"), default="threading",
+                        help="gunicorn worker type (threading runs gthread)")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--clients", type=int, default=4, help="load-generating processes")
+    parser.add_argument("--threads", type=int, default=8, help="virtual users per client process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    main(parser.parse_args())
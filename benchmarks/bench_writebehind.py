@@ -0,0 +1,106 @@
+# === benchmarks/bench_writebehind.py ===
+# Bursty /add_xp load with XP_WRITE_BEHIND off and on. Every thread is one
+# user tapping "+10 XP" --burst times as fast as it can, then pausing for up
+# to --pause ms, like someone logging a set of reps. Reports request latency
+# and how often and how long requests waited for SQLite's writer lock, then
+# checks that the progress rows and the ledger hold every grant.
+#
+# create_app() runs once per process, so each mode runs in a child process.
+#
+#   python benchmarks/bench_writebehind.py [--threads 16] [--burst 5] [--pause 50] [--duration 5]
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import time
+
+from common import SKILLS, logged_in_client, run_threads, seed_users
+
+import db
+import levels
+
+
+def percentile_ms(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1e3 if values else 0.0
+
+
+lock_waits = []
+
+
+class LockTimedConnection(sqlite3.Connection):
+    """Records how long each BEGIN IMMEDIATE waited for the writer lock."""
+
+    def execute(self, sql, parameters=()):
+        if sql != "BEGIN IMMEDIATE":
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            lock_waits.append(time.perf_counter() - start)
+
+
+def run_mode(write_behind, args, results):
+    from common import load_app
+
+    xp_app = load_app(XP_WRITE_BEHIND=write_behind, XP_FLUSH_INTERVAL_MS=args.interval, PASSWORD_COST=10)
+    db.init_app(xp_app.app, factory=LockTimedConnection)
+    user_ids = seed_users(db.get_db(), args.threads)
+    clients = [logged_in_client(xp_app, f"user{user_id}") for user_id in user_ids]
+    skill = SKILLS[0][0]
+    latencies = []
+    lock_waits.clear()
+
+    def tap(index, stop):
+        rng = random.Random(index)
+        ops = errors = 0
+        while not stop.is_set():
+            for _ in range(args.burst):
+                start = time.perf_counter()
+                response = clients[index].post("/add_xp", json={"skill": skill, "xp": 10})
+                latencies.append(time.perf_counter() - start)
+                ops += 1
+                errors += response.status_code != 200
+            time.sleep(rng.uniform(0, args.pause / 1000))
+        return ops, errors
+
+    ops, errors, elapsed = run_threads(tap, args.threads, args.duration)
+    xp_app.xp_buffer.close()
+    conn = db.get_db()
+    total = sum(levels.total_xp(level, xp) for level, xp in conn.execute(
+        "SELECT level, xp FROM progress WHERE skill = ?", (skill,)))
+    events = conn.execute("SELECT COUNT(*), COALESCE(SUM(xp), 0) FROM xp_events").fetchone()
+    results.put({
+        "mode": "write-behind" if write_behind else "direct", "ops": ops, "errors": errors, "elapsed": elapsed,
+        "p50": percentile_ms(latencies, 0.50), "p99": percentile_ms(latencies, 0.99),
+        "locks": len(lock_waits), "lock_p99": percentile_ms(lock_waits, 0.99), "lock_total": sum(lock_waits),
+        "consistent": total == events[1] == 10 * ops and events[0] == ops,
+    })
+
+
+def main(args):
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.threads} users, bursts of {args.burst} taps, pauses up to {args.pause} ms, "
+          f"flush every {args.interval} ms")
+    print(f"{'mode':<13} {'req/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'write txns':>11} "
+          f"{'lock wait p99 ms':>17} {'lock wait total s':>18} {'consistent':>11}")
+    for write_behind in (False, True):
+        results = context.Queue()
+        child = context.Process(target=run_mode, args=(write_behind, args, results))
+        child.start()
+        r = results.get()
+        child.join()
+        print(f"{r['mode']:<13} {r['ops'] / r['elapsed']:>7.0f} {r['p50']:>7.2f} {r['p99']:>7.2f} {r['locks']:>11} "
+              f"{r['lock_p99']:>17.2f} {r['lock_total']:>18.2f} {str(r['consistent']):>11}"
+              + (f"  ({r['errors']} failed)" if r["errors"] else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bursty XP grants with and without the write-behind buffer")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--pause", type=float, default=50, help="max pause between bursts, in ms")
+    parser.add_argument("--interval", type=int, default=50, help="XP_FLUSH_INTERVAL_MS")
+    parser.add_argument("--duration", type=float, default=5.0)
+    main(parser.parse_args())
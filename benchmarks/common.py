@@ -0,0 +1,85 @@
+# === benchmarks/common.py ===
+# Helpers shared by the benchmark scripts. Every benchmark runs against a
+# throwaway database so the checked-in database.db is never touched.
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import skills  # noqa: E402  (needs ROOT on sys.path)
+
+SKILLS = [(skill.name, skill.category) for skill in skills.SKILLS]
+
+
+def temp_db_path(name="bench.db"):
+    return os.path.join(tempfile.mkdtemp(prefix="xp-bench-"), name)
+
+
+def load_app(db_path=None, **config):
+    """Import app.py, configure it against ``db_path`` (plus any ``config``) and create the schema."""
+    import app as xp_app
+    xp_app.create_app(dict(config, DATABASE=db_path or temp_db_path()))
+    xp_app.init_db()
+    return xp_app
+
+
+def register_users(xp_app, count, prefix="user"):
+    """Register ``count`` users through the real /register route."""
+    client = xp_app.app.test_client()
+    for i in range(count):
+        client.post("/register", data={"username": f"{prefix}{i}", "password": "pw"})
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+def seed_users(conn, count, prefix="user", password="pw"):
+    """Insert ``count`` users with a full set of skills directly, for benchmarks that need many rows."""
+    conn.execute("BEGIN")
+    start = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] + 1
+    ids = range(start, start + count)
+    conn.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, ?)",
+                     ((i, f"{prefix}{i}", password) for i in ids))
+    conn.executemany("INSERT INTO progress (user_id, skill, category) VALUES (?, ?, ?)",
+                     ((i, skill, category) for i in ids for skill, category in SKILLS))
+    conn.commit()
+    return list(ids)
+
+
+def logged_in_client(xp_app, username, password="pw"):
+    client = xp_app.app.test_client()
+    client.post("/login", data={"username": username, "password": password})
+    return client
+
+
+def run_threads(worker, threads, duration):
+    """Run ``worker(thread_index, stop_event)`` on N threads for ``duration`` seconds.
+
+    Each worker returns ``(operations, errors)``; the totals and the
+    elapsed wall time are returned.
+    """
+    stop = threading.Event()
+    results = [None] * threads
+
+    def target(i):
+        results[i] = worker(i, stop)
+
+    pool = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ops = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return ops, errors, elapsed
+
+
+def report(label, ops, errors, elapsed):
+    print(f"{label:<40} {ops / elapsed:>10.0f} ops/s  ({ops} ops, {errors} errors, {elapsed:.1f}s)")
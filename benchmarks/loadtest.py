@@ -0,0 +1,319 @@
+# === benchmarks/loadtest.py ===
+# End-to-end load test. Seeds a throwaway database with N users and random
+# progress, then runs virtual users against the real app with a weighted mix
+# of page views, XP bursts and selection toggles, either in-process through
+# the Flask test client or over HTTP against a threaded WSGI server on
+# localhost. Reports p50/p95/p99 latency per operation, throughput and
+# "database is locked" errors, and writes everything to a JSON file that a
+# later run can be compared against with --baseline.
+#
+#   python benchmarks/loadtest.py [--server wsgi] [--users 1000] [--threads 8] [--duration 20]
+#                                 [--mix browse|mixed|write-heavy] [--baseline results/previous.json]
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import threading
+import time
+from urllib.parse import urlencode
+
+from common import ROOT, load_app, seed_users, temp_db_path
+
+import ingest
+from db import get_db
+
+# Relative weights of each operation per mix
+MIXES = {
+    "browse": {"dashboard": 40, "card": 25, "api_stats": 10, "titles": 8, "badges": 5, "leaderboard": 7,
+               "add_xp_burst": 3, "toggle_selection": 2},
+    "mixed": {"dashboard": 25, "card": 15, "api_stats": 8, "titles": 4, "badges": 3, "leaderboard": 5,
+              "add_xp_burst": 25, "delete_xp": 3, "toggle_selection": 10, "login": 2},
+    "write-heavy": {"dashboard": 10, "card": 5, "add_xp_burst": 60, "delete_xp": 5, "toggle_selection": 20},
+}
+BURST_SIZE = 5
+CATEGORIES = ("red", "blue", "green", "gold")
+
+
+class TestClientTransport:
+    """Requests through Flask's test client: the app without HTTP parsing or sockets."""
+
+    def __init__(self, xp_app):
+        self.client = xp_app.app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self.client.open(path, method=method, data=form, json=json_body)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Keep-alive HTTP/1.1 to the local server, carrying the session cookie by hand."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {"Cookie": self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request instead of reusing a broken connection
+            self.conn.close()
+            raise
+        cookie = response.getheader("Set-Cookie")
+        if cookie:
+            self.cookie = cookie.split(";", 1)[0]
+        return response.status
+
+    def close(self):
+        self.conn.close()
+
+
+def start_wsgi_server(xp_app):
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log line per request
+    server = make_server("127.0.0.1", 0, xp_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(xp_app, users, seed_value):
+    """``users`` accounts with random XP in every skill, written through the real ingest path."""
+    rng = random.Random(seed_value)
+    conn = get_db()
+    user_ids = seed_users(conn, users, prefix="load")
+    conn.executemany("INSERT INTO daily (user_id, challenge) VALUES (?, ?)",
+                     ((user_id, challenge) for user_id in user_ids for challenge in xp_app.challenges.DAILY_CHALLENGES))
+    skills = list(xp_app.catalog_loader.get().skill_to_category)
+    events = [(user_id, skill, rng.randint(0, 5000), None) for user_id in user_ids for skill in skills]
+    for start in range(0, len(events), 50000):
+        ingest.apply_events(conn, events[start:start + 50000], xp_app.catalog_loader.get())
+    return user_ids
+
+
+class VirtualUser:
+    def __init__(self, transport, user_id, catalog, rng):
+        self.transport = transport
+        self.user_id = user_id
+        self.rng = rng
+        self.skills = list(catalog.skill_to_category)
+        self.titles = list(catalog.title_info)
+        self.badges = list(catalog.badge_images)
+
+    def login(self):
+        return self.transport.request("POST", "/login", form={"username": f"load{self.user_id}", "password": "pw"})
+
+    def run(self, operation):
+        """Perform one operation; returns the HTTP status codes of its requests."""
+        rng, request = self.rng, self.transport.request
+        if operation == "login":
+            return [self.login()]
+        if operation == "dashboard":
+            return [request("GET", "/dashboard")]
+        if operation == "card":
+            return [request("GET", f"/card/{rng.choice(CATEGORIES)}")]
+        if operation == "api_stats":
+            return [request("GET", "/api/stats")]
+        if operation == "titles":
+            return [request("GET", "/titles")]
+        if operation == "badges":
+            return [request("GET", "/badges")]
+        if operation == "leaderboard":
+            return [request("GET", "/api/leaderboard?" + urlencode({"skill": rng.choice(self.skills)}))]
+        if operation == "add_xp_burst":
+            skill = rng.choice(self.skills)
+            return [request("POST", "/add_xp", json_body={"skill": skill, "xp": rng.randint(1, 300)})
+                    for _ in range(BURST_SIZE)]
+        if operation == "delete_xp":
+            return [request("POST", "/delete_xp", json_body={"skill": rng.choice(self.skills), "xp": rng.randint(1, 100)})]
+        if operation == "toggle_selection":
+            if rng.random() < 0.5:
+                body = {"title": rng.choice(self.titles), "action": rng.choice(("add", "remove"))}
+                return [request("POST", "/update_selected_titles", json_body=body)]
+            body = {"title": rng.choice(self.badges), "action": rng.choice(("add", "remove"))}
+            return [request("POST", "/update_selected_badges", json_body=body)]
+        raise ValueError(operation)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(latencies, errors, elapsed):
+    ops = {}
+    for operation in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(operation, []))
+        ops[operation] = {
+            "count": len(values),
+            "errors": errors.get(operation, 0),
+            "throughput": len(values) / elapsed,
+            "mean_ms": 1e3 * sum(values) / len(values) if values else None,
+            "p50_ms": 1e3 * percentile(values, 0.50) if values else None,
+            "p95_ms": 1e3 * percentile(values, 0.95) if values else None,
+            "p99_ms": 1e3 * percentile(values, 0.99) if values else None,
+        }
+    return ops
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline_path, tolerance):
+    """Print p95 and throughput changes against an earlier result; returns the regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\ncompared with {baseline_path} ({baseline['meta'].get('revision')}, {baseline['meta']['started']})")
+    for operation, current in result["operations"].items():
+        before = baseline["operations"].get(operation)
+        if not before or not before["p95_ms"] or not current["p95_ms"]:
+            continue
+        change = current["p95_ms"] / before["p95_ms"] - 1
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"  {operation:<18} p95 {before['p95_ms']:8.2f} -> {current['p95_ms']:8.2f} ms ({change:+.0%}){flag}")
+        if flag:
+            regressions.append(operation)
+    change = result["throughput"] / baseline["throughput"] - 1
+    print(f"  {'requests/s':<18}     {baseline['throughput']:8.0f} -> {result['throughput']:8.0f}    ({change:+.0%})")
+    return regressions
+
+
+def main(args):
+    xp_app = load_app(temp_db_path("loadtest.db"))
+    start = time.perf_counter()
+    user_ids = seed(xp_app, args.users, args.seed)
+    print(f"seeded {len(user_ids)} users in {time.perf_counter() - start:.1f}s")
+    catalog = xp_app.catalog_loader.get()
+
+    lock_errors = []
+
+    def count_lock_errors(sender, exception, **extra):
+        if isinstance(exception, sqlite3.OperationalError) and "locked" in str(exception):
+            lock_errors.append(exception)
+
+    from flask import got_request_exception
+    got_request_exception.connect(count_lock_errors, xp_app.app, weak=False)
+
+    server = start_wsgi_server(xp_app) if args.server == "wsgi" else None
+    weights = MIXES[args.mix]
+    operations, cumulative = list(weights), []
+    for operation in operations:
+        cumulative.append((cumulative[-1] if cumulative else 0) + weights[operation])
+
+    latencies = [dict() for _ in range(args.threads)]
+    errors = [dict() for _ in range(args.threads)]
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        transport = HTTPTransport(server.server_port) if server else TestClientTransport(xp_app)
+        user = VirtualUser(transport, rng.choice(user_ids), catalog, rng)
+        user.login()
+        mine, failed = latencies[index], errors[index]
+        try:
+            while not stop.is_set():
+                operation = rng.choices(operations, cum_weights=cumulative)[0]
+                started = time.perf_counter()
+                try:
+                    statuses = user.run(operation)
+                except (OSError, http.client.HTTPException):
+                    statuses = [599]
+                mine.setdefault(operation, []).append(time.perf_counter() - started)
+                if any(status >= 500 for status in statuses):
+                    failed[operation] = failed.get(operation, 0) + 1
+        finally:
+            transport.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if server:
+        server.shutdown()
+
+    merged_latencies, merged_errors = {}, {}
+    for mine, failed in zip(latencies, errors):
+        for operation, values in mine.items():
+            merged_latencies.setdefault(operation, []).extend(values)
+        for operation, count in failed.items():
+            merged_errors[operation] = merged_errors.get(operation, 0) + count
+    summary = summarize(merged_latencies, merged_errors, elapsed)
+    total = sum(op["count"] for op in summary.values())
+
+    result = {
+        "meta": {
+            "started": started_at, "revision": git_revision(), "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version, "machine": platform.machine(), "cpus": os.cpu_count(),
+            "server": args.server, "mix": args.mix, "users": args.users, "threads": args.threads,
+            "duration": args.duration, "seed": args.seed,
+        },
+        "elapsed": elapsed,
+        "throughput": total / elapsed,
+        "errors": sum(op["errors"] for op in summary.values()),
+        "lock_errors": len(lock_errors),
+        "operations": summary,
+    }
+
+    print(f"{'operation':<18} {'count':>7} {'errors':>6} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for operation, op in summary.items():
+        print(f"{operation:<18} {op['count']:>7} {op['errors']:>6} {op['throughput']:>8.1f} "
+              f"{op['p50_ms']:>8.2f} {op['p95_ms']:>8.2f} {op['p99_ms']:>8.2f}")
+    print(f"{args.server}, {args.threads} threads, mix {args.mix}: {result['throughput']:.0f} operations/s, "
+          f"{result['errors']} errors, {result['lock_errors']} database-locked errors")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         f"loadtest-{args.server}-{args.mix}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.baseline:
+        regressions = compare(result, args.baseline, args.tolerance)
+        if regressions:
+            raise SystemExit(f"p95 regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the XP tracker with a realistic request mix")
+    parser.add_argument("--server", choices=("testclient", "wsgi"), default="testclient")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON results file (default: benchmarks/results/loadtest-*.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown before failing")
+    main(parser.parse_args())
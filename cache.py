@@ -0,0 +1,166 @@
+# === cache.py ===
+# Per-user read model cache. Snapshots are plain JSON-compatible data so the
+# same code works with the in-process LRU or a shared backend such as Redis.
+# Also the cache of template fragments that are the same for every user.
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with a per-entry TTL and a size bound."""
+
+    def __init__(self, maxsize=10000, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Shared backend for multi-process deployments.
+
+    Any client with Redis' ``get``/``set(ex=)``/``delete`` works, so tests and
+    local setups can hand in a stand-in such as ``fakeredis.FakeRedis()``.
+    """
+
+    def __init__(self, client, ttl=30.0, prefix="xp:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, ttl=30.0):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for a redis:// cache URL")
+        return cls(redis.Redis.from_url(url), ttl=ttl)
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def make_backend(url=None, maxsize=10000, ttl=30.0):
+    """Build a backend from a URL: empty or ``memory://`` for the LRU, ``redis://`` for Redis."""
+    if not url or url.startswith("memory://"):
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend.from_url(url, ttl=ttl)
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+class ReadModelCache:
+    """Caches one snapshot per user and counts hits and misses.
+
+    Writers call ``invalidate(user_id)`` after committing. Each invalidation
+    bumps a per-user generation, and a snapshot loaded before an invalidation
+    is not stored afterwards, so a slow reader cannot put stale data back.
+    """
+
+    def __init__(self, backend, namespace):
+        self.backend = backend
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _key(self, user_id):
+        return f"{self.namespace}:{user_id}"
+
+    def get_or_load(self, user_id, loader):
+        key = self._key(user_id)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        generation = self._generations.get(user_id, 0)
+        value = loader()
+        with self._lock:
+            if self._generations.get(user_id, 0) == generation:
+                self.backend.set(key, value)
+        return value
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+                self.backend.delete(self._key(user_id))
+                self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class FragmentCache:
+    """Rendered template fragments that come out the same for every user.
+
+    Templates wrap such a block in ``{% call cached_fragment("name", arg) %}``;
+    the body is rendered the first time a key is seen and replayed after
+    that. The key must name everything the body depends on. Fragments live
+    for the life of the process.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._fragments = {}
+
+    def __call__(self, *key, caller):
+        fragment = self._fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+            fragment = self._fragments[key] = caller()
+        else:
+            self.hits += 1
+        return fragment
+
+    def clear(self):
+        self._fragments = {}
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "fragments": len(self._fragments)}
@@ -0,0 +1,133 @@
+# === catalog.py ===
+# Titles and badges indexed once from titles.json / badges.json.
+#
+# Per skill, unlocks are kept as a level-sorted array so "everything unlocked
+# at level N" and "everything crossed going from level A to B" are bisect
+# lookups instead of scans over the whole JSON. The same files compile into
+# the achievement rules (achievements.py) that decide what a user unlocks.
+# CatalogLoader rebuilds everything when either file changes on disk.
+import json
+import os
+import threading
+import time
+
+import achievements
+from achievements import Thresholds
+from skills import SKILL_TO_CATEGORY
+
+
+_EMPTY = Thresholds([])
+
+TITLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "titles.json")
+BADGES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "badges.json")
+
+
+def selectable_names(titles_path=TITLES_PATH, badges_path=BADGES_PATH):
+    """``{"title": [...], "badge": [...]}``: every name a user can pick, read straight from the files."""
+    with open(titles_path) as f:
+        titles = json.load(f)
+    with open(badges_path) as f:
+        badges = json.load(f)
+    return {
+        "title": [title for by_level in titles.values() for title in by_level.values()],
+        "badge": [badge["name"] for badge in badges.get("badges", [])],
+    }
+
+
+class Catalog:
+    """Immutable index over the parsed titles.json and badges.json data."""
+
+    def __init__(self, titles, badges):
+        self.titles = titles
+        self.badges = badges
+        self.skill_to_category = SKILL_TO_CATEGORY
+
+        self.title_info = {}
+        title_pairs = {}
+        for skill, by_level in titles.items():
+            for level, title in by_level.items():
+                level = int(level)
+                self.title_info[title] = {"skill": skill, "level": level}
+                title_pairs.setdefault(skill, []).append((level, (level, title)))
+        self._titles = {skill: Thresholds(pairs) for skill, pairs in title_pairs.items()}
+
+        self.badge_images = {}
+        self.badge_info = {}
+        badge_pairs = {}
+        for badge in badges.get("badges", []):
+            condition = badge.get("unlock_condition", {})
+            self.badge_images[badge["name"]] = badge["image"]
+            entry = {
+                "name": badge.get("name"),
+                "description": badge.get("description"),
+                "image": badge.get("image"),
+                # A skill, or a category for badges on a category's total level
+                "category": condition.get("skill", condition.get("category")),
+            }
+            self.badge_info[badge["name"]] = entry
+            if "skill" in condition:
+                badge_pairs.setdefault(condition["skill"], []).append((condition.get("level"), entry))
+        self._badges = {skill: Thresholds(pairs) for skill, pairs in badge_pairs.items()}
+
+        self.rules = achievements.RuleIndex(achievements.compile_rules(titles, badges))
+
+    def titles_unlocked(self, skill, level):
+        """``(level, title)`` pairs unlocked for ``skill`` at ``level``, lowest first."""
+        return self._titles.get(skill, _EMPTY).up_to(level)
+
+    def titles_crossed(self, skill, old_level, new_level):
+        return self._titles.get(skill, _EMPTY).between(old_level, new_level)
+
+    def badges_unlocked(self, skill, level):
+        """Badge entries (name, description, image, category) unlocked for ``skill`` at ``level``."""
+        return self._badges.get(skill, _EMPTY).up_to(level)
+
+    def badges_crossed(self, skill, old_level, new_level):
+        return self._badges.get(skill, _EMPTY).between(old_level, new_level)
+
+
+class CatalogLoader:
+    """Hands out the current Catalog, rebuilding it when the JSON files change.
+
+    File modification times are checked at most once per ``check_interval``
+    seconds, so steady-state requests only pay for a clock read.
+    """
+
+    def __init__(self, titles_path, badges_path, check_interval=1.0):
+        self.paths = (titles_path, badges_path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._checked_at = 0.0
+        self._catalog = None
+        self.reload()
+
+    def _stat(self):
+        return tuple(os.stat(path).st_mtime_ns for path in self.paths)
+
+    def reload(self):
+        with self._lock:
+            mtimes = self._stat()
+            with open(self.paths[0]) as f:
+                titles = json.load(f)
+            with open(self.paths[1]) as f:
+                badges = json.load(f)
+            self._catalog = Catalog(titles, badges)
+            self._mtimes = mtimes
+            self._checked_at = time.monotonic()
+        return self._catalog
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                changed = self._stat() != self._mtimes
+            except OSError:
+                changed = False  # keep serving the last good catalog
+            if changed:
+                try:
+                    self.reload()
+                except (OSError, ValueError):
+                    pass  # half-written file; retry on the next check
+        return self._catalog
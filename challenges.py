@@ -0,0 +1,74 @@
+# === challenges.py ===
+# Daily challenges reset lazily. Completing one records the user's local date
+# on the daily row and in challenge_log; a challenge shows as done only while
+# that date is still today for the user, so nothing is ever reset in bulk.
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from db import transaction
+
+DAILY_CHALLENGES = ["Gym", "Running", "Reading", "Work"]
+
+
+def valid_timezone(name):
+    if not name:
+        return False
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def user_today(timezone=None):
+    """Today's date as YYYY-MM-DD in ``timezone``, or the server's local date if it is unset or unknown."""
+    if valid_timezone(timezone):
+        return datetime.now(ZoneInfo(timezone)).date().isoformat()
+    return date.today().isoformat()
+
+
+def complete(conn, user_id, challenge, day):
+    """Mark ``challenge`` done on ``day``. Returns False if the user has no such challenge."""
+    with transaction(conn):
+        cursor = conn.execute("UPDATE daily SET completed_on = ? WHERE challenge = ? AND user_id = ?",
+                              (day, challenge, user_id))
+        if cursor.rowcount == 0:
+            return False
+        conn.execute("INSERT OR IGNORE INTO challenge_log (user_id, challenge, day) VALUES (?, ?, ?)",
+                     (user_id, challenge, day))
+    return True
+
+
+def history(conn, user_id, since=None):
+    """``{challenge: [day, ...]}`` of completions on or after ``since``, oldest first, in one query."""
+    days = {}
+    rows = conn.execute(
+        "SELECT challenge, day FROM challenge_log WHERE user_id = ? AND day >= ? ORDER BY challenge, day",
+        (user_id, since or ""))
+    for challenge, day in rows:
+        days.setdefault(challenge, []).append(day)
+    return days
+
+
+def streaks(days_by_challenge, today):
+    """Current and longest run of consecutive days per challenge.
+
+    A current streak survives until the end of the day after its last
+    completion, so it doesn't drop to 0 just because today's isn't done yet.
+    """
+    today = date.fromisoformat(today)
+    result = {}
+    for challenge, days in days_by_challenge.items():
+        longest = run = 0
+        previous = None
+        for day in map(date.fromisoformat, days):
+            run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+            longest = max(longest, run)
+            previous = day
+        alive = previous is not None and today - previous <= timedelta(days=1)
+        result[challenge] = {
+            "current": run if alive else 0,
+            "longest": longest,
+            "last_completed": previous.isoformat() if previous else None,
+        }
+    return result
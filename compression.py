@@ -0,0 +1,67 @@
+# === compression.py ===
+# Response compression. Text responses of at least `min_size` bytes are sent
+# gzip- or, when the brotli package is installed and the client accepts it,
+# brotli-encoded. Pages compress several times over (the card pages are
+# mostly repeated markup and inline script), which matters more than the few
+# hundred microseconds compressing costs.
+#
+# Streamed responses (CSV/NDJSON exports) and partial ones are left alone.
+# A compressed response gets a weak ETag, because its bytes differ from the
+# uncompressed representation; conditional() matches weak tags.
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml",
+}
+
+# Fast settings: these run on every response, not once per file
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(accept_encodings):
+    """``br``, ``gzip`` or None for a werkzeug ``Accept-Encoding`` header."""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encodings, min_size=1024):
+    """Encode ``response`` in place if it is a complete text response the client can decode."""
+    # send_file() responses look streamed but are a file that can be read whole
+    streamed = response.is_streamed and not response.direct_passthrough
+    if (response.status_code != 200 or streamed or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE):
+        return response
+    # The encoding depends on the request header from here on, whatever the size
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    # Byte ranges would refer to the uncompressed file
+    response.headers.pop("Accept-Ranges", None)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,210 @@
+# === db.py ===
+import hashlib
+import os
+import sqlite3
+import threading
+import weakref
+from bisect import bisect
+from contextlib import contextmanager
+
+# Absolute default so the app works no matter which directory it is started from
+DEFAULT_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.db")
+
+# Applied once per connection when it is opened
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # readers no longer block on the XP writer
+    "PRAGMA synchronous = NORMAL",      # safe with WAL, one fsync per checkpoint instead of per commit
+    "PRAGMA cache_size = -16000",       # ~16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",       # wait for the writer lock instead of failing right away
+)
+
+# Size of sqlite3's per-connection prepared statement cache. The routes use
+# constant SQL strings, so every statement is compiled once per connection.
+STATEMENT_CACHE_SIZE = 256
+
+# Points per shard on the hash ring; with 256 each shard's share of users
+# stays within about 7% of 1/N
+RING_POINTS = 256
+
+
+class _Slot:
+    """Holds a thread's connection; it is closed when the slot is collected."""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """One connection per thread for a single database file, open for as long as the thread runs.
+
+    The connections live in a ``threading.local``. When eventlet or gevent
+    monkey-patch the ``threading`` module, that becomes greenlet-local, so
+    every greenlet gets its own connection as well. A threaded server or an
+    eventlet worker starts a thread or greenlet per client, so a connection
+    is closed as soon as its thread's locals are dropped; otherwise every
+    client that ever connected would keep a file descriptor open.
+    """
+
+    def __init__(self, path, factory=sqlite3.Connection):
+        self.path = os.path.abspath(path)
+        self.factory = factory
+        self._local = threading.local()
+        # Reentrant: a finalizer may run during garbage collection on a thread that holds it
+        self._lock = threading.RLock()
+        self._connections = {}  # {id(conn): finalizer that closes it}
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,  # autocommit; write paths open their own transactions
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=self.factory,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connection(self):
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = _Slot(self.connect())
+            with self._lock:
+                self._connections[id(slot.conn)] = weakref.finalize(slot, self._close, slot.conn)
+            self._local.slot = slot
+        return slot.conn
+
+    def _close(self, conn):
+        with self._lock:
+            self._connections.pop(id(conn), None)
+        conn.close()
+
+    def open_connections(self):
+        with self._lock:
+            return len(self._connections)
+
+    def close_all(self):
+        with self._lock:
+            finalizers = list(self._connections.values())
+        for close in finalizers:
+            close()  # a finalizer runs at most once, so the thread's exit will not close it again
+        self._local = threading.local()
+
+
+def shard_paths(path, count):
+    """Files of ``count`` shards next to the directory database: database.db -> database.shard0.db, ..."""
+    stem, ext = os.path.splitext(os.path.abspath(path))
+    return [f"{stem}.shard{i}{ext or '.db'}" for i in range(count)]
+
+
+def _ring_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+class ShardRouter:
+    """Picks the database that holds a user's rows.
+
+    Unsharded, that is the one database for everything. With shards, the
+    directory database keeps the accounts (username and password, for
+    logins and registration) and every user's progress, challenges, ledger,
+    selections and unlocks live in one shard, chosen by a consistent hash of
+    the user id. Shards have the full schema plus a copy of their users'
+    rows without the password, so per-user queries and triggers work there
+    unchanged. Points on the ring are named after the shard's position, so
+    going from N to N + 1 shards moves about 1/(N + 1) of the users (see
+    shards.rebalance()).
+    """
+
+    def __init__(self, path, shards=0, factory=sqlite3.Connection):
+        self.directory = ConnectionPool(path, factory)
+        self.shards = [ConnectionPool(shard_path, factory) for shard_path in shard_paths(path, shards)]
+        ring = sorted((_ring_hash(f"shard{i}-{point}"), i) for i in range(shards) for point in range(RING_POINTS))
+        self._points = [point for point, _ in ring]
+        self._owners = [owner for _, owner in ring]
+
+    @property
+    def sharded(self):
+        return bool(self.shards)
+
+    def shard_index(self, user_id):
+        """Position in ``shards`` of the shard that owns ``user_id``."""
+        i = bisect(self._points, _ring_hash(str(user_id)))
+        return self._owners[i % len(self._owners)]
+
+    def pool_for(self, user_id):
+        return self.shards[self.shard_index(user_id)] if self.shards else self.directory
+
+    def for_user(self, user_id):
+        """The calling thread's connection to the database holding ``user_id``'s rows."""
+        return self.pool_for(user_id).connection()
+
+    def user_pools(self):
+        """Every pool that holds per-user rows: the shards, or the one database."""
+        return self.shards or [self.directory]
+
+    def pools(self):
+        """The directory and every shard, e.g. for migrations."""
+        return [self.directory] + self.shards
+
+    def close_all(self):
+        for pool in self.pools():
+            pool.close_all()
+
+
+_router = None
+
+
+def init_app(app, factory=None):
+    """Open ``app.config['DATABASE']`` (and its DATABASE_SHARDS shards), optionally with a ``sqlite3.Connection`` subclass."""
+    global _router
+    if _router is not None:
+        _router.close_all()
+    _router = ShardRouter(app.config["DATABASE"], app.config.get("DATABASE_SHARDS", 0), factory or sqlite3.Connection)
+    return _router
+
+
+def get_router():
+    if _router is None:
+        raise RuntimeError("db.init_app() has not been called")
+    return _router
+
+
+def connection_stats():
+    """Open connections across the directory and every shard, for /metrics."""
+    return {"open": sum(pool.open_connections() for pool in _router.pools()) if _router else 0}
+
+
+def get_db():
+    """Return the calling thread's connection to the main (directory) database."""
+    return get_router().directory.connection()
+
+
+def user_db(user_id):
+    """Return the calling thread's connection to the database holding ``user_id``'s rows."""
+    return get_router().for_user(user_id)
+
+
+def user_dbs():
+    """The calling thread's connections to every database holding per-user rows."""
+    return [pool.connection() for pool in get_router().user_pools()]
+
+
+@contextmanager
+def transaction(conn, immediate=True):
+    """Run the block in one transaction and commit it once at the end.
+
+    ``BEGIN IMMEDIATE`` takes the writer lock up front, so a read-modify-write
+    inside the block cannot interleave with another writer.
+    """
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
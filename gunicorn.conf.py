@@ -0,0 +1,104 @@
+# === gunicorn.conf.py ===
+# Production serving:
+#
+#   gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# The master brings the schema up to date once in `on_starting`, before any
+# worker forks; workers only build the app. Resized images are built at
+# deploy time with `flask --app "app:create_app()" build-assets`.
+#
+# Settings come from the same environment variables as app.py, plus:
+#   BIND                 address to listen on (127.0.0.1:8000)
+#   WEB_CONCURRENCY      worker processes (1)
+#   SOCKETIO_ASYNC_MODE  eventlet (default) or gevent workers; threading runs gthread
+#
+# Socket.IO needs every request of a long-polling session to reach the same
+# worker, and gunicorn cannot route by client. Two ways to scale out:
+#
+# 1. Several instances with one worker each, on their own ports, behind a
+#    proxy with sticky sessions, e.g. nginx:
+#
+#      upstream xp_tracker {
+#          ip_hash;
+#          server 127.0.0.1:8001;
+#          server 127.0.0.1:8002;
+#      }
+#      location / {
+#          proxy_pass http://xp_tracker;
+#          proxy_http_version 1.1;
+#          proxy_set_header Upgrade $http_upgrade;
+#          proxy_set_header Connection "upgrade";
+#          proxy_set_header Host $host;
+#      }
+#
+#      BIND=127.0.0.1:8001 gunicorn -c gunicorn.conf.py "app:create_app()"
+#      BIND=127.0.0.1:8002 gunicorn -c gunicorn.conf.py "app:create_app()"
+#
+# 2. One instance with WEB_CONCURRENCY > 1 and SOCKETIO_WEBSOCKET_ONLY=1, so
+#    browsers never long-poll and no stickiness is needed.
+#
+# Either way the processes have to share state that otherwise lives in memory:
+#   SOCKETIO_MESSAGE_QUEUE  redis://... across hosts, or sqlite:///var/tmp/xp-socketio.db
+#                           as a local stand-in on one host (see messagequeue.py)
+#   DASHBOARD_CACHE_URL     redis://...; with the in-process default a worker
+#                           can serve a dashboard snapshot that another worker
+#                           has already invalidated, for up to DASHBOARD_CACHE_TTL
+#   RATE_LIMIT_URL          redis://... or sqlite:///var/tmp/xp-limits.db; with the
+#                           in-process default each worker allows the full write rate
+# XP_WRITE_BEHIND keeps each worker's unflushed grants in that worker, so a
+# user whose requests alternate between workers can briefly see the levels
+# of only some of their taps; option 1 keeps every user on one worker.
+# All workers write to the same SQLite file in WAL mode, so writes are
+# serialized by SQLite's writer lock; reads scale with the worker count.
+# DATABASE_SHARDS=N gives each shard its own writer lock (see db.ShardRouter);
+# after changing it, stop the server and run `flask rebalance-shards`.
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# app.py reads this at import time to monkey-patch before anything else loads
+os.environ.setdefault("SOCKETIO_ASYNC_MODE", "eventlet")
+
+bind = os.getenv("BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = {"eventlet": "eventlet", "gevent": "gevent"}.get(os.environ["SOCKETIO_ASYNC_MODE"], "gthread")
+worker_connections = 1000  # concurrent greenlets per eventlet/gevent worker
+threads = int(os.getenv("GUNICORN_THREADS", "8"))  # gthread only
+timeout = 30
+graceful_timeout = 30
+# The app is imported in each worker, after the worker has patched the
+# standard library; preloading it in the master would import it unpatched
+preload_app = False
+
+
+def on_starting(server):
+    """Apply pending migrations and backfill unlocks once, in the master, before any worker starts."""
+    import achievements
+    import db
+    import migrations
+    from catalog import CatalogLoader
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    rules = CatalogLoader(os.path.join(here, "titles.json"), os.path.join(here, "badges.json")).get().rules
+    router = db.ShardRouter(os.getenv("DATABASE_PATH", db.DEFAULT_DATABASE), int(os.getenv("DATABASE_SHARDS", "0")))
+    try:
+        for pool in router.pools():
+            applied = migrations.migrate(pool.connection())
+            server.log.info("schema migrated path=%s applied=%s", pool.path, applied or "none")
+        unlocked = sum(achievements.sync_if_changed(pool.connection(), rules) for pool in router.user_pools())
+    finally:
+        router.close_all()  # no SQLite connection may cross the fork
+    server.log.info("unlocks_backfilled=%s", unlocked)
+    if workers > 1 and not os.getenv("DASHBOARD_CACHE_URL"):
+        server.log.warning("%d workers with an in-process dashboard cache; set DASHBOARD_CACHE_URL", workers)
+    if workers > 1 and os.getenv("RATE_LIMIT_ENABLED", "") not in ("", "0") and not os.getenv("RATE_LIMIT_URL"):
+        server.log.warning("%d workers with in-process rate limits; set RATE_LIMIT_URL", workers)
+
+
+def worker_exit(server, worker):
+    """Write XP grants still held by the write-behind buffer before the worker goes away."""
+    import app
+
+    app.xp_buffer.close()
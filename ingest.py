@@ -0,0 +1,208 @@
+# === ingest.py ===
+# Bulk XP imports shared by the /add_xp/batch endpoint and the `flask import-xp`
+# command. A batch is applied in one transaction: the affected progress rows
+# are read once, every event is folded into an in-memory running total per
+# (user, skill), and the results are written back with a single executemany.
+# The change each event actually made is appended to the XP ledger alongside.
+# With DATABASE_SHARDS, apply_events_routed() runs one such transaction per
+# shard.
+import json
+from datetime import datetime, timezone
+
+import ledger
+import levels
+from db import transaction
+
+# Stay well below SQLite's bound-parameter limit for IN (...) lookups
+CHUNK_SIZE = 500
+
+# Largest XP one event or one /add_xp tap may grant or remove
+MAX_GRANT_XP = 1_000_000
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def parse_xp(value):
+    """An event's XP as an int within +-MAX_GRANT_XP; raises InvalidEvent otherwise."""
+    try:
+        xp = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidEvent(f"xp must be an integer, not {value!r}")
+    if abs(xp) > MAX_GRANT_XP:
+        raise InvalidEvent(f"xp must be between {-MAX_GRANT_XP} and {MAX_GRANT_XP}")
+    return xp
+
+
+def _objects(events):
+    """``events`` if it is a list of JSON objects; raises InvalidEvent otherwise."""
+    if not isinstance(events, list):
+        raise InvalidEvent("Expected a list of events")
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise InvalidEvent(f"Event {index} is not an object")
+    return events
+
+
+def _lines(body):
+    return _objects([json.loads(line) for line in body.splitlines() if line.strip()])
+
+
+def parse_payload(body, content_type=""):
+    """Return the raw event dicts from a JSON array, ``{"events": [...]}`` or NDJSON text.
+
+    Raises InvalidEvent (a ValueError, as is malformed JSON) for anything
+    that is not a list of objects.
+    """
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return _lines(body)
+
+    stripped = body.lstrip()
+    if not stripped:
+        return []
+    if stripped[0] in "[{":
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            # A file of one JSON object per line
+            return _lines(body)
+        if isinstance(data, dict):
+            data = data.get("events", [data] if "skill" in data else [])
+        return _objects(data)
+    raise InvalidEvent("Expected a JSON array, an object with 'events' or NDJSON")
+
+
+def _parse_timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc).isoformat()
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise InvalidEvent(f"Invalid timestamp: {value!r}")
+
+
+def normalize(raw_events, default_user_id=None):
+    """Validate raw event dicts into ``(user, skill, xp, timestamp)`` tuples.
+
+    ``user`` is the ``user_id`` if given, otherwise the ``username`` (resolved
+    later by ``resolve_usernames``), otherwise ``default_user_id``.
+    """
+    events = []
+    for index, raw in enumerate(raw_events):
+        if not isinstance(raw, dict):
+            raise InvalidEvent(f"Event {index} is not an object")
+        user = raw.get("user_id", raw.get("user", raw.get("username", default_user_id)))
+        skill = raw.get("skill")
+        if user is None or not skill:
+            raise InvalidEvent(f"Event {index} needs a user and a skill")
+        try:
+            xp = parse_xp(raw.get("xp", 0))
+        except InvalidEvent as e:
+            raise InvalidEvent(f"Event {index}: {e}")
+        events.append((user, skill, xp, _parse_timestamp(raw.get("timestamp"))))
+    return events
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def resolve_usernames(conn, events):
+    """Replace usernames in normalized events with user ids. Unknown users are dropped and returned."""
+    names = {user for user, _, _, _ in events if isinstance(user, str) and not user.isdigit()}
+    ids = {}
+    for chunk in _chunks(names):
+        placeholders = ",".join("?" * len(chunk))
+        ids.update(conn.execute(f"SELECT username, id FROM users WHERE username IN ({placeholders})", chunk))
+
+    resolved, unknown = [], set()
+    for user, skill, xp, timestamp in events:
+        if isinstance(user, str):
+            if user.isdigit():
+                user = int(user)
+            elif user in ids:
+                user = ids[user]
+            else:
+                unknown.add(user)
+                continue
+        resolved.append((user, skill, xp, timestamp))
+    return resolved, sorted(unknown)
+
+
+def apply_events(conn, events, catalog):
+    """Apply normalized events (with integer user ids) in a single transaction.
+
+    Events are folded in the order given, so removals clamp at level 1 exactly
+    as they would through /delete_xp. Returns the per-skill level transitions
+    with the titles and badges each one unlocked.
+    """
+    user_ids = {user for user, _, _, _ in events}
+    totals, before, row_ids = {}, {}, {}
+    applied = skipped = 0
+
+    with transaction(conn):
+        for chunk in _chunks(user_ids):
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT id, user_id, skill, xp, level FROM progress WHERE user_id IN ({placeholders})", chunk)
+            for row_id, user_id, skill, xp, level in rows:
+                row_ids[(user_id, skill)] = row_id
+                before[(user_id, skill)] = (level, xp)
+                totals[(user_id, skill)] = levels.total_xp(level, xp)
+
+        entries = []
+        for user_id, skill, xp, timestamp in events:
+            key = (user_id, skill)
+            total = totals.get(key)
+            if total is None:
+                skipped += 1
+                continue
+            new_total = levels.clamp_total(total + xp)
+            totals[key] = new_total
+            entries.append((user_id, skill, new_total - total, timestamp))
+            applied += 1
+        ledger.record_many(conn, entries)
+
+        updates, transitions = [], []
+        for key, total in totals.items():
+            old_level, old_xp = before[key]
+            if total == levels.total_xp(old_level, old_xp):
+                continue
+            level, xp = levels.from_total(total)
+            updates.append((level, xp, row_ids[key]))
+            transitions.append({
+                "user_id": key[0], "skill": key[1], "old_level": old_level, "current_level": level, "xp": xp,
+                "titles": [title for _, title in catalog.titles_crossed(key[1], old_level, level)],
+                "badges": [badge["name"] for badge in catalog.badges_crossed(key[1], old_level, level)],
+            })
+
+        # Rows were looked up above, so write back by rowid
+        conn.executemany("UPDATE progress SET level = ?, xp = ? WHERE id = ?", updates)
+
+    return {"applied": applied, "skipped": skipped, "transitions": transitions}
+
+
+def apply_events_routed(connect, events, catalog):
+    """apply_events() for events of users in different databases; ``connect(user_id)`` picks each one's.
+
+    One transaction per database, so a failure can leave earlier databases
+    applied. Returns the combined result.
+    """
+    groups = {}
+    for event in events:
+        conn = connect(event[0])
+        groups.setdefault(id(conn), (conn, []))[1].append(event)
+    combined = {"applied": 0, "skipped": 0, "transitions": []}
+    for conn, group in groups.values():
+        result = apply_events(conn, group, catalog)
+        combined["applied"] += result["applied"]
+        combined["skipped"] += result["skipped"]
+        combined["transitions"] += result["transitions"]
+    return combined
@@ -0,0 +1,363 @@
+# === leaderboard.py ===
+# Global, per-skill and per-category leaderboards.
+#
+# The `leaderboard` table (migration 6) holds every user's total XP per board
+# and is kept current by a trigger on progress, so top-N is a walk along its
+# (board, total_xp DESC, user_id) index. Counting everyone above a user with
+# SQL costs O(rank), though, so "my rank" comes from an in-memory
+# order-statistic index per board: sorted blocks of (-total, user_id) pairs,
+# kept as two parallel int64 arrays, with a Fenwick tree over the block
+# sizes, O(log n) per lookup or update.
+#
+# The in-memory indexes are built lazily from the table and then follow the
+# xp_events ledger: before every lookup they apply the events appended since
+# they were last synced, which also picks up writes made by other workers
+# and by `flask import-xp`.
+#
+# With DATABASE_SHARDS every shard has its own table, ledger and indexes;
+# ShardedLeaderboards adds up ranks and merges top-N across them.
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from skills import SKILL_TO_CATEGORY
+
+GLOBAL = "global"
+
+# Events applied per query when catching up with the ledger
+SYNC_CHUNK_SIZE = 10000
+
+TOP_SQL = '''
+    SELECT l.user_id, u.username, l.total_xp
+    FROM leaderboard l JOIN users u ON u.id = l.user_id
+    WHERE l.board = ? AND l.total_xp > 0
+    ORDER BY l.total_xp DESC, l.user_id
+    LIMIT ? OFFSET ?
+'''
+
+
+def board_name(skill=None, category=None):
+    if skill:
+        return f"skill:{skill}"
+    if category:
+        return f"category:{category}"
+    return GLOBAL
+
+
+def boards_for(skill, skill_to_category=SKILL_TO_CATEGORY):
+    """The boards an XP change to ``skill`` counts towards."""
+    boards = [board_name(skill=skill), GLOBAL]
+    category = skill_to_category.get(skill)
+    if category:
+        boards.append(board_name(category=category))
+    return boards
+
+
+def _key(total, user_id):
+    # Ascending keys = highest total first, ties by user id
+    return (-total, user_id)
+
+
+class _Block:
+    """A sorted run of ``(-total, user_id)`` keys as two parallel int64 arrays."""
+
+    __slots__ = ("negated", "user_ids")
+
+    def __init__(self, negated=None, user_ids=None):
+        self.negated = negated if negated is not None else array("q")
+        self.user_ids = user_ids if user_ids is not None else array("q")
+
+    def __len__(self):
+        return len(self.negated)
+
+    def last(self):
+        return self.negated[-1], self.user_ids[-1]
+
+    def append(self, key):
+        self.negated.append(key[0])
+        self.user_ids.append(key[1])
+
+    def position(self, key):
+        """Where ``key`` is, or would be inserted; a ``(-total,)`` key counts the totals above."""
+        lo = bisect_left(self.negated, key[0])
+        if len(key) == 1:
+            return lo
+        return bisect_left(self.user_ids, key[1], lo, bisect_right(self.negated, key[0], lo))
+
+    def insert(self, key):
+        i = self.position(key)
+        self.negated.insert(i, key[0])
+        self.user_ids.insert(i, key[1])
+
+    def remove(self, key):
+        i = self.position(key)
+        del self.negated[i], self.user_ids[i]
+
+    def split(self):
+        half = len(self) // 2
+        return (_Block(self.negated[:half], self.user_ids[:half]),
+                _Block(self.negated[half:], self.user_ids[half:]))
+
+
+class RankIndex:
+    """Order-statistic set of ``(total, user_id)`` pairs for one board.
+
+    Users with 0 XP are not stored; they all share the rank after the last
+    stored user.
+    """
+
+    BLOCK_SIZE = 1024
+
+    def __init__(self):
+        self._blocks = []
+        self._maxes = []
+        self._tree = []
+        self.totals = array("q")
+        self.size = 0
+
+    @classmethod
+    def from_sorted(cls, pairs):
+        """Build from ``(total, user_id)`` pairs already in rank order."""
+        index = cls()
+        block = _Block()
+        for total, user_id in pairs:
+            index._set_total(user_id, total)
+            block.append(_key(total, user_id))
+            if len(block) == cls.BLOCK_SIZE:
+                index._blocks.append(block)
+                block = _Block()
+        if len(block):
+            index._blocks.append(block)
+        index._maxes = [block.last() for block in index._blocks]
+        index.size = sum(len(block) for block in index._blocks)
+        index._rebuild_tree()
+        return index
+
+    def _set_total(self, user_id, total):
+        if user_id >= len(self.totals):
+            grow = max(user_id + 1, 2 * len(self.totals)) - len(self.totals)
+            self.totals.frombytes(bytes(grow * self.totals.itemsize))
+        self.totals[user_id] = total
+
+    def total(self, user_id):
+        return self.totals[user_id] if user_id < len(self.totals) else 0
+
+    # Fenwick tree over block sizes, so counting the blocks before block i is O(log blocks)
+    def _rebuild_tree(self):
+        tree = [len(block) for block in self._blocks]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, i, delta):
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i |= i + 1
+
+    def _tree_prefix(self, i):
+        count = 0
+        while i > 0:
+            count += self._tree[i - 1]
+            i &= i - 1
+        return count
+
+    def _insert(self, key):
+        if not self._blocks:
+            block = _Block()
+            block.append(key)
+            self._blocks.append(block)
+            self._maxes.append(key)
+            self._rebuild_tree()
+            return
+        i = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[i]
+        block.insert(key)
+        self._maxes[i] = block.last()
+        if len(block) > 2 * self.BLOCK_SIZE:
+            low, high = block.split()
+            self._blocks[i:i + 1] = [low, high]
+            self._maxes[i:i + 1] = [low.last(), high.last()]
+            self._rebuild_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def _remove(self, key):
+        i = bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        block.remove(key)
+        if len(block):
+            self._maxes[i] = block.last()
+            self._tree_add(i, -1)
+        else:
+            del self._blocks[i], self._maxes[i]
+            self._rebuild_tree()
+
+    def add(self, user_id, delta):
+        """Move ``user_id`` by ``delta`` XP (totals floor at 0)."""
+        old = self.total(user_id)
+        new = max(0, old + delta)
+        if new == old:
+            return
+        if old:
+            self._remove(_key(old, user_id))
+            self.size -= 1
+        if new:
+            self._insert(_key(new, user_id))
+            self.size += 1
+        self._set_total(user_id, new)
+
+    def count_above(self, total):
+        """How many users have strictly more than ``total`` XP."""
+        # (-total,) sorts before every (-total, user_id), so this counts the strictly higher totals
+        key = (-total,)
+        i = bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return self.size
+        return self._tree_prefix(i) + self._blocks[i].position(key)
+
+    def rank(self, user_id):
+        """Competition rank ("1224"): users tied on XP share a rank."""
+        return self.count_above(self.total(user_id)) + 1
+
+
+class Leaderboards:
+    """Top-N from the leaderboard table, ranks from per-board ``RankIndex``es."""
+
+    def __init__(self, skill_to_category=SKILL_TO_CATEGORY):
+        self.skill_to_category = skill_to_category
+        self._indexes = {}
+        self._synced_to = 0
+        self._lock = threading.Lock()
+
+    def valid_board(self, board):
+        kind, _, name = board.partition(":")
+        if kind == "skill":
+            return name in self.skill_to_category
+        if kind == "category":
+            return name in self.skill_to_category.values()
+        return board == GLOBAL
+
+    def _apply_events(self, conn, up_to):
+        while self._synced_to < up_to:
+            rows = conn.execute(
+                "SELECT id, user_id, skill, xp FROM xp_events WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (self._synced_to, up_to, SYNC_CHUNK_SIZE)).fetchall()
+            if not rows:
+                break
+            for _, user_id, skill, xp in rows:
+                for board in boards_for(skill, self.skill_to_category):
+                    index = self._indexes.get(board)
+                    if index is not None:
+                        index.add(user_id, xp)
+            self._synced_to = rows[-1][0]
+        self._synced_to = max(self._synced_to, up_to)
+
+    def _index(self, conn, board):
+        """The board's index, caught up with the ledger. Call with the lock held."""
+        index = self._indexes.get(board)
+        # One read transaction, so the table and the ledger position come from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            latest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM xp_events").fetchone()[0]
+            if self._indexes:
+                self._apply_events(conn, latest)
+            else:
+                # No index to catch up yet, and one built below reads the table in this snapshot
+                self._synced_to = latest
+            if index is None:
+                rows = conn.execute(
+                    "SELECT total_xp, user_id FROM leaderboard WHERE board = ? AND total_xp > 0 "
+                    "ORDER BY total_xp DESC, user_id", (board,))
+                index = self._indexes[board] = RankIndex.from_sorted(rows)
+        finally:
+            conn.commit()
+        return index
+
+    def rank(self, conn, board, user_id):
+        """``{"rank", "total_xp", "ranked"}`` for one user; ``ranked`` counts users with XP on the board."""
+        with self._lock:
+            index = self._index(conn, board)
+            return {"rank": index.rank(user_id), "total_xp": index.total(user_id), "ranked": index.size}
+
+    def count_above(self, conn, board, total):
+        with self._lock:
+            return self._index(conn, board).count_above(total)
+
+    def top(self, conn, board, limit=10, offset=0):
+        """The ``limit`` best users after skipping ``offset``, with competition ranks."""
+        rows = conn.execute(TOP_SQL, (board, limit, offset)).fetchall()
+        if not rows:
+            return []
+        rank = self.count_above(conn, board, rows[0][2]) + 1 if offset else 1
+        return _ranked(rows, offset, rank)
+
+
+def _ranked(rows, offset, rank):
+    """Entries for ``(user_id, username, total)`` rows starting at ``offset``; ``rank`` is the first row's."""
+    entries, previous = [], None
+    for position, (user_id, username, total) in enumerate(rows, start=offset + 1):
+        if previous is not None and total != previous:
+            rank = position
+        entries.append({"rank": rank, "user_id": user_id, "username": username, "total_xp": total})
+        previous = total
+    return entries
+
+
+class ShardedLeaderboards:
+    """Leaderboards over several databases, e.g. ``db.user_dbs()``; one ``Leaderboards`` per database.
+
+    Methods take the connections in the same order on every call. A rank is
+    one plus the users above on every shard, and top-N merges the first
+    ``offset + limit`` rows of each shard, so deep pages cost more than they
+    do with a single database.
+    """
+
+    valid_board = Leaderboards.valid_board
+
+    def __init__(self, skill_to_category=SKILL_TO_CATEGORY):
+        self.skill_to_category = skill_to_category
+        self._parts = []
+        self._lock = threading.Lock()
+
+    def _boards(self, conns):
+        with self._lock:
+            while len(self._parts) < len(conns):
+                self._parts.append(Leaderboards(self.skill_to_category))
+        return list(zip(self._parts, conns))
+
+    def rank(self, conns, board, user_id):
+        """``{"rank", "total_xp", "ranked"}`` for one user across every database."""
+        parts = self._boards(conns)
+        if len(parts) == 1:
+            part, conn = parts[0]
+            return part.rank(conn, board, user_id)
+        totals = []
+        for part, conn in parts:
+            with part._lock:
+                totals.append(part._index(conn, board).total(user_id))
+        # The user has rows in one database only; elsewhere their total is 0
+        total = max(totals)
+        above = ranked = 0
+        for part, conn in parts:
+            with part._lock:
+                index = part._index(conn, board)
+                above += index.count_above(total)
+                ranked += index.size
+        return {"rank": above + 1, "total_xp": total, "ranked": ranked}
+
+    def top(self, conns, board, limit=10, offset=0):
+        parts = self._boards(conns)
+        if len(parts) == 1:
+            part, conn = parts[0]
+            return part.top(conn, board, limit, offset)
+        merged = heapq.merge(*(conn.execute(TOP_SQL, (board, offset + limit, 0)).fetchall() for _, conn in parts),
+                             key=lambda row: (-row[2], row[0]))
+        rows = list(islice(merged, offset, offset + limit))
+        if not rows:
+            return []
+        rank = sum(part.count_above(conn, board, rows[0][2]) for part, conn in parts) + 1 if offset else 1
+        return _ranked(rows, offset, rank)
@@ -0,0 +1,104 @@
+# === ledger.py ===
+# The xp_events ledger is the source of truth for XP. Every write path appends
+# the change it actually made (after clamping to 0..levels.MAX_TOTAL_XP) and updates the
+# progress row in the same transaction, so `progress` is a materialized view:
+# the (level, xp) of each row always equals the sum of its events.
+#
+# Timestamps are Unix seconds (UTC) to keep the ledger compact and cheap to
+# bucket for time-series stats.
+import time
+from datetime import datetime, timezone
+
+import levels
+from db import transaction
+
+# Events read per query while replaying; bounds memory independently of ledger size
+REPLAY_CHUNK_SIZE = 50000
+
+INSERT_SQL = "INSERT INTO xp_events (user_id, skill, xp, created_at) VALUES (?, ?, ?, ?)"
+
+
+def to_epoch(timestamp=None):
+    """Unix seconds for an ISO 8601 ``timestamp`` (naive means UTC), or for now."""
+    if timestamp is None:
+        return int(time.time())
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def record(conn, user_id, skill, xp, timestamp=None):
+    """Append one event. Must run inside the transaction that updates the progress row."""
+    if xp:
+        conn.execute(INSERT_SQL, (user_id, skill, xp, to_epoch(timestamp)))
+
+
+def record_many(conn, events):
+    """Append ``(user_id, skill, xp, timestamp)`` events, skipping the ones that changed nothing."""
+    conn.executemany(INSERT_SQL, ((user_id, skill, xp, to_epoch(timestamp))
+                                  for user_id, skill, xp, timestamp in events if xp))
+
+
+def apply(conn, user_id, skill, amount, timestamp=None):
+    """Grant (or, if negative, remove) ``amount`` XP and record it, in one transaction.
+
+    Returns ``(old_level, level, xp)``, or None if the user has no such skill.
+    """
+    with transaction(conn):
+        row = conn.execute("SELECT id, xp, level FROM progress WHERE user_id = ? AND skill = ?",
+                           (user_id, skill)).fetchone()
+        if row is None:
+            return None
+        row_id, old_xp, old_level = row
+        old_total = levels.total_xp(old_level, old_xp)
+        level, xp = levels.from_total(old_total + amount)
+        # Totals clamp to 0..MAX_TOTAL_XP, so the ledger gets the change actually made
+        delta = levels.total_xp(level, xp) - old_total
+        if delta:
+            conn.execute("UPDATE progress SET level = ?, xp = ? WHERE id = ?", (level, xp, row_id))
+            record(conn, user_id, skill, delta, timestamp)
+    return old_level, level, xp
+
+
+def replay(conn, chunk_size=REPLAY_CHUNK_SIZE, on_chunk=None):
+    """Fold the whole ledger into ``{(user_id, skill): total_xp}``.
+
+    Events are read in id order with keyset pagination, so only one chunk is
+    in memory at a time. ``on_chunk(events_so_far)`` is called after each one.
+    """
+    totals = {}
+    last_id, seen = 0, 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, user_id, skill, xp FROM xp_events WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)).fetchall()
+        if not rows:
+            return totals
+        for _, user_id, skill, xp in rows:
+            key = (user_id, skill)
+            totals[key] = levels.clamp_total(totals.get(key, 0) + xp)
+        last_id = rows[-1][0]
+        seen += len(rows)
+        if on_chunk:
+            on_chunk(seen)
+
+
+def rebuild(conn, chunk_size=REPLAY_CHUNK_SIZE, on_chunk=None, dry_run=False):
+    """Recompute every progress row from the ledger. Returns the rows that differed.
+
+    Holds the writer lock throughout so no XP is granted halfway through the
+    replay; readers keep working thanks to WAL.
+    """
+    with transaction(conn):
+        totals = replay(conn, chunk_size, on_chunk)
+        drift = []
+        for row_id, user_id, skill, xp, level in conn.execute(
+                "SELECT id, user_id, skill, xp, level FROM progress"):
+            expected = levels.from_total(totals.get((user_id, skill), 0))
+            if expected != (level, xp):
+                drift.append((row_id, user_id, skill, (level, xp), expected))
+        if not dry_run:
+            conn.executemany("UPDATE progress SET level = ?, xp = ? WHERE id = ?",
+                             ((level, xp, row_id) for row_id, _, _, _, (level, xp) in drift))
+    return drift
@@ -0,0 +1,48 @@
+# === levels.py ===
+# Level math for skills. Going from level L to L + 1 costs L * 100 XP, so the
+# XP needed to climb from level 1 to level L is the triangular number
+# 100 * (1 + 2 + ... + (L - 1)) = 50 * L * (L - 1).
+#
+# A skill's (level, xp) pair is just another way of writing its total XP,
+# which makes any grant or removal O(1): convert to the total, add the delta
+# and convert back.
+from math import isqrt
+
+XP_PER_LEVEL = 100
+
+# Ceiling on one skill's total XP (about level 4,470). Grants past it are
+# clamped like removals are at 0, so the ledger records what was applied.
+MAX_TOTAL_XP = 10 ** 9
+
+
+def xp_to_reach(level):
+    """Total XP needed to reach ``level`` starting from level 1 with 0 XP."""
+    return XP_PER_LEVEL * level * (level - 1) // 2
+
+
+def total_xp(level, xp):
+    return xp_to_reach(level) + xp
+
+
+def clamp_total(total):
+    """``total`` limited to 0..MAX_TOTAL_XP."""
+    return min(MAX_TOTAL_XP, max(0, total))
+
+
+def from_total(total):
+    """Split a total XP amount into ``(level, xp)``. Totals below 0 floor at level 1, 0 XP; above MAX_TOTAL_XP they are capped."""
+    total = clamp_total(total)
+    # Largest L with 50 * L * (L - 1) <= total, i.e. L * (L - 1) <= total // 50
+    k = total // (XP_PER_LEVEL // 2)
+    level = (1 + isqrt(1 + 4 * k)) // 2
+    return level, total - xp_to_reach(level)
+
+
+def add_xp(level, xp, amount):
+    """Return ``(level, xp)`` after granting ``amount`` XP."""
+    return from_total(total_xp(level, xp) + amount)
+
+
+def remove_xp(level, xp, amount):
+    """Return ``(level, xp)`` after removing ``amount`` XP, never dropping below level 1."""
+    return from_total(total_xp(level, xp) - amount)
@@ -0,0 +1,78 @@
+# === messagequeue.py ===
+# Socket.IO message queue selection. Several server processes (gunicorn
+# workers, or the `flask import-xp` CLI) reach each other's clients through a
+# pub/sub backend: Redis, Kafka, ZeroMQ or anything kombu speaks is handled by
+# python-socketio itself; `sqlite:///path/to/queue.db` is a local stand-in
+# for single-host deployments and development without a broker.
+import json
+import time
+
+import socketio
+
+from db import ConnectionPool
+
+# Published messages are kept this long so a listener that is briefly busy
+# still sees them; older rows are pruned by the publishers
+RETENTION_SECONDS = 60
+POLL_INTERVAL = 0.05
+
+
+class SQLiteManager(socketio.PubSubManager):
+    """Pub/sub over a table in a SQLite file that every process on the host can open.
+
+    Publishing is one INSERT; each listener polls for rows newer than the last
+    one it has seen, so delivery latency is about ``poll_interval``. Good for
+    a handful of workers on one machine, not a replacement for Redis across
+    hosts.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, url, channel="socketio", write_only=False, logger=None, json=None,
+                 poll_interval=POLL_INTERVAL, retention=RETENTION_SECONDS):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.pool = ConnectionPool(url[len("sqlite://"):])
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._published = 0
+        self.pool.connection().execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                channel TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        ''')
+
+    def _publish(self, data):
+        conn = self.pool.connection()
+        now = time.time()
+        conn.execute("INSERT INTO messages (channel, created_at, payload) VALUES (?, ?, ?)",
+                     (self.channel, now, json.dumps(data)))
+        self._published += 1
+        if self._published % 100 == 0:
+            conn.execute("DELETE FROM messages WHERE created_at < ?", (now - self.retention,))
+
+    def _listen(self):
+        conn = self.pool.connection()
+        # Only messages published after this listener started are of interest
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+        while True:
+            rows = conn.execute("SELECT id, payload FROM messages WHERE id > ? AND channel = ? ORDER BY id",
+                                (last_id, self.channel)).fetchall()
+            for last_id, payload in rows:
+                yield payload
+            if not rows:
+                time.sleep(self.poll_interval)
+
+
+def socketio_options(url):
+    """Keyword arguments for ``SocketIO.init_app`` that select the message queue for ``url``.
+
+    No URL means a single process with its clients in memory.
+    """
+    if not url:
+        return {}
+    if url.startswith("sqlite://"):
+        return {"client_manager": SQLiteManager(url)}
+    return {"message_queue": url}
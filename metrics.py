@@ -0,0 +1,269 @@
+# === metrics.py ===
+# Optional request instrumentation, exposed in the Prometheus text format at
+# /metrics:
+#   - latency histogram per endpoint, method and status
+#   - SQL statements and SQL time per request (statements are counted by a
+#     sqlite3 trace callback, time is measured around execute/executemany)
+#   - template render time per template, Socket.IO emits per event
+# plus an opt-in sampling profiler at /debug/profile that returns folded
+# stacks for flamegraph tools.
+#
+# Everything hangs off `init_app`; when METRICS_ENABLED is off the app runs
+# with plain connections and no request hooks.
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+from flask import Response, abort, before_render_template, g, request, template_rendered
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"'.replace("\n", " ") for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            snapshot = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        names = self.labels + ("le",)
+        for labels, (counts, count, total) in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {count}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {total}"
+
+
+class Gauges:
+    """Values read at scrape time from ``collect()``, which returns ``{name: value}``."""
+
+    def __init__(self, prefix, help, collect):
+        self.prefix, self.help, self.collect = prefix, help, collect
+
+    def render(self):
+        for name, value in sorted(self.collect().items()):
+            yield f"# HELP {self.prefix}_{name} {self.help}"
+            yield f"# TYPE {self.prefix}_{name} gauge"
+            yield f"{self.prefix}_{name} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+request_latency = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to build the response.", ("endpoint", "method", "status")))
+request_queries = REGISTRY.register(Histogram(
+    "http_request_sql_statements", "SQL statements run per request.", ("endpoint",), QUERY_BUCKETS))
+request_sql_time = REGISTRY.register(Histogram(
+    "http_request_sql_seconds", "Time spent in execute/executemany per request.", ("endpoint",)))
+template_render = REGISTRY.register(Histogram(
+    "template_render_seconds", "Jinja render time.", ("template",)))
+socketio_emits = REGISTRY.register(Counter(
+    "socketio_emits_total", "Socket.IO events emitted.", ("event",)))
+
+# Per-request counters live on the thread (greenlet, when monkey-patched) handling the request
+_local = threading.local()
+
+
+def _current():
+    return getattr(_local, "stats", None)
+
+
+def _trace(statement):
+    stats = _current()
+    # Statements run by triggers are reported as "-- TRIGGER ..." comments; count only real ones
+    if stats is not None and not statement.startswith("--"):
+        stats[0] += 1
+
+
+def _timed(method):
+    def wrapper(self, *args):
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            stats = _current()
+            if stats is not None:
+                stats[1] += time.perf_counter() - start
+    return wrapper
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    execute = _timed(sqlite3.Cursor.execute)
+    executemany = _timed(sqlite3.Cursor.executemany)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection factory that feeds the per-request SQL counters.
+
+    Time covers preparing and stepping to the first row; rows fetched later
+    from the cursor are not included.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_trace)
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() would bypass cursor(), so route it through a timed cursor
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+
+class SamplingProfiler:
+    """Samples every thread's stack every ``interval`` seconds into folded-stack counts.
+
+    Under eventlet/gevent only OS threads are visible, so samples show the
+    hub rather than individual greenlets.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self, caller):
+        skip = {threading.get_ident(), caller}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in skip:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def run(self, seconds):
+        # Neither the sampler nor the thread waiting for it are of interest
+        self._thread = threading.Thread(target=self._run, args=(threading.get_ident(),), daemon=True)
+        self._thread.start()
+        self._stop.wait(seconds)
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def folded(self):
+        """One ``frame;frame;frame count`` line per distinct stack, for flamegraph.pl or speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+_profile_lock = threading.Lock()
+
+
+def init_app(app):
+    """Install the request hooks and the /metrics and /debug/profile endpoints, as configured."""
+    if app.config.get("PROFILER_ENABLED"):
+        @app.route("/debug/profile")
+        def sampling_profile():
+            seconds = min(max(request.args.get("seconds", 10, type=float), 0.1), 60)
+            interval = min(max(request.args.get("interval", 0.005, type=float), 0.001), 1)
+            if not _profile_lock.acquire(blocking=False):
+                abort(409)
+            try:
+                profiler = SamplingProfiler(interval).run(seconds)
+            finally:
+                _profile_lock.release()
+            return Response(profiler.folded(), mimetype="text/plain")
+
+    if not app.config.get("METRICS_ENABLED"):
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        _local.stats = [0, 0.0]
+
+    @app.after_request
+    def record_request(response):
+        stats = _current()
+        started = g.pop("request_started", None)
+        if started is not None:
+            endpoint = request.endpoint or "unmatched"
+            request_latency.observe(time.perf_counter() - started, endpoint, request.method, response.status_code)
+            request_queries.observe(stats[0], endpoint)
+            request_sql_time.observe(stats[1], endpoint)
+        _local.stats = None
+        return response
+
+    def start_render(sender, template, context, **extra):
+        g.setdefault("render_started", []).append(time.perf_counter())
+
+    def finish_render(sender, template, context, **extra):
+        started = g.get("render_started")
+        if started:
+            template_render.observe(time.perf_counter() - started.pop(), template.name)
+
+    before_render_template.connect(start_render, app, weak=False)
+    template_rendered.connect(finish_render, app, weak=False)
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,349 @@
+# === migrations.py ===
+# Versioned schema migrations. The schema version lives in SQLite's
+# PRAGMA user_version; each migration runs in its own transaction and bumps
+# the version in the same commit, so a crash never leaves a half-applied step.
+import json
+import re
+
+import catalog
+from db import transaction
+
+MIGRATIONS = []
+
+
+def migration(version):
+    """Register the decorated function as the step that brings the schema to ``version``."""
+    def register(step):
+        MIGRATIONS.append((version, step))
+        MIGRATIONS.sort(key=lambda pair: pair[0])
+        return step
+    return register
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=None):
+    """Apply every migration newer than the database's version. Returns the versions applied."""
+    applied = []
+    for version, step in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with transaction(conn):
+            # Re-check under the writer lock in case another process got here first
+            if current_version(conn) >= version:
+                continue
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+    return applied
+
+
+@migration(1)
+def create_tables(conn):
+    """Base schema. Uses IF NOT EXISTS so databases created before migrations adopt it as-is."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password TEXT NOT NULL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            skill TEXT NOT NULL,
+            category TEXT NOT NULL,
+            xp INTEGER DEFAULT 0,
+            level INTEGER DEFAULT 1,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            challenge TEXT NOT NULL,
+            completed BOOLEAN DEFAULT 0,
+            UNIQUE(user_id, challenge),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+    # Key/value settings, e.g. the last daily reset date
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS config (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS selected_titles (
+            user_id INTEGER PRIMARY KEY,
+            selected_titles TEXT,
+            selected_badges TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS selected_badges (
+            user_id INTEGER PRIMARY KEY,
+            selected_titles TEXT,
+            selected_badges TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+
+@migration(2)
+def index_progress(conn):
+    """One progress row per (user, skill), plus indexes for the per-user and per-category lookups."""
+    # Older databases may contain duplicate skill rows; keep the first one of each
+    conn.execute('''
+        DELETE FROM progress
+        WHERE id NOT IN (SELECT MIN(id) FROM progress GROUP BY user_id, skill)
+    ''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS progress_user_skill ON progress (user_id, skill)")
+    conn.execute("CREATE INDEX IF NOT EXISTS progress_user_category ON progress (user_id, category)")
+
+
+@migration(3)
+def daily_completion_dates(conn):
+    """Lazy daily resets: a challenge is done only if its completion date is today for the user."""
+    conn.execute("ALTER TABLE daily ADD COLUMN completed_on TEXT")
+    conn.execute("ALTER TABLE users ADD COLUMN timezone TEXT")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS challenge_log (
+            user_id INTEGER NOT NULL,
+            challenge TEXT NOT NULL,
+            day TEXT NOT NULL,
+            PRIMARY KEY (user_id, challenge, day),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Challenges still marked done were completed on the last startup reset date or later
+    row = conn.execute("SELECT value FROM config WHERE key = 'last_reset_date'").fetchone()
+    if row:
+        conn.execute("UPDATE daily SET completed_on = ? WHERE completed = 1", (row[0],))
+        conn.execute('''
+            INSERT OR IGNORE INTO challenge_log (user_id, challenge, day)
+            SELECT user_id, challenge, completed_on FROM daily WHERE completed_on IS NOT NULL
+        ''')
+
+
+@migration(4)
+def progress_version(conn):
+    """Per-user progress version for ETag/Last-Modified, bumped by a trigger on every XP write path."""
+    conn.execute("ALTER TABLE users ADD COLUMN progress_version INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE users ADD COLUMN progress_updated_at TEXT")
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS progress_bump_version AFTER UPDATE OF xp, level ON progress
+        BEGIN
+            UPDATE users
+            SET progress_version = progress_version + 1,
+                progress_updated_at = strftime('%Y-%m-%dT%H:%M:%SZ', 'now')
+            WHERE id = NEW.user_id;
+        END
+    ''')
+
+
+@migration(5)
+def xp_ledger(conn):
+    """Append-only XP ledger (see ledger.py), opened with one event per skill that already has XP."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS xp_events (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            skill TEXT NOT NULL,
+            xp INTEGER NOT NULL,
+            created_at INTEGER NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS xp_events_user_time ON xp_events (user_id, created_at)")
+
+    # Level L with x XP is 50 * L * (L - 1) + x in total (see levels.py)
+    conn.execute('''
+        INSERT INTO xp_events (user_id, skill, xp, created_at)
+        SELECT p.user_id, p.skill, 50 * p.level * (p.level - 1) + p.xp,
+               COALESCE(CAST(strftime('%s', u.progress_updated_at) AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))
+        FROM progress p JOIN users u ON u.id = p.user_id
+        WHERE 50 * p.level * (p.level - 1) + p.xp > 0
+        ORDER BY p.id
+    ''')
+
+
+@migration(6)
+def leaderboards(conn):
+    """Total XP per board (global, 'skill:<name>', 'category:<name>') for the leaderboards.
+
+    A trigger keeps it in step with progress on every write path, so top-N
+    is an index walk instead of a GROUP BY over every user.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            board TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            total_xp INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (board, user_id),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard (board, total_xp DESC, user_id)")
+
+    total = "50 * level * (level - 1) + xp"
+    conn.execute(f'''
+        INSERT INTO leaderboard (board, user_id, total_xp)
+        SELECT 'skill:' || skill, user_id, {total} FROM progress WHERE {total} > 0
+        UNION ALL
+        SELECT 'category:' || category, user_id, SUM({total}) FROM progress
+        GROUP BY user_id, category HAVING SUM({total}) > 0
+        UNION ALL
+        SELECT 'global', user_id, SUM({total}) FROM progress
+        GROUP BY user_id HAVING SUM({total}) > 0
+    ''')
+
+    new_total = "50 * NEW.level * (NEW.level - 1) + NEW.xp"
+    delta = f"{new_total} - (50 * OLD.level * (OLD.level - 1) + OLD.xp)"
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS progress_leaderboard AFTER UPDATE OF xp, level ON progress
+        WHEN {delta} != 0
+        BEGIN
+            INSERT INTO leaderboard (board, user_id, total_xp)
+            VALUES ('skill:' || NEW.skill, NEW.user_id, {new_total})
+            ON CONFLICT (board, user_id) DO UPDATE SET total_xp = excluded.total_xp;
+
+            INSERT INTO leaderboard (board, user_id, total_xp)
+            VALUES ('category:' || NEW.category, NEW.user_id, {delta})
+            ON CONFLICT (board, user_id) DO UPDATE SET total_xp = total_xp + excluded.total_xp;
+
+            INSERT INTO leaderboard (board, user_id, total_xp)
+            VALUES ('global', NEW.user_id, {delta})
+            ON CONFLICT (board, user_id) DO UPDATE SET total_xp = total_xp + excluded.total_xp;
+        END
+    ''')
+
+
+@migration(7)
+def xp_events_skill_index(conn):
+    """Covering index for analytics: every (bucket, skill) total is one contiguous range sum."""
+    conn.execute("CREATE INDEX IF NOT EXISTS xp_events_user_skill_time ON xp_events (user_id, skill, created_at, xp)")
+
+
+@migration(8)
+def user_selections(conn):
+    """One row per picked title or badge instead of a JSON array per user.
+
+    The old selected_titles/selected_badges tables each carried both columns,
+    but only the one matching the table name was ever written; their arrays
+    are moved across in order and the tables dropped. Names that are not in
+    titles.json/badges.json (left over from renames) are dropped on the way.
+    """
+    known = catalog.selectable_names()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_selections (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind, name),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    ''')
+    # Picks in order, and the next position for an add, without reading the user's other rows
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS user_selections_order ON user_selections (user_id, kind, position)")
+    for table, kind in (("selected_titles", "title"), ("selected_badges", "badge")):
+        conn.execute(f'''
+            INSERT OR IGNORE INTO user_selections (user_id, kind, name, position)
+            SELECT t.user_id, ?, j.value, j.key + 1
+            FROM {table} t, json_each(t.{table}) j
+            WHERE json_valid(t.{table}) AND json_type(t.{table}) = 'array' AND j.type = 'text'
+              AND j.value IN (SELECT value FROM json_each(?))
+        ''', (kind, json.dumps(known[kind])))
+        conn.execute(f"DROP TABLE {table}")
+
+
+@migration(9)
+def unlocks(conn):
+    """Titles and badges each user has earned, written by the achievement rules (achievements.py).
+
+    Existing users are backfilled by achievements.sync(), which needs the
+    rules from the JSON files; it keeps the fingerprint of the rules it last
+    ran with in `config`, so it runs again when they change.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS unlocks (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            unlocked_at INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind, name),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    ''')
+
+
+# The queries behind every route, with representative parameters. Keep in
+# sync with app.py; `flask check-query-plans` fails if any of them has to
+# scan a whole table.
+HOT_QUERIES = [
+    ("SELECT id, password FROM users WHERE username = ?", ("user",)),
+    ("SELECT username, id FROM users WHERE id > ?", (1,)),
+    ("UPDATE users SET password = ? WHERE id = ? AND password = ?", ("hash", 1, "pw")),
+    ("SELECT username FROM users WHERE id = ?", (1,)),
+    ("SELECT skill, category, xp, level FROM progress WHERE user_id = ? ORDER BY id", (1,)),
+    ("SELECT skill, level FROM progress WHERE user_id = ? ORDER BY id", (1,)),
+    ("SELECT skill, category, xp, level FROM progress WHERE category = ? AND user_id = ?", ("Red", 1)),
+    ("SELECT id, xp, level FROM progress WHERE user_id = ? AND skill = ?", (1, "Strength")),
+    ("UPDATE progress SET level = ?, xp = ? WHERE id = ?", (1, 0, 1)),
+    ("SELECT id, user_id, skill, xp FROM xp_events WHERE id > ? ORDER BY id LIMIT ?", (0, 1000)),
+    ("SELECT id, user_id, skill, xp FROM xp_events WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (0, 10, 1000)),
+    ("SELECT created_at, id, skill, xp FROM xp_events WHERE user_id = ? AND (created_at, id) > (?, ?) "
+     "AND created_at < ? ORDER BY created_at, id LIMIT ?", (1, 0, 0, 2 ** 40, 1000)),
+    ("SELECT SUM(xp) FROM xp_events WHERE user_id = ? AND skill = ? AND created_at >= ? AND created_at < ?",
+     (1, "Strength", 0, 2 ** 40)),
+    ("SELECT total_xp, user_id FROM leaderboard WHERE board = ? AND total_xp > 0 ORDER BY total_xp DESC, user_id",
+     ("global",)),
+    ("SELECT l.user_id, u.username, l.total_xp FROM leaderboard l JOIN users u ON u.id = l.user_id "
+     "WHERE l.board = ? AND l.total_xp > 0 ORDER BY l.total_xp DESC, l.user_id LIMIT ? OFFSET ?", ("global", 10, 0)),
+    ("SELECT id, user_id, skill, xp, level FROM progress WHERE user_id IN (?, ?)", (1, 2)),
+    ("SELECT challenge, completed_on FROM daily WHERE user_id = ?", (1,)),
+    ("SELECT timezone FROM users WHERE id = ?", (1,)),
+    ("SELECT progress_version, progress_updated_at FROM users WHERE id = ?", (1,)),
+    ("UPDATE daily SET completed_on = ? WHERE challenge = ? AND user_id = ?", ("2025-01-01", "Gym", 1)),
+    ("SELECT challenge, day FROM challenge_log WHERE user_id = ? AND day >= ? ORDER BY challenge, day",
+     (1, "2025-01-01")),
+    ("SELECT name FROM user_selections WHERE user_id = ? AND kind = ? ORDER BY position", (1, "title")),
+    ("SELECT COALESCE(MAX(position), 0) + 1 FROM user_selections WHERE user_id = ? AND kind = ?", (1, "title")),
+    ("DELETE FROM user_selections WHERE user_id = ? AND kind = ? AND name = ?", (1, "title", "Novice")),
+    ("INSERT OR IGNORE INTO unlocks (user_id, kind, name, unlocked_at) VALUES (?, ?, ?, ?)", (1, "title", "Novice", 0)),
+    ("SELECT name FROM unlocks WHERE user_id = ? AND kind = ?", (1, "title")),
+    ("SELECT category, SUM(level) FROM progress WHERE user_id = ? GROUP BY category", (1,)),
+    ("SELECT day FROM challenge_log WHERE user_id = ? AND challenge = ? AND day >= ? ORDER BY day",
+     (1, "Gym", "2025-01-01")),
+]
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def full_scans(conn, sql, params=()):
+    """Tables that ``sql`` reads with a full scan, according to EXPLAIN QUERY PLAN."""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return [match.group(1) for *_, detail in plan if (match := _FULL_SCAN.match(detail))]
+
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """Return ``(sql, tables)`` for every query that is not served by an index."""
+    problems = []
+    for sql, params in queries:
+        tables = full_scans(conn, sql, params)
+        if tables:
+            problems.append((sql, tables))
+    return problems
@@ -0,0 +1,162 @@
+# === passwords.py ===
+# Salted password hashing. scrypt comes with hashlib; argon2id is used when
+# PASSWORD_SCHEME=argon2 and argon2-cffi is installed. Stored values carry
+# their scheme and cost, so the cost can be raised at any time: older hashes
+# (and plaintext passwords from before hashing) keep working and are
+# re-hashed with the current settings on the next successful login.
+#
+# Hashing is deliberately slow, tens of ms of CPU. It runs on a bounded pool
+# of OS threads (both scrypt and argon2 release the GIL while they work), so
+# a login storm uses at most `workers` cores and request threads or
+# greenlets keep being served meanwhile. When more than `max_pending` hashes
+# are waiting, new ones fail fast with PoolBusy instead of queueing forever.
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+SCHEMES = ("scrypt", "argon2")
+
+# scrypt: cost is log2(N) with r=8, p=1, so 15 means 32 MB and ~100 ms per
+# hash; argon2: cost is the number of passes over 64 MB
+DEFAULT_COSTS = {"scrypt": 15, "argon2": 3}
+SCRYPT_R, SCRYPT_P = 8, 1
+ARGON2_MEMORY_KIB = 65536
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class PoolBusy(Exception):
+    """Too many hashes are already waiting for a worker."""
+
+
+def _b64(data):
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, log_n):
+    n = 1 << log_n
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                          maxmem=2 * 128 * SCRYPT_R * n, dklen=KEY_BYTES)
+
+
+def _run_inline(fn, *args):
+    return fn(*args)
+
+
+class PasswordHasher:
+    def __init__(self, scheme="scrypt", cost=None, workers=4, max_pending=256):
+        self.configure(scheme, cost, workers, max_pending)
+
+    def configure(self, scheme="scrypt", cost=None, workers=4, max_pending=256, async_mode="threading"):
+        """Pick the scheme and cost for new hashes, and how hashing is offloaded.
+
+        ``async_mode`` is the Socket.IO async mode: under eventlet and gevent
+        the threads come from their hub's native thread pool, since the
+        ``threading`` module itself is patched to green threads.
+        """
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown password scheme {scheme!r}")
+        if scheme == "argon2" and argon2 is None:
+            raise RuntimeError("The argon2-cffi package is required for PASSWORD_SCHEME=argon2")
+        self.scheme = scheme
+        self.cost = int(cost) if cost else DEFAULT_COSTS[scheme]
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._argon2 = argon2.PasswordHasher(time_cost=self.cost, memory_cost=ARGON2_MEMORY_KIB, parallelism=1) \
+            if scheme == "argon2" else None
+        # Patched to a green semaphore under eventlet/gevent, so waiting yields to other greenlets
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._dummy = None
+        if async_mode == "eventlet":
+            from eventlet import tpool
+            self._offload = tpool.execute
+        elif async_mode == "gevent":
+            import gevent
+            self._offload = lambda fn, *args: gevent.get_hub().threadpool.apply(fn, args)
+        elif workers:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+            self._offload = lambda fn, *args: executor.submit(fn, *args).result()
+        else:
+            self._offload = _run_inline
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolBusy()
+            self._pending += 1
+        try:
+            with self._slots:
+                return self._offload(fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _hash(self, password):
+        if self._argon2:
+            return self._argon2.hash(password)
+        salt = os.urandom(SALT_BYTES)
+        key = _scrypt(password, salt, self.cost)
+        return f"scrypt$ln={self.cost},r={SCRYPT_R},p={SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+    @staticmethod
+    def _verify(stored, password):
+        if stored.startswith("$argon2"):
+            if argon2 is None:
+                raise RuntimeError("argon2-cffi is required to check argon2 password hashes")
+            try:
+                return argon2.PasswordHasher().verify(stored, password)
+            except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHashError):
+                return False
+        if stored.startswith("scrypt$"):
+            try:
+                _, params, salt, key = stored.split("$")
+                params = dict(item.split("=") for item in params.split(","))
+                log_n, r, p = int(params["ln"]), int(params["r"]), int(params["p"])
+            except (ValueError, KeyError):
+                return False
+            if (r, p) != (SCRYPT_R, SCRYPT_P):
+                return False
+            return hmac.compare_digest(_scrypt(password, _unb64(salt), log_n), _unb64(key))
+        # Stored before passwords were hashed
+        return hmac.compare_digest(stored.encode(), password.encode())
+
+    def hash(self, password):
+        """Salted hash of ``password`` with the current scheme and cost, computed on the pool."""
+        return self._run(self._hash, password)
+
+    def hash_many(self, passwords):
+        """Hashes for a bulk import, ``workers`` at a time on a pool of its own."""
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-bulk") as executor:
+            return list(executor.map(self._hash, passwords))
+
+    def verify(self, stored, password):
+        """Whether ``password`` matches ``stored`` (a hash of any supported cost, or legacy plaintext)."""
+        return self._run(self._verify, stored, password)
+
+    def reject(self, password):
+        """Spend as long as a real verify() would, for a username that does not exist."""
+        if self._dummy is None:
+            self._dummy = self.hash(os.urandom(SALT_BYTES).hex())
+        self.verify(self._dummy, password)
+        return False
+
+    def needs_rehash(self, stored):
+        """True for plaintext and for hashes made with another scheme or cost than the current one."""
+        if self._argon2:
+            return not stored.startswith("$argon2") or self._argon2.check_needs_rehash(stored)
+        return not stored.startswith(f"scrypt$ln={self.cost},r={SCRYPT_R},p={SCRYPT_P}$")
@@ -0,0 +1,246 @@
+# === ratelimit.py ===
+# Load shedding for the routes that write (RATE_LIMIT_ENABLED=1). Every
+# write goes through the single SQLite writer lock, so one client tapping as
+# fast as it can, or a script replaying requests, makes everyone else queue
+# behind it. Two layers keep that bounded:
+#
+#   - RateLimiter: a token bucket per user (per address for anonymous
+#     requests). A bucket holds up to `burst` tokens and refills at `rate`
+#     per second; a write takes one, and without one the request is answered
+#     429 with the seconds until the next token in Retry-After.
+#   - AdmissionQueue: at most `concurrency` write requests run at once and at
+#     most `max_waiting` wait for a turn, each for up to `timeout` seconds.
+#     Beyond that a request is shed with 429 straight away instead of piling
+#     up on the writer lock and dragging every other request's latency along.
+#
+# Buckets live in the process by default. With several workers each would
+# allow the full rate, so RATE_LIMIT_URL can point them at a shared store:
+# redis://... (needs the redis package) or sqlite:///path/to/limits.db as a
+# local stand-in on one host, like the Socket.IO queue in messagequeue.py.
+# The admission queue is always per process: it protects that process'
+# threads, and the writer lock serializes the processes anyway.
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from db import ConnectionPool
+
+# Memory buckets are swept for idle (full again) entries this often
+SWEEP_EVERY = 4096
+
+
+class Overloaded(Exception):
+    """The write admission queue is full, or the wait for a turn timed out."""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def retry_after(wait):
+    """Whole seconds for a Retry-After header, at least 1."""
+    return max(1, math.ceil(wait))
+
+
+class MemoryBuckets:
+    """Token buckets in a dict, for a single process."""
+
+    def __init__(self):
+        self._buckets = {}  # {key: (tokens, updated)}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key, rate, burst, now=None):
+        """Take one token. Returns 0 if there was one, else the seconds until there is."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            self._takes += 1
+            if self._takes % SWEEP_EVERY == 0:
+                # A bucket that has refilled is the same as no bucket
+                full_after = burst / rate
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < full_after}
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite file that every process on the host can open.
+
+    One upsert per request takes the token only if the refilled bucket has
+    one; it runs in its own file, so it never competes with the application
+    database for the writer lock it is protecting.
+    """
+
+    TAKE_SQL = '''
+        INSERT INTO buckets (key, tokens, updated) VALUES (:key, :burst - 1, :now)
+        ON CONFLICT (key) DO UPDATE
+            SET tokens = MIN(:burst, tokens + MAX(0, :now - updated) * :rate) - 1, updated = :now
+            WHERE MIN(:burst, tokens + MAX(0, :now - updated) * :rate) >= 1
+        RETURNING tokens
+    '''
+
+    def __init__(self, url):
+        self.pool = ConnectionPool(url[len("sqlite://"):])
+        self._takes = 0
+        self.pool.connection().execute('''
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        conn = self.pool.connection()
+        params = {"key": key, "burst": burst, "now": now, "rate": rate}
+        # fetchall() finishes the statement, which commits it
+        if conn.execute(self.TAKE_SQL, params).fetchall():
+            wait = 0.0
+        else:
+            tokens, updated = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            wait = (1 - min(burst, tokens + max(0, now - updated) * rate)) / rate
+        self._takes += 1
+        if self._takes % SWEEP_EVERY == 0:
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - burst / rate,))
+        return wait
+
+    def __len__(self):
+        return self.pool.connection().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class RedisBuckets:
+    """Token buckets shared by every process that talks to the same Redis.
+
+    Any client with ``register_script`` works, so local setups can hand in a
+    stand-in such as ``fakeredis.FakeRedis()``.
+    """
+
+    # Refill and take in one round trip; the key expires once it would be full again
+    TAKE_SCRIPT = '''
+        local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+        local wait = 0
+        if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+        return tostring(wait)
+    '''
+
+    def __init__(self, client, prefix="xp:bucket:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(self.TAKE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for a redis:// rate limit URL")
+        return cls(redis.Redis.from_url(url))
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        return float(self._take(keys=[self.prefix + key], args=[rate, burst, now]))
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + "*"))
+
+
+def make_buckets(url=None):
+    """Bucket store for a URL: empty or ``memory://``, ``sqlite:///path`` or ``redis://``."""
+    if not url or url.startswith("memory://"):
+        return MemoryBuckets()
+    if url.startswith("sqlite://"):
+        return SQLiteBuckets(url)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBuckets.from_url(url)
+    raise ValueError(f"Unsupported rate limit URL: {url}")
+
+
+class RateLimiter:
+    def __init__(self, rate=5.0, burst=20, buckets=None):
+        self.rate, self.burst = rate, burst
+        self.buckets = MemoryBuckets() if buckets is None else buckets
+        self._lock = threading.Lock()
+        self._counters = {"allowed": 0, "limited": 0}
+
+    def hit(self, key):
+        """Spend one of ``key``'s tokens. Returns 0 if allowed, else the seconds to wait."""
+        wait = self.buckets.take(key, self.rate, self.burst)
+        with self._lock:
+            self._counters["limited" if wait else "allowed"] += 1
+        return wait
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        # Counting shared buckets is a scan; only the in-process ones are cheap to size
+        if isinstance(self.buckets, MemoryBuckets):
+            counters["tracked_keys"] = len(self.buckets)
+        return counters
+
+
+class AdmissionQueue:
+    def __init__(self, concurrency=4, max_waiting=64, timeout=2.0):
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._ready = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._counters = {"admitted": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def acquire(self):
+        """Take one of the ``concurrency`` slots, waiting in line if needed; raises Overloaded if none comes free."""
+        with self._ready:
+            if self._active >= self.concurrency:
+                if self._waiting >= self.max_waiting:
+                    self._counters["rejected_full"] += 1
+                    raise Overloaded("queue full")
+                self._waiting += 1
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self._active >= self.concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._counters["rejected_timeout"] += 1
+                            raise Overloaded("timed out waiting")
+                        self._ready.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            self._counters["admitted"] += 1
+
+    def release(self):
+        with self._ready:
+            self._active -= 1
+            self._ready.notify()
+
+    @contextmanager
+    def admit(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._ready:
+            return dict(self._counters, active=self._active, queue_depth=self._waiting)
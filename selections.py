@@ -0,0 +1,71 @@
+# === selections.py ===
+# Titles and badges a user has picked for the dashboard, one row per pick in
+# user_selections. Toggling is a single INSERT or DELETE against the
+# (user_id, kind, name) primary key; the whole list is never read back and
+# rewritten. `position` keeps the order in which things were picked.
+from db import transaction
+
+KINDS = ("title", "badge")
+ACTIONS = ("add", "remove")
+
+# Largest batch accepted by apply(); the pages send a handful of clicks at a time
+MAX_CHANGES = 200
+
+ADD_SQL = '''
+    INSERT OR IGNORE INTO user_selections (user_id, kind, name, position)
+    SELECT ?1, ?2, ?3, COALESCE(MAX(position), 0) + 1
+    FROM user_selections WHERE user_id = ?1 AND kind = ?2
+'''
+REMOVE_SQL = "DELETE FROM user_selections WHERE user_id = ? AND kind = ? AND name = ?"
+SELECTED_SQL = "SELECT name FROM user_selections WHERE user_id = ? AND kind = ? ORDER BY position"
+
+
+def selected(conn, user_id, kind):
+    """Names of the user's picks of one kind, in the order they were picked."""
+    return [name for name, in conn.execute(SELECTED_SQL, (user_id, kind))]
+
+
+def parse_changes(payload, known):
+    """Validate ``{"changes": [{"kind", "name", "action"}, ...]}`` into ``[(kind, name, action)]``.
+
+    ``known`` maps each kind to the names that exist in the catalog; only
+    adds are checked against it, so a pick that has since been renamed or
+    removed can still be taken off. Raises ``ValueError`` with a message
+    suitable for the client.
+    """
+    changes = payload.get("changes") if isinstance(payload, dict) else None
+    if not isinstance(changes, list) or not changes:
+        raise ValueError("Expected a non-empty 'changes' list")
+    if len(changes) > MAX_CHANGES:
+        raise ValueError(f"At most {MAX_CHANGES} changes per request")
+    parsed = []
+    for change in changes:
+        if not isinstance(change, dict):
+            raise ValueError("Each change must be an object")
+        kind, name, action = change.get("kind"), change.get("name"), change.get("action")
+        if kind not in KINDS:
+            raise ValueError(f"Unknown kind {kind!r}")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action {action!r}")
+        if not isinstance(name, str) or (action == "add" and name not in known[kind]):
+            raise ValueError(f"Unknown {kind} {name!r}")
+        parsed.append((kind, name, action))
+    return parsed
+
+
+def apply(conn, user_id, changes):
+    """Apply ``[(kind, name, action)]`` in order, in one transaction. Returns how many rows changed."""
+    changed = 0
+    with transaction(conn):
+        for kind, name, action in changes:
+            sql = ADD_SQL if action == "add" else REMOVE_SQL
+            changed += conn.execute(sql, (user_id, kind, name)).rowcount
+    return changed
+
+
+def toggle(conn, user_id, kind, name, action):
+    """Add or remove one pick; adding twice or removing something not picked is a no-op.
+
+    One statement in autocommit mode, so no explicit transaction is needed.
+    """
+    return conn.execute(ADD_SQL if action == "add" else REMOVE_SQL, (user_id, kind, name)).rowcount
@@ -0,0 +1,133 @@
+# === shards.py ===
+# Offline rebalancing for DATABASE_SHARDS (see db.ShardRouter). After the
+# shard count changes, or when a single database.db is split for the first
+# time, some users' rows sit in a database the hash ring no longer points at.
+# `flask rebalance-shards` moves them while the app is stopped:
+#
+#   1. each source database is read in user id order, --batch-size users
+#      at a time, and the users the ring places elsewhere are picked out;
+#   2. their rows are copied into the owning shard in one transaction,
+#      after deleting whatever an interrupted earlier run left there;
+#   3. then deleted from the source in a second transaction.
+#
+# A crash between 2 and 3 leaves the batch in both places and the next run
+# copies it again, so the tool can always simply be re-run. Rows go from
+# database to database with INSERT ... SELECT through ATTACH and never pass
+# through Python; memory use is one batch of user ids.
+#
+# The directory database keeps its users rows when it is the source: they
+# are the accounts. Going back from shards to one file is not supported.
+import json
+
+from db import transaction
+
+# Per-user tables and the columns moved. Surrogate ids are not copied: the
+# destination numbers the rows again in their original order, which keeps
+# progress in display order and the ledger in time order.
+USER_TABLES = (
+    ("progress", "user_id, skill, category, xp, level", "id"),
+    ("daily", "user_id, challenge, completed, completed_on", "id"),
+    ("challenge_log", "user_id, challenge, day", None),
+    ("xp_events", "user_id, skill, xp, created_at", "id"),
+    ("leaderboard", "board, user_id, total_xp", None),
+    ("user_selections", "user_id, kind, name, position", None),
+    ("unlocks", "user_id, kind, name, unlocked_at", None),
+)
+
+# Users with rows in a database; every account has progress rows
+SCAN_SQL = "SELECT DISTINCT user_id FROM progress WHERE user_id > ? ORDER BY user_id LIMIT ?"
+
+# A shard's copy of the account, without the password
+COPY_USERS_SQL = '''
+    INSERT INTO main.users (id, username, password, timezone, progress_version, progress_updated_at)
+    SELECT id, username, '', timezone, progress_version, progress_updated_at
+    FROM source.users WHERE id IN (SELECT value FROM json_each(:ids))
+'''
+
+_IDS = "user_id IN (SELECT value FROM json_each(:ids))"
+# leaderboard's key starts with the board, so give it the boards to look up
+_LEADERBOARD_IDS = f"board IN (SELECT value FROM json_each(:boards)) AND {_IDS}"
+
+
+def _where(table):
+    return _LEADERBOARD_IDS if table == "leaderboard" else _IDS
+
+
+def _delete(conn, schema, params, users=True):
+    for table, _, _ in USER_TABLES:
+        conn.execute(f"DELETE FROM {schema}.{table} WHERE {_where(table)}", params)
+    if users:
+        conn.execute(f"DELETE FROM {schema}.users WHERE id IN (SELECT value FROM json_each(:ids))", params)
+
+
+def _copy(conn, params):
+    """Copy a batch from the attached ``source`` into ``main``, replacing anything already there."""
+    with transaction(conn):
+        _delete(conn, "main", params)
+        conn.execute(COPY_USERS_SQL, params)
+        for table, columns, order in USER_TABLES:
+            conn.execute(f'''
+                INSERT INTO main.{table} ({columns})
+                SELECT {columns} FROM source.{table} WHERE {_where(table)}
+                {f"ORDER BY {order}" if order else ""}
+            ''', params)
+
+
+def misplaced(router, conn, batch_size, owner=None):
+    """``{shard index: [user ids]}`` batches of the users in ``conn`` that belong to another shard.
+
+    ``owner`` is the shard index of ``conn`` itself; None for the directory
+    and for shards that are being drained.
+    """
+    last = 0
+    while True:
+        user_ids = [user_id for user_id, in conn.execute(SCAN_SQL, (last, batch_size))]
+        if not user_ids:
+            return
+        last = user_ids[-1]
+        batch = {}
+        for user_id in user_ids:
+            index = router.shard_index(user_id)
+            if index != owner:
+                batch.setdefault(index, []).append(user_id)
+        if batch:
+            yield batch
+
+
+def rebalance(router, drained=(), batch_size=500, on_batch=None):
+    """Move every user to the shard the ring places them on. Returns ``{shard index: users moved in}``.
+
+    ``drained`` are pools of shards beyond the current count (after
+    reducing DATABASE_SHARDS); all their users move. ``on_batch(moved)`` is
+    called with the running total after every batch.
+    """
+    if not router.sharded:
+        raise ValueError("Set DATABASE_SHARDS to shard the database first")
+    sources = [(router.directory, None, False)]
+    sources += [(pool, index, True) for index, pool in enumerate(router.shards)]
+    sources += [(pool, None, True) for pool in drained]
+    moved, total = {}, 0
+    for pool, owner, has_copies in sources:
+        source = pool.connection()
+        boards = json.dumps([board for board, in source.execute("SELECT DISTINCT board FROM leaderboard")])
+        attached = set()
+        try:
+            for batch in misplaced(router, source, batch_size, owner):
+                for index, user_ids in batch.items():
+                    destination = router.shards[index].connection()
+                    if index not in attached:
+                        destination.execute("ATTACH DATABASE ? AS source", (pool.path,))
+                        attached.add(index)
+                    params = {"ids": json.dumps(user_ids), "boards": boards}
+                    _copy(destination, params)
+                    with transaction(source):
+                        # The directory's users rows are the accounts themselves
+                        _delete(source, "main", params, users=has_copies)
+                    moved[index] = moved.get(index, 0) + len(user_ids)
+                    total += len(user_ids)
+                if on_batch:
+                    on_batch(total)
+        finally:
+            for index in attached:
+                router.shards[index].connection().execute("DETACH DATABASE source")
+    return moved
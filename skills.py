@@ -0,0 +1,72 @@
+# === skills.py ===
+# The canonical skill registry: every skill, the category it belongs to and
+# the copy shown for it. Registration, the catalog, leaderboards, analytics
+# and the templates all read from here, so adding a skill is one entry
+# (plus a migration for existing users' progress rows).
+from collections import namedtuple
+
+Skill = namedtuple("Skill", "name category description guide")
+Category = namedtuple("Category", "name description guide")
+
+CATEGORIES = (
+    Category("Red", "Physical skills like strength and endurance.",
+             "🏋️ Gym, 🏃 Running, cardio workouts"),
+    Category("Blue", "Mental skills like intelligence, focus, and creativity.",
+             "📖 Reading, 🧠 Deep work, 🎮 Logic games"),
+    Category("Green", "Lifestyle and physical control like dexterity and vitality.",
+             "🎻 Instruments, 🎯 Dexterity tasks, 🍎 Healthy living"),
+    Category("Gold", "Meta skills like discipline and consistency.",
+             "📅 Habit streaks, ✅ Daily goals"),
+)
+
+# In display order; progress rows are created in this order too
+SKILLS = (
+    Skill("Strength", "Red", "Train your muscles and improve lifting capacity.",
+          "🏋️ Weightlifting, bodyweight strength exercises"),
+    Skill("Endurance", "Red", "Boost cardiovascular health and stamina.",
+          "🏃 Running, cycling, long-distance workouts"),
+    Skill("Mobility", "Red", "Improve flexibility, range of motion, and posture.",
+          "🧘 Yoga, stretching routines, mobility drills"),
+    Skill("Speed", "Red", "Increase sprint performance and reaction time.",
+          "⏱ Sprinting drills, agility training"),
+    Skill("Intelligence", "Blue", "Expand your knowledge and learn new topics.",
+          "📚 Read books, take courses, learn new skills (languages, science, etc.)"),
+    Skill("Concentration", "Blue", "Sharpen your focus and resist distractions.",
+          "🧠 Practice deep work (30+ min), mindfulness, no-phone blocks"),
+    Skill("Logic", "Blue", "Improve problem-solving and analytical thinking.",
+          "♟ Solve puzzles, do math problems, write code, play strategy games"),
+    Skill("Creativity", "Blue", "Enhance artistic expression and idea generation.",
+          "🎨 Draw, write, compose music, brainstorm, design projects"),
+    Skill("Dexterity", "Green", "Improve hand-eye coordination and precise movement.",
+          "🎯 Play an instrument, juggle, craft, do precise movements or sports like tennis"),
+    Skill("Vitality", "Green", "Maintain high physical energy through health habits.",
+          "💧 Track hydration, sleep 7–8h, eat balanced meals, avoid junk food"),
+    Skill("Recovery", "Green", "Support muscle repair and prevent fatigue.",
+          "🛀 Do deep stretching, foam rolling, breathing exercises, quality sleep"),
+    Skill("Affection", "Green", "Foster emotional connection and care for others.",
+          "💞 Send kind messages, call loved ones, spend quality time with someone"),
+    Skill("Discipline", "Gold", "Stick to habits and routines with consistency.",
+          "📅 Complete daily routines, habit streaks, wake-up on time"),
+    Skill("Planning", "Gold", "Organize tasks and set achievable goals.",
+          "📝 Write to-do lists, plan your week, track long-term goals"),
+    Skill("Reflection", "Gold", "Gain insight through self-review and thought.",
+          "🪞Journal your thoughts, write lessons from the day, meditate on choices"),
+    Skill("Good deeds", "Gold", "Act with kindness and contribute positively.",
+          "🤝 Help someone, donate, volunteer, pick up trash, small acts of kindness"),
+)
+
+CATEGORIES_BY_NAME = {category.name: category for category in CATEGORIES}
+SKILLS_BY_NAME = {skill.name: skill for skill in SKILLS}
+CATEGORY_NAMES = tuple(CATEGORIES_BY_NAME)
+# URL form (/card/red) to category name
+CATEGORY_SLUGS = {name.lower(): name for name in CATEGORY_NAMES}
+SKILL_TO_CATEGORY = {skill.name: skill.category for skill in SKILLS}
+
+
+def category(slug):
+    """Category name for a case-insensitive name or slug, or None."""
+    return CATEGORY_SLUGS.get(slug.lower()) if slug else None
+
+
+def skills_in(category_name):
+    return [skill.name for skill in SKILLS if skill.category == category_name]
@@ -0,0 +1,54 @@
+# === tests/conftest.py ===
+# The application modules live at the repository root, next to this directory.
+#
+# create_app() may only run once per process, so the tests share one app
+# configured against a throwaway database; each test registers users of its
+# own through the real routes instead of resetting the schema.
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_usernames = (f"tester{i}" for i in itertools.count(1))
+
+
+@pytest.fixture(scope="session")
+def xp_app(tmp_path_factory):
+    """app.py, configured once against a database in a temporary directory."""
+    import app as xp_app
+    xp_app.create_app({
+        "DATABASE": str(tmp_path_factory.mktemp("db") / "test.db"),
+        "SECRET_KEY": "test",
+        "TESTING": True,
+        "PASSWORD_COST": 10,  # the lowest scrypt cost; hashing is not what these tests are about
+    })
+    xp_app.init_db()
+    return xp_app
+
+
+class User:
+    def __init__(self, client, user_id, username):
+        self.client, self.id, self.username = client, user_id, username
+
+
+@pytest.fixture
+def new_user(xp_app):
+    """Factory: registers a fresh account and returns a ``User`` whose client is logged in."""
+    def create(password="pw", timezone=None):
+        username = next(_usernames)
+        client = xp_app.app.test_client()
+        client.post("/register", data={"username": username, "password": password, "timezone": timezone or ""})
+        client.post("/login", data={"username": username, "password": password})
+        user_id = xp_app.get_db().execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()[0]
+        return User(client, user_id, username)
+    return create
+
+
+@pytest.fixture
+def user(new_user):
+    return new_user()
@@ -0,0 +1,129 @@
+# === tests/test_achievements.py ===
+# Title and badge unlocks: rule lookup, incremental checks after writes, backfills.
+import pytest
+
+import accounts
+import achievements
+import challenges
+import levels
+import migrations
+from achievements import Rule, RuleIndex
+from db import ConnectionPool
+
+RULES = [
+    Rule("title", "Gym Goer", ("skill", "Strength"), 10),
+    Rule("title", "Power Builder", ("skill", "Strength"), 20),
+    Rule("badge", "Red Novice", ("category", "Red"), 14),
+    Rule("badge", "Well Rounded", ("total", None), 30),
+    Rule("badge", "Early Bird", ("streak", "Gym"), 3),
+]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "unlocks.db"))
+    conn = pool.connection()
+    migrations.migrate(conn)
+    yield conn
+    pool.close_all()
+
+
+@pytest.fixture
+def user_id(conn):
+    return accounts.provision_users(conn, [("user", "pw", None)])["user"]
+
+
+def set_level(conn, user_id, skill, level):
+    old = conn.execute("SELECT level FROM progress WHERE user_id = ? AND skill = ?", (user_id, skill)).fetchone()[0]
+    conn.execute("UPDATE progress SET level = ? WHERE user_id = ? AND skill = ?", (level, user_id, skill))
+    return skill, old, level
+
+
+def names(rules):
+    return sorted(rule.name for rule in rules)
+
+
+def test_compile_rules():
+    rules = achievements.compile_rules(
+        {"Strength": {"10": "Gym Goer"}},
+        {"badges": [{"name": "Red Novice", "unlock_condition": {"category": "Red", "level": 14}},
+                    {"name": "Well Rounded", "unlock_condition": {"total_level": 30}},
+                    {"name": "Early Bird", "unlock_condition": {"challenge": "Gym", "streak": 3}}]})
+    assert rules == [RULES[0], *RULES[2:]]
+    with pytest.raises(ValueError):
+        achievements.badge_input({"minutes": 5})
+
+
+def test_crossed_only_returns_thresholds_in_range():
+    index = RuleIndex(RULES)
+    assert names(index.crossed(("skill", "Strength"), 1, 25)) == ["Gym Goer", "Power Builder"]
+    assert names(index.crossed(("skill", "Strength"), 10, 19)) == []
+    assert names(index.crossed(("skill", "Strength"), 25, 5)) == []
+    assert index.crossed(("skill", "Logic"), 1, 50) == []
+    assert index.longest_streak("Gym") == 3 and index.has_streaks()
+    # The fingerprint ignores rule order
+    assert RuleIndex(reversed(RULES)).fingerprint == index.fingerprint != RuleIndex(RULES[:-1]).fingerprint
+
+
+def test_after_levels_checks_skill_category_and_total(conn, user_id):
+    index = RuleIndex(RULES)
+    change = set_level(conn, user_id, "Strength", 10)
+    assert names(achievements.after_levels(conn, index, user_id, [change])) == ["Gym Goer"]
+    # Red is at 13 and the total at 25 so far; Endurance 3 makes them 15 and 27
+    change = set_level(conn, user_id, "Endurance", 3)
+    assert names(achievements.after_levels(conn, index, user_id, [change])) == ["Red Novice"]
+    changes = [set_level(conn, user_id, "Logic", 4), set_level(conn, user_id, "Speed", 2)]
+    assert names(achievements.after_levels(conn, index, user_id, changes)) == ["Well Rounded"]
+    assert achievements.unlocked(conn, user_id, "badge") == {"Red Novice", "Well Rounded"}
+
+
+def test_unlocks_are_kept_when_levels_drop(conn, user_id):
+    index = RuleIndex(RULES)
+    achievements.after_levels(conn, index, user_id, [set_level(conn, user_id, "Strength", 10)])
+    achievements.after_levels(conn, index, user_id, [set_level(conn, user_id, "Strength", 1)])
+    assert achievements.after_levels(conn, index, user_id, [set_level(conn, user_id, "Strength", 10)]) == []
+    assert achievements.unlocked(conn, user_id, "title") == {"Gym Goer"}
+
+
+def test_after_challenge_counts_the_current_streak(conn, user_id):
+    index = RuleIndex(RULES)
+    for day in ("2026-03-01", "2026-03-02"):
+        challenges.complete(conn, user_id, "Gym", day)
+        assert achievements.after_challenge(conn, index, user_id, "Gym", day) == []
+    challenges.complete(conn, user_id, "Gym", "2026-03-03")
+    assert names(achievements.after_challenge(conn, index, user_id, "Gym", "2026-03-03")) == ["Early Bird"]
+    assert achievements.after_challenge(conn, index, user_id, "Reading", "2026-03-03") == []
+
+
+def test_sync_backfills_and_runs_once_per_rule_set(conn, user_id):
+    set_level(conn, user_id, "Strength", 20)
+    for day in ("2026-01-01", "2026-01-02", "2026-01-03"):
+        challenges.complete(conn, user_id, "Gym", day)
+    # A streak that was broken since still counts: it reached 3 once
+    challenges.complete(conn, user_id, "Gym", "2026-02-01")
+
+    index = RuleIndex(RULES[:2])
+    assert achievements.sync_if_changed(conn, index) == 2
+    assert achievements.sync_if_changed(conn, index) == 0
+    index = RuleIndex(RULES)
+    assert achievements.sync_if_changed(conn, index) == 3
+    assert achievements.unlocked(conn, user_id, "badge") == {"Red Novice", "Well Rounded", "Early Bird"}
+
+
+def test_add_xp_unlocks_and_announces(xp_app, user):
+    socket = xp_app.socketio.test_client(xp_app.app, flask_test_client=user.client)
+    try:
+        socket.get_received()
+        response = user.client.post("/add_xp", json={"skill": "Strength", "xp": levels.xp_to_reach(10)})
+        assert response.get_json()["current_level"] == 10
+        conn = xp_app.user_db(user.id)
+        assert "Gym Goer" in achievements.unlocked(conn, user.id, "title")
+        assert "Gym Goer" in achievements.unlocked(conn, user.id, "badge")
+        received = socket.get_received()
+        assert {(event["args"][0]["kind"], event["args"][0]["name"])
+                for event in received if event["name"] == "unlocked"} >= {("title", "Gym Goer"), ("badge", "Gym Goer")}
+        # One animation, for the title
+        animations = [event["args"][0]["message"] for event in received if event["name"] == "show_title_animation"]
+        assert animations == ["🎉 New Title Unlocked: Gym Goer 🎉"]
+    finally:
+        socket.disconnect()
@@ -0,0 +1,70 @@
+# === tests/test_analytics.py ===
+# Bucketed XP series and the history export.
+from datetime import date
+
+import pytest
+
+import analytics
+
+
+@pytest.mark.parametrize("month", range(1, 13))
+def test_default_month_range_is_twelve_buckets(month):
+    until = date(2026, month, 15)
+    periods = analytics.buckets(analytics.default_since(until, "month"), until, "month")
+    assert len(periods) == 12
+    assert periods[-1][0] == date(2026, month, 1).isoformat()
+
+
+def test_default_day_and_week_ranges():
+    until = date(2026, 3, 4)
+    assert len(analytics.buckets(analytics.default_since(until, "day"), until, "day")) == 30
+    assert len(analytics.buckets(analytics.default_since(until, "week"), until, "week")) == 12
+
+
+@pytest.fixture
+def history(user):
+    events = [{"skill": "Strength", "xp": 100, "timestamp": "2026-01-05T12:00:00"},
+              {"skill": "Endurance", "xp": 50, "timestamp": "2026-01-05T12:00:00"},
+              {"skill": "Strength", "xp": 30, "timestamp": "2026-01-07T12:00:00"},
+              {"skill": "Vitality", "xp": 20, "timestamp": "2026-02-01T12:00:00"}]
+    assert user.client.post("/add_xp/batch", json=events).status_code == 200
+    return user
+
+
+def test_series_by_skill_and_category(history):
+    body = history.client.get("/api/analytics?bucket=day&since=2026-01-05&until=2026-01-07").get_json()
+    assert [(row["bucket"], row["skill"], row["xp"], row["running_xp"]) for row in body["series"]] == [
+        ("2026-01-05", "Endurance", 50, 50), ("2026-01-05", "Strength", 100, 100), ("2026-01-07", "Strength", 30, 130)]
+
+    body = history.client.get("/api/analytics?bucket=month&group=category&since=2026-01-01&until=2026-02-28").get_json()
+    assert [(row["bucket"], row["category"], row["xp"]) for row in body["series"]] == [
+        ("2026-01-01", "Red", 180), ("2026-02-01", "Green", 20)]
+
+
+def test_series_csv(history):
+    response = history.client.get("/api/analytics?bucket=week&since=2026-01-05&until=2026-01-11&format=csv&skill=Strength")
+    assert response.get_data(as_text=True).splitlines() == ["bucket,skill,xp,running_xp", "2026-01-05,Strength,130,130"]
+
+
+def test_export(history):
+    lines = history.client.get("/api/analytics/export?format=ndjson&since=2026-01-06").get_data(as_text=True).splitlines()
+    assert len(lines) == 2 and '"Vitality"' in lines[-1]
+    csv_lines = history.client.get("/api/analytics/export").get_data(as_text=True).splitlines()
+    assert csv_lines[0] == "timestamp,skill,xp" and len(csv_lines) == 5
+
+
+@pytest.mark.parametrize("query", [
+    "bucket=day&until=9999-12-31",
+    "bucket=week&until=9999-12-31",
+    "bucket=month&until=9999-12-31",
+    "bucket=week&until=0001-01-02",
+    "since=yesterday",
+    "bucket=hour",
+])
+def test_series_rejects_bad_ranges(user, query):
+    assert user.client.get(f"/api/analytics?{query}").status_code == 400
+
+
+@pytest.mark.parametrize("query", ["until=9999-12-31", "since=2026-13-01", "format=xml"])
+def test_export_rejects_bad_ranges(user, query):
+    assert user.client.get(f"/api/analytics/export?{query}").status_code == 400
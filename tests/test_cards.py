@@ -0,0 +1,49 @@
+# === tests/test_cards.py ===
+# /card/<category> and /api/stats: conditional requests against the progress version.
+
+
+def test_stats_revalidate_until_xp_changes(user):
+    first = user.client.get("/api/stats")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] in ("private, no-cache", "no-cache, private")
+    etag = first.headers["ETag"]
+
+    again = user.client.get("/api/stats", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+
+    user.client.post("/add_xp", json={"skill": "Strength", "xp": 150})
+    changed = user.client.get("/api/stats", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    body = changed.get_json()
+    assert body["version"] == first.get_json()["version"] + 1
+    strength = next(row for row in body["stats"] if row["skill"] == "Strength")
+    assert (strength["level"], strength["xp"], strength["xp_to_next_level"]) == (2, 50, 200)
+
+
+def test_stats_by_category(user):
+    body = user.client.get("/api/stats?category=blue").get_json()
+    assert body["category"] == "Blue" and {row["category"] for row in body["stats"]} == {"Blue"}
+    etag = user.client.get("/api/stats").headers["ETag"]
+    # Each category has a validator of its own
+    assert user.client.get("/api/stats?category=Blue", headers={"If-None-Match": etag}).status_code == 200
+    assert user.client.get("/api/stats?category=Purple").status_code == 404
+
+
+def test_stats_if_modified_since(user):
+    user.client.post("/add_xp", json={"skill": "Logic", "xp": 10})
+    last_modified = user.client.get("/api/stats").headers["Last-Modified"]
+    assert user.client.get("/api/stats", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+
+def test_card_page(user):
+    page = user.client.get("/card/red")
+    assert page.status_code == 200 and b"Strength" in page.data
+    assert user.client.get("/card/red", headers={"If-None-Match": page.headers["ETag"]}).status_code == 304
+    assert user.client.get("/card/purple").status_code == 404
+    legacy = user.client.get("/card_red")
+    assert legacy.status_code == 301 and legacy.headers["Location"].endswith("/card/red")
+
+
+def test_stats_need_a_login(xp_app):
+    assert xp_app.app.test_client().get("/api/stats").status_code == 401
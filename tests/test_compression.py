@@ -0,0 +1,93 @@
+# === tests/test_compression.py ===
+# Response compression, revalidation of compressed pages and the fragment cache.
+import gzip
+
+import pytest
+from flask import Response
+from werkzeug.http import parse_accept_header
+
+import compression
+
+GZIP = parse_accept_header("gzip, deflate")
+IDENTITY = parse_accept_header("")
+
+
+@pytest.fixture(autouse=True)
+def without_brotli(monkeypatch):
+    # gzip whether or not brotli happens to be installed
+    monkeypatch.setattr(compression, "brotli", None)
+
+
+def test_choose_encoding():
+    assert compression.choose_encoding(GZIP) == "gzip"
+    assert compression.choose_encoding(parse_accept_header("br")) is None
+    assert compression.choose_encoding(IDENTITY) is None
+
+
+def test_compresses_text_above_the_threshold():
+    body = "<p>level up</p>" * 200
+    response = Response(body, mimetype="text/html", headers={"Accept-Ranges": "bytes"})
+    response.set_etag("v1")
+    compression.compress_response(response, GZIP, min_size=1024)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.get_data()).decode() == body
+    assert "Accept-Encoding" in response.vary and "Accept-Ranges" not in response.headers
+    assert response.get_etag() == ("v1", True)
+
+
+@pytest.mark.parametrize("response, accept", [
+    (Response("x" * 100, mimetype="text/html"), GZIP),        # below the threshold
+    (Response("x" * 2000, mimetype="text/html"), IDENTITY),   # client cannot decode it
+])
+def test_uncompressed_but_varies(response, accept):
+    compression.compress_response(response, accept, min_size=1024)
+    assert "Content-Encoding" not in response.headers and "Accept-Encoding" in response.vary
+
+
+@pytest.mark.parametrize("response", [
+    Response(b"\x89PNG" * 1000, mimetype="image/png"),
+    Response("x" * 2000, status=404, mimetype="text/html"),
+    Response(iter(["x" * 2000]), mimetype="text/csv"),
+])
+def test_leaves_other_responses_alone(response):
+    compression.compress_response(response, GZIP, min_size=1024)
+    assert "Content-Encoding" not in response.headers and "Accept-Encoding" not in response.vary
+
+
+def test_card_page_is_compressed_and_revalidates(user):
+    plain = user.client.get("/card/red")
+    page = user.client.get("/card/red", headers={"Accept-Encoding": "gzip"})
+    assert page.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in page.vary
+    assert gzip.decompress(page.data) == plain.data and len(page.data) < len(plain.data)
+    assert page.headers["ETag"].startswith('W/')
+    # The weak tag of the compressed page revalidates either representation
+    for encoding in ("gzip", "identity"):
+        again = user.client.get("/card/red", headers={"If-None-Match": page.headers["ETag"], "Accept-Encoding": encoding})
+        assert again.status_code == 304 and "Content-Encoding" not in again.headers
+
+
+def test_compression_can_be_turned_off(xp_app, user, monkeypatch):
+    monkeypatch.setitem(xp_app.app.config, "COMPRESS_RESPONSES", False)
+    assert "Content-Encoding" not in user.client.get("/card/red", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_exports_stream_uncompressed(user):
+    response = user.client.get("/api/analytics/export", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and "Content-Encoding" not in response.headers
+
+
+def test_static_files_are_cacheable(xp_app):
+    response = xp_app.app.test_client().get("/static/styles.css", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.cache_control.max_age == xp_app.app.config["SEND_FILE_MAX_AGE_DEFAULT"]
+    response.close()
+
+
+def test_card_fragments_render_once(xp_app, new_user):
+    first, second = new_user(), new_user()
+    first.client.get("/card/blue")
+    before = xp_app.fragment_cache.stats()
+    page = second.client.get("/card/blue")
+    after = xp_app.fragment_cache.stats()
+    assert after["misses"] == before["misses"] and after["hits"] > before["hits"]
+    assert b"Intelligence" in page.data
@@ -0,0 +1,24 @@
+# === tests/test_dashboard.py ===
+# The dashboard page with picks the catalog no longer has.
+
+
+def pick(xp_app, user_id, kind, name, position):
+    xp_app.user_db(user_id).execute(
+        "INSERT INTO user_selections (user_id, kind, name, position) VALUES (?, ?, ?, ?)",
+        (user_id, kind, name, position))
+    xp_app.dashboard_cache.invalidate(user_id)
+
+
+def test_dashboard_skips_picks_missing_from_the_catalog(xp_app, user):
+    catalog = xp_app.catalog_loader.get()
+    title, badge = next(iter(catalog.title_info)), next(iter(catalog.badge_images))
+    pick(xp_app, user.id, "title", "Old Title", 1)
+    pick(xp_app, user.id, "title", title, 2)
+    pick(xp_app, user.id, "badge", "Old Badge", 1)
+    pick(xp_app, user.id, "badge", badge, 2)
+
+    response = user.client.get("/dashboard")
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert title in page and badge in page
+    assert "Old Title" not in page and "Old Badge" not in page
@@ -0,0 +1,103 @@
+# === tests/test_ingest.py ===
+# Batch XP ingestion: payload formats, validation and the /add_xp/batch and
+# `flask import-xp` entry points.
+import json
+
+import pytest
+
+import ingest
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ('[{"skill": "Strength", "xp": 10}]', "application/json"),
+    ('{"events": [{"skill": "Strength", "xp": 10}]}', "application/json"),
+    ('{"skill": "Strength", "xp": 10}', "application/json"),
+    ('{"skill": "Strength", "xp": 10}\n\n', "application/x-ndjson"),
+    ('{"skill": "Strength", "xp": 10}\n{"skill": "Strength", "xp": 5}', ""),
+])
+def test_parse_payload_formats(body, content_type):
+    events = ingest.parse_payload(body.encode(), content_type)
+    assert events[0] == {"skill": "Strength", "xp": 10}
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ('{"events": 5}', "application/json"),
+    ('{"events": {"a": 1}}', "application/json"),
+    ('[1, 2]', "application/json"),
+    ('[{"skill": "Strength"}, "x"]', "application/json"),
+    ('{"skill": "Strength"}\n[1]', "application/x-ndjson"),
+    ('{"skill": "Strength"}\n7', ""),
+    ('{"skill": ', "application/x-ndjson"),
+    ("skill=Strength", ""),
+])
+def test_parse_payload_rejects_malformed(body, content_type):
+    with pytest.raises(ValueError):
+        ingest.parse_payload(body, content_type)
+
+
+def test_normalize_checks_events():
+    assert ingest.normalize([{"skill": "Strength", "xp": "5"}], default_user_id=3) == [(3, "Strength", 5, None)]
+    with pytest.raises(ingest.InvalidEvent, match="Event 0"):
+        ingest.normalize([{"skill": "Strength", "xp": ingest.MAX_GRANT_XP + 1}], default_user_id=3)
+    with pytest.raises(ingest.InvalidEvent, match="needs a user"):
+        ingest.normalize([{"xp": 5}], default_user_id=3)
+    with pytest.raises(ingest.InvalidEvent, match="timestamp"):
+        ingest.normalize([{"skill": "Strength", "timestamp": "yesterday"}], default_user_id=3)
+
+
+def progress(xp_app, user_id, skill):
+    return xp_app.user_db(user_id).execute(
+        "SELECT level, xp FROM progress WHERE user_id = ? AND skill = ?", (user_id, skill)).fetchone()
+
+
+def test_batch_applies_in_order_and_records_ledger(xp_app, user):
+    events = [{"skill": "Strength", "xp": 250}, {"skill": "Strength", "xp": -1000},
+              {"skill": "Endurance", "xp": 100}, {"skill": "Juggling", "xp": 10}]
+    response = user.client.post("/add_xp/batch", json={"events": events})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result["applied"], result["skipped"]) == (3, 1)
+    # The removal clamps at 0, and the ledger records what was applied
+    assert progress(xp_app, user.id, "Strength") == (1, 0)
+    assert progress(xp_app, user.id, "Endurance") == (2, 0)
+    ledger = xp_app.user_db(user.id).execute(
+        "SELECT skill, xp FROM xp_events WHERE user_id = ? ORDER BY id", (user.id,)).fetchall()
+    assert ledger == [("Strength", 250), ("Strength", -250), ("Endurance", 100)]
+
+
+def test_batch_ndjson(xp_app, user):
+    body = "\n".join(json.dumps({"skill": "Mobility", "xp": 60}) for _ in range(5))
+    response = user.client.post("/add_xp/batch", data=body, content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert progress(xp_app, user.id, "Mobility") == (3, 0)
+
+
+@pytest.mark.parametrize("body", ['{"events": 5}', '{"events": {"a": 1}}', "[1]", "{nope", "\xff"])
+def test_batch_rejects_malformed_payloads(user, body):
+    response = user.client.post("/add_xp/batch", data=body.encode("latin-1"), content_type="application/json")
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+
+def test_batch_only_targets_the_logged_in_user(user, new_user):
+    other = new_user()
+    response = user.client.post("/add_xp/batch", json=[{"user_id": other.id, "skill": "Strength", "xp": 10}])
+    assert response.status_code == 403
+
+
+def test_import_xp_command(xp_app, user, tmp_path):
+    source = tmp_path / "events.ndjson"
+    source.write_text(json.dumps({"username": user.username, "skill": "Strength", "xp": 100}) + "\n"
+                      + json.dumps({"username": "nobody", "skill": "Strength", "xp": 100}) + "\n")
+    result = xp_app.app.test_cli_runner().invoke(args=["import-xp", str(source)])
+    assert result.exit_code == 0, result.output
+    assert "Applied 1 events" in result.output and "Unknown users: nobody" in result.output
+    assert progress(xp_app, user.id, "Strength") == (2, 0)
+
+
+def test_import_xp_rejects_malformed_file(xp_app, tmp_path):
+    source = tmp_path / "events.json"
+    source.write_text('{"events": 5}')
+    result = xp_app.app.test_cli_runner().invoke(args=["import-xp", str(source)])
+    assert result.exit_code != 0
+    assert "Expected a list of events" in result.output
@@ -0,0 +1,120 @@
+# === tests/test_leaderboard.py ===
+# Ranks from the in-memory index against a plain count, the ledger catch-up,
+# and the leaderboard endpoints.
+import random
+
+import pytest
+
+import accounts
+import ingest
+import ledger
+import migrations
+from db import ConnectionPool
+from leaderboard import GLOBAL, Leaderboards, RankIndex, ShardedLeaderboards, board_name
+
+
+def test_rank_index_matches_a_plain_count(monkeypatch):
+    monkeypatch.setattr(RankIndex, "BLOCK_SIZE", 8)  # plenty of block splits and merges
+    rng = random.Random(1)
+    pairs = sorted(((rng.randint(1, 50), user_id) for user_id in range(1, 200)), key=lambda p: (-p[0], p[1]))
+    index = RankIndex.from_sorted(pairs)
+    totals = {user_id: total for total, user_id in pairs}
+    for step in range(5000):
+        user_id = rng.randint(1, 400)
+        # Totals far beyond 32 bits must not overflow the keys
+        delta = rng.choice([rng.randint(-60, 60), 2 ** 40, -2 ** 40, 3 * 2 ** 31])
+        index.add(user_id, delta)
+        totals[user_id] = max(0, totals.get(user_id, 0) + delta)
+        if step % 100 == 0:
+            for other in rng.sample(range(1, 401), 20):
+                total = totals.get(other, 0)
+                assert index.rank(other) == sum(1 for t in totals.values() if t > total) + 1
+            assert index.size == sum(1 for t in totals.values() if t)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "board.db"))
+    migrations.migrate(pool.connection())
+    yield pool
+    pool.close_all()
+
+
+def make_users(conn, count):
+    ids = accounts.provision_users(conn, [(f"user{i}", "pw", None) for i in range(count)])
+    return [ids[f"user{i}"] for i in range(count)]
+
+
+def test_ranks_follow_the_ledger(pool):
+    conn = pool.connection()
+    a, b, c = make_users(conn, 3)
+    ledger.apply(conn, a, "Strength", 500)
+    ledger.apply(conn, b, "Strength", 300)
+    boards = Leaderboards()
+    assert boards.rank(conn, GLOBAL, b) == {"rank": 2, "total_xp": 300, "ranked": 2}
+
+    # Grants after the index was built are picked up from the ledger
+    ledger.apply(conn, b, "Endurance", 300)
+    ledger.apply(conn, c, "Strength", 500)
+    assert boards.rank(conn, GLOBAL, b)["rank"] == 1
+    assert boards.rank(conn, GLOBAL, a) == {"rank": 2, "total_xp": 500, "ranked": 3}
+    assert boards.rank(conn, GLOBAL, c)["rank"] == 2  # tied with a
+    assert boards.rank(conn, board_name(skill="Strength"), b)["rank"] == 3
+    assert [entry["user_id"] for entry in boards.top(conn, GLOBAL)] == [b, a, c]
+    assert [entry["rank"] for entry in boards.top(conn, GLOBAL, limit=2, offset=1)] == [2, 2]
+
+
+def test_first_lookup_does_not_replay_the_ledger(pool):
+    conn = pool.connection()
+    user_ids = make_users(conn, 20)
+    for user_id in user_ids:
+        ledger.apply(conn, user_id, "Strength", user_id * 10)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        assert Leaderboards().rank(conn, GLOBAL, user_ids[0])["rank"] == 20
+    finally:
+        conn.set_trace_callback(None)
+    assert not [sql for sql in statements if "FROM xp_events WHERE id >" in sql]
+
+
+def test_sharded_ranks_add_up(tmp_path):
+    pools = [ConnectionPool(str(tmp_path / f"shard{i}.db")) for i in range(2)]
+    conns = [pool.connection() for pool in pools]
+    for conn in conns:
+        migrations.migrate(conn)
+    # Ids as the directory hands them out: unique across shards
+    for conn, (first, second) in zip(conns, ((1, 3), (2, 4))):
+        conn.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, '')",
+                         [(first, f"user{first}"), (second, f"user{second}")])
+        conn.executemany("INSERT INTO progress (user_id, skill, category) VALUES (?, 'Strength', 'Red')",
+                         [(first,), (second,)])
+    for user_id, xp in ((1, 100), (2, 400), (3, 300), (4, 200)):
+        ledger.apply(conns[(user_id + 1) % 2], user_id, "Strength", xp)
+    boards = ShardedLeaderboards()
+    assert boards.rank(conns, GLOBAL, 3) == {"rank": 2, "total_xp": 300, "ranked": 4}
+    assert [entry["user_id"] for entry in boards.top(conns, GLOBAL)] == [2, 3, 4, 1]
+    assert [(entry["rank"], entry["user_id"]) for entry in boards.top(conns, GLOBAL, limit=2, offset=2)] \
+        == [(3, 4), (4, 1)]
+    for pool in pools:
+        pool.close_all()
+
+
+def test_oversized_grants_are_rejected(user):
+    for route in ("/add_xp", "/delete_xp"):
+        response = user.client.post(route, json={"skill": "Strength", "xp": 2 ** 40})
+        assert response.status_code == 400
+    assert user.client.post("/add_xp", json={"skill": "Strength", "xp": "lots"}).status_code == 400
+    assert user.client.post("/add_xp", json={"skill": "Strength", "xp": ingest.MAX_GRANT_XP}).status_code == 200
+    for url in ("/api/leaderboard", "/api/leaderboard?skill=Strength", "/api/leaderboard/me"):
+        assert user.client.get(url).status_code == 200
+
+
+def test_leaderboard_endpoints(user, new_user):
+    rival = new_user()
+    user.client.post("/add_xp", json={"skill": "Strength", "xp": 123457})
+    rival.client.post("/add_xp", json={"skill": "Strength", "xp": 123456})
+    mine = user.client.get("/api/leaderboard/me?skill=Strength").get_json()
+    theirs = rival.client.get("/api/leaderboard/me?skill=Strength").get_json()
+    assert mine["total_xp"] == 123457 and theirs["rank"] == mine["rank"] + 1
+    assert user.client.get("/api/leaderboard?skill=Juggling").status_code == 404
@@ -0,0 +1,80 @@
+# === tests/test_ledger.py ===
+# The xp_events ledger: what each write records, replay and rebuild.
+import pytest
+
+import accounts
+import ledger
+import levels
+import migrations
+from db import ConnectionPool
+
+
+@pytest.fixture
+def conn(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "ledger.db"))
+    conn = pool.connection()
+    migrations.migrate(conn)
+    yield conn
+    pool.close_all()
+
+
+@pytest.fixture
+def user_id(conn):
+    return accounts.provision_users(conn, [("user", "pw", None)])["user"]
+
+
+def events(conn, user_id):
+    return conn.execute("SELECT skill, xp FROM xp_events WHERE user_id = ? ORDER BY id", (user_id,)).fetchall()
+
+
+def test_apply_records_the_change_actually_made(conn, user_id):
+    assert ledger.apply(conn, user_id, "Strength", 250) == (1, 2, 150)
+    assert ledger.apply(conn, user_id, "Strength", -1000) == (2, 1, 0)
+    assert ledger.apply(conn, user_id, "Strength", -10) == (1, 1, 0)  # nothing to remove, nothing recorded
+    assert ledger.apply(conn, user_id, "Juggling", 10) is None
+    assert events(conn, user_id) == [("Strength", 250), ("Strength", -250)]
+
+
+def test_totals_clamp_at_the_cap(conn, user_id):
+    conn.execute("UPDATE progress SET level = ?, xp = ? WHERE user_id = ? AND skill = 'Strength'",
+                 (*levels.from_total(levels.MAX_TOTAL_XP - 5), user_id))
+    ledger.apply(conn, user_id, "Strength", 100)
+    assert events(conn, user_id) == [("Strength", 5)]
+
+
+def test_timestamps_are_epoch_seconds(conn, user_id):
+    ledger.apply(conn, user_id, "Logic", 10, timestamp="2026-01-01T00:00:00+01:00")
+    ledger.apply(conn, user_id, "Logic", 10, timestamp="2026-01-01T00:00:00")
+    created = [at for at, in conn.execute("SELECT created_at FROM xp_events ORDER BY id")]
+    assert created == [1767222000, 1767225600]
+
+
+def test_replay_and_rebuild(conn, user_id):
+    for amount in (500, -120, 80):
+        ledger.apply(conn, user_id, "Strength", amount)
+    ledger.apply(conn, user_id, "Logic", 40)
+    assert ledger.replay(conn, chunk_size=2) == {(user_id, "Strength"): 460, (user_id, "Logic"): 40}
+    assert ledger.rebuild(conn) == []
+
+    # Progress drifts from the ledger, e.g. after a manual edit
+    conn.execute("UPDATE progress SET level = 9, xp = 0 WHERE user_id = ? AND skill = 'Strength'", (user_id,))
+    drift = ledger.rebuild(conn, chunk_size=1, dry_run=True)
+    assert [(skill, old, new) for _, _, skill, old, new in drift] == [("Strength", (9, 0), (3, 160))]
+    assert conn.execute("SELECT level FROM progress WHERE user_id = ? AND skill = 'Strength'", (user_id,)).fetchone() == (9,)
+    ledger.rebuild(conn)
+    assert conn.execute("SELECT level, xp FROM progress WHERE user_id = ? AND skill = 'Strength'",
+                        (user_id,)).fetchone() == (3, 160)
+
+
+def test_routes_write_the_ledger(xp_app, user):
+    user.client.post("/add_xp", json={"skill": "Speed", "xp": 120})
+    user.client.post("/delete_xp", json={"skill": "Speed", "xp": 500})
+    assert events(xp_app.user_db(user.id), user.id) == [("Speed", 120), ("Speed", -120)]
+
+
+def test_rebuild_progress_command(xp_app, user):
+    user.client.post("/add_xp", json={"skill": "Speed", "xp": 120})
+    runner = xp_app.app.test_cli_runner()
+    result = runner.invoke(args=["rebuild-progress", "--dry-run"])
+    assert result.exit_code == 0, result.output
+    assert "would change 0 progress rows" in result.output
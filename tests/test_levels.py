@@ -0,0 +1,49 @@
+# === tests/test_levels.py ===
+# The closed-form level math must give exactly what the loops add_xp and
+# delete_xp used to run gave (see benchmarks/bench_levels.py for timings).
+import random
+
+import pytest
+
+import levels
+
+
+def legacy_add(level, xp, amount):
+    new_xp = xp + amount
+    while new_xp >= level * 100:
+        level += 1
+        new_xp -= (level - 1) * 100
+    return level, new_xp
+
+
+def legacy_remove(level, xp, amount):
+    new_xp = xp - amount
+    while new_xp < 0:
+        if level == 1:
+            new_xp = 0
+            break
+        new_xp += (level - 1) * 100
+        level -= 1
+    return level, new_xp
+
+
+@pytest.mark.parametrize("legacy, closed", [(legacy_add, levels.add_xp), (legacy_remove, levels.remove_xp)])
+def test_closed_form_matches_legacy_loops(legacy, closed):
+    rng = random.Random(0)
+    for _ in range(20000):
+        level = rng.randint(1, 200)
+        xp = rng.randrange(level * 100)
+        amount = rng.choice([rng.randint(0, 1000), rng.randint(0, 10 ** 6)])
+        assert closed(level, xp, amount) == legacy(level, xp, amount), (level, xp, amount)
+
+
+@pytest.mark.parametrize("level", [1, 2, 3, 10, 100, 1000])
+def test_level_boundaries(level):
+    start = levels.xp_to_reach(level)
+    assert levels.from_total(start) == (level, 0)
+    assert levels.from_total(start - 1) == (max(1, level - 1), 0 if level == 1 else (level - 1) * 100 - 1)
+
+
+def test_totals_clamp_to_range():
+    assert levels.from_total(-5) == (1, 0)
+    assert levels.from_total(levels.MAX_TOTAL_XP + 1) == levels.from_total(levels.MAX_TOTAL_XP)
@@ -0,0 +1,78 @@
+# === tests/test_passwords.py ===
+# Password hashing, upgrades on login and the login route around them.
+import threading
+
+import pytest
+
+import passwords
+
+
+@pytest.fixture
+def hasher():
+    return passwords.PasswordHasher(cost=10, workers=2)
+
+
+def test_hash_and_verify(hasher):
+    stored = hasher.hash("correct horse")
+    assert stored.startswith("scrypt$ln=10,")
+    assert hasher.hash("correct horse") != stored  # salted
+    assert hasher.verify(stored, "correct horse")
+    assert not hasher.verify(stored, "battery staple")
+    assert not hasher.verify("scrypt$garbage", "correct horse")
+
+
+def test_needs_rehash(hasher):
+    assert hasher.needs_rehash("plaintext")
+    assert hasher.needs_rehash(passwords.PasswordHasher(cost=11, workers=1).hash("pw"))
+    assert not hasher.needs_rehash(hasher.hash("pw"))
+    # Plaintext from before hashing still verifies, so it can be upgraded
+    assert hasher.verify("pw", "pw") and not hasher.verify("pw", "other")
+
+
+def test_zero_workers_hash_inline():
+    hasher = passwords.PasswordHasher(cost=10, workers=0)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(hasher.verify(hasher.hash("pw"), "pw")), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert result == [True]
+
+
+def test_pool_busy_beyond_max_pending():
+    with pytest.raises(passwords.PoolBusy):
+        passwords.PasswordHasher(cost=10, workers=1, max_pending=0).hash("pw")
+
+
+def stored_password(xp_app, username):
+    return xp_app.get_db().execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+
+def test_login_upgrades_plaintext_and_old_costs(xp_app, user):
+    xp_app.get_db().execute("UPDATE users SET password = 'legacy' WHERE id = ?", (user.id,))
+    client = xp_app.app.test_client()
+    assert client.post("/login", data={"username": user.username, "password": "wrong"}).data == b"Login failed"
+    assert stored_password(xp_app, user.username) == "legacy"
+    assert client.post("/login", data={"username": user.username, "password": "legacy"}).status_code == 302
+    upgraded = stored_password(xp_app, user.username)
+    assert upgraded.startswith("scrypt$ln=10,") and xp_app.password_hasher.verify(upgraded, "legacy")
+
+    older = passwords.PasswordHasher(cost=11, workers=1).hash("legacy")
+    xp_app.get_db().execute("UPDATE users SET password = ? WHERE id = ?", (older, user.id))
+    assert client.post("/login", data={"username": user.username, "password": "legacy"}).status_code == 302
+    assert stored_password(xp_app, user.username).startswith("scrypt$ln=10,")
+
+
+def test_login_unknown_user(xp_app):
+    response = xp_app.app.test_client().post("/login", data={"username": "nobody", "password": "pw"})
+    assert response.data == b"Login failed"
+
+
+def test_login_timezone_refreshes_the_dashboard_snapshot(xp_app, new_user):
+    user = new_user(timezone="UTC")
+    assert user.client.get("/dashboard").status_code == 200
+    snapshot = xp_app.dashboard_cache.get_or_load(user.id, lambda: None)
+    assert snapshot["timezone"] == "UTC"
+
+    user.client.post("/login", data={"username": user.username, "password": "pw", "timezone": "Pacific/Kiritimati"})
+    user.client.get("/dashboard")
+    assert xp_app.dashboard_cache.get_or_load(user.id, lambda: None)["timezone"] == "Pacific/Kiritimati"
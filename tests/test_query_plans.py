@@ -0,0 +1,32 @@
+# === tests/test_query_plans.py ===
+# `flask check-query-plans` as a test: every hot query must be served by an
+# index on a freshly migrated schema.
+import sqlite3
+
+import pytest
+
+import migrations
+from app import DASHBOARD_SQL
+
+QUERIES = migrations.HOT_QUERIES + [(DASHBOARD_SQL, {"user_id": 1})]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "schema.db", isolation_level=None)
+    migrations.migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("sql, params", QUERIES, ids=lambda value: " ".join(str(value).split())[:60])
+def test_hot_query_uses_an_index(conn, sql, params):
+    assert migrations.full_scans(conn, sql, params) == []
+
+
+def test_dropped_index_is_reported(conn):
+    # Either index would serve a per-user lookup
+    conn.execute("DROP INDEX progress_user_skill")
+    conn.execute("DROP INDEX progress_user_category")
+    problems = migrations.check_query_plans(conn, QUERIES)
+    assert ("SELECT id, xp, level FROM progress WHERE user_id = ? AND skill = ?", ["progress"]) in problems
@@ -0,0 +1,130 @@
+# === tests/test_ratelimit.py ===
+# Token buckets, the write admission queue, and 429s from the write routes.
+import threading
+
+import pytest
+
+import ratelimit
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    if request.param == "memory":
+        yield ratelimit.MemoryBuckets()
+    else:
+        buckets = ratelimit.make_buckets(f"sqlite:///{tmp_path / 'limits.db'}")
+        yield buckets
+        buckets.pool.close_all()
+
+
+def test_bucket_allows_a_burst_then_refills(buckets):
+    assert [buckets.take("user:1", 2.0, 3, now=100.0) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take("user:1", 2.0, 3, now=100.0) == pytest.approx(0.5)
+    # Other keys have buckets of their own
+    assert buckets.take("user:2", 2.0, 3, now=100.0) == 0
+    assert buckets.take("user:1", 2.0, 3, now=100.25) == pytest.approx(0.25)
+    assert buckets.take("user:1", 2.0, 3, now=100.5) == 0
+    # Idle time refills up to the burst, not beyond
+    assert [buckets.take("user:1", 2.0, 3, now=200.0) for _ in range(4)][-1] == pytest.approx(0.5)
+    assert len(buckets) == 2
+
+
+def test_make_buckets():
+    assert isinstance(ratelimit.make_buckets(None), ratelimit.MemoryBuckets)
+    assert isinstance(ratelimit.make_buckets("memory://"), ratelimit.MemoryBuckets)
+    with pytest.raises(ValueError):
+        ratelimit.make_buckets("memcached://localhost")
+
+
+def test_retry_after_rounds_up():
+    assert [ratelimit.retry_after(wait) for wait in (0.01, 1.0, 1.2)] == [1, 1, 2]
+
+
+def test_rate_limiter_counts():
+    limiter = ratelimit.RateLimiter(rate=0.001, burst=1)
+    assert limiter.hit("user:1") == 0
+    assert limiter.hit("user:1") > 0
+    assert limiter.stats() == {"allowed": 1, "limited": 1, "tracked_keys": 1}
+
+
+def test_admission_queue_full_and_timeout():
+    queue = ratelimit.AdmissionQueue(concurrency=1, max_waiting=1, timeout=0.5)
+    queue.acquire()
+    errors = []
+
+    def wait_for_turn():
+        try:
+            queue.acquire()
+        except ratelimit.Overloaded as e:
+            errors.append(e.reason)
+
+    # One request waits its turn; with the line full the next is turned away at once
+    waiting = threading.Thread(target=wait_for_turn)
+    waiting.start()
+    while queue.stats()["queue_depth"] == 0:
+        waiting.join(0.001)
+    with pytest.raises(ratelimit.Overloaded, match="queue full"):
+        queue.acquire()
+    waiting.join(5)
+    assert errors == ["timed out waiting"]
+    queue.release()
+    assert queue.stats() == {"admitted": 1, "rejected_full": 1, "rejected_timeout": 1, "active": 0, "queue_depth": 0}
+
+
+def test_admission_queue_hands_over_slots():
+    queue = ratelimit.AdmissionQueue(concurrency=1, max_waiting=1, timeout=5)
+    queue.acquire()
+    admitted = threading.Event()
+
+    def wait_for_turn():
+        with queue.admit():
+            admitted.set()
+
+    waiting = threading.Thread(target=wait_for_turn)
+    waiting.start()
+    while queue.stats()["queue_depth"] == 0:
+        waiting.join(0.001)
+    assert not admitted.is_set()
+    queue.release()
+    waiting.join(5)
+    assert admitted.is_set() and queue.stats()["admitted"] == 2 and queue.stats()["active"] == 0
+
+
+@pytest.fixture
+def limits(xp_app, monkeypatch):
+    monkeypatch.setitem(xp_app.app.config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(xp_app, "rate_limiter", ratelimit.RateLimiter(rate=0.5, burst=2))
+    monkeypatch.setattr(xp_app, "write_queue", ratelimit.AdmissionQueue(concurrency=1, max_waiting=0, timeout=0.01))
+    return xp_app
+
+
+def add_xp(user):
+    return user.client.post("/add_xp", json={"skill": "Logic", "xp": 10})
+
+
+def test_write_routes_answer_429_per_user(limits, new_user):
+    user, other = new_user(), new_user()
+    assert [add_xp(user).status_code for _ in range(2)] == [200, 200]
+    limited = add_xp(user)
+    assert limited.status_code == 429 and limited.headers["Retry-After"] == "2"
+    assert limited.get_json() == {"success": False, "error": "Too many requests, please slow down"}
+    assert add_xp(other).status_code == 200
+    # Reads are not limited
+    assert user.client.get("/api/stats").status_code == 200
+
+
+def test_write_routes_shed_when_the_queue_is_full(limits, user):
+    limits.write_queue.acquire()
+    try:
+        shed = add_xp(user)
+    finally:
+        limits.write_queue.release()
+    assert shed.status_code == 429 and shed.headers["Retry-After"] == "1"
+    assert shed.get_json()["error"] == "Server busy, please try again"
+    assert add_xp(user).status_code == 200
+    assert limits.write_queue.stats()["active"] == 0
+
+
+def test_limits_off_by_default(xp_app, user):
+    assert not xp_app.app.config["RATE_LIMIT_ENABLED"]
+    assert all(add_xp(user).status_code == 200 for _ in range(30))
@@ -0,0 +1,106 @@
+# === tests/test_selections.py ===
+# Picked titles and badges: validation, the selection routes, stale picks and
+# the migration from the old JSON arrays.
+import json
+import sqlite3
+
+import pytest
+
+import catalog
+import migrations
+import selections
+
+KNOWN = {"title": {"Novice": {}}, "badge": {"First Steps": "img.png"}}
+
+
+def changes(*items):
+    return {"changes": [{"kind": kind, "name": name, "action": action} for kind, name, action in items]}
+
+
+def test_parse_changes():
+    assert selections.parse_changes(changes(("title", "Novice", "add"), ("badge", "First Steps", "remove")), KNOWN) \
+        == [("title", "Novice", "add"), ("badge", "First Steps", "remove")]
+
+
+@pytest.mark.parametrize("payload, error", [
+    (None, "non-empty"),
+    ({"changes": []}, "non-empty"),
+    ({"changes": ["x"]}, "object"),
+    (changes(("skill", "Novice", "add")), "Unknown kind"),
+    (changes(("title", "Novice", "toggle")), "Unknown action"),
+    (changes(("title", "Old Title", "add")), "Unknown title"),
+    (changes(("title", 5, "remove")), "Unknown title"),
+    ({"changes": [{"kind": "title", "name": "Novice", "action": "add"}] * (selections.MAX_CHANGES + 1)}, "At most"),
+])
+def test_parse_changes_rejects(payload, error):
+    with pytest.raises(ValueError, match=error):
+        selections.parse_changes(payload, KNOWN)
+
+
+def test_picks_not_in_the_catalog_can_be_removed():
+    assert selections.parse_changes(changes(("title", "Old Title", "remove")), KNOWN) == [
+        ("title", "Old Title", "remove")]
+
+
+@pytest.fixture
+def names(xp_app):
+    current = xp_app.catalog_loader.get()
+    return list(current.title_info)[:3], list(current.badge_images)[:2]
+
+
+def test_api_selections_keeps_pick_order(user, names):
+    titles, badges = names
+    response = user.client.post("/api/selections", json=changes(
+        ("title", titles[2], "add"), ("title", titles[0], "add"), ("badge", badges[0], "add"),
+        ("title", titles[2], "add"), ("title", titles[1], "add"), ("title", titles[0], "remove")))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["selected_titles"] == [titles[2], titles[1]]
+    assert body["selected_badges"] == [badges[0]]
+
+
+def test_single_toggles_update_the_dashboard(user, names):
+    titles, _ = names
+    user.client.get("/dashboard")  # fill the snapshot cache
+    assert user.client.post("/update_selected_titles", json={"title": titles[0], "action": "add"}).status_code == 200
+    assert titles[0] in user.client.get("/dashboard").get_data(as_text=True)
+    assert user.client.post("/update_selected_titles", json={"title": titles[0], "action": "remove"}).status_code == 200
+    assert titles[0] not in user.client.get("/dashboard").get_data(as_text=True)
+    assert user.client.post("/update_selected_titles", json={"title": "Old Title", "action": "add"}).status_code == 400
+
+
+def test_stale_pick_can_be_removed(xp_app, user):
+    conn = xp_app.user_db(user.id)
+    conn.execute("INSERT INTO user_selections (user_id, kind, name, position) VALUES (?, 'title', 'Old Title', 1)",
+                 (user.id,))
+    conn.execute("INSERT INTO user_selections (user_id, kind, name, position) VALUES (?, 'badge', 'Old Badge', 1)",
+                 (user.id,))
+    xp_app.dashboard_cache.invalidate(user.id)
+    assert user.client.get("/dashboard").status_code == 200
+
+    response = user.client.post("/update_selected_titles", json={"title": "Old Title", "action": "remove"})
+    assert response.status_code == 200
+    response = user.client.post("/api/selections", json=changes(("badge", "Old Badge", "remove")))
+    assert response.status_code == 200
+    assert response.get_json()["selected_titles"] == [] and response.get_json()["selected_badges"] == []
+
+
+def test_migration_moves_known_picks_in_order(tmp_path):
+    known = catalog.selectable_names()
+    titles, badge = known["title"][:2], known["badge"][0]
+    conn = sqlite3.connect(tmp_path / "legacy.db", isolation_level=None)
+    migrations.migrate(conn, target=7)
+    conn.executemany("INSERT INTO users (id, username, password) VALUES (?, ?, 'pw')", [(1, "a"), (2, "b"), (3, "c")])
+    conn.executemany("INSERT INTO selected_titles (user_id, selected_titles) VALUES (?, ?)", [
+        (1, json.dumps([titles[1], "Old Title", titles[0]])),
+        (2, "not json"),
+        (3, json.dumps({"title": titles[0]})),
+    ])
+    conn.execute("INSERT INTO selected_badges (user_id, selected_badges) VALUES (1, ?)", (json.dumps([badge, 7]),))
+    migrations.migrate(conn)
+
+    assert selections.selected(conn, 1, "title") == [titles[1], titles[0]]
+    assert selections.selected(conn, 1, "badge") == [badge]
+    assert conn.execute("SELECT COUNT(*) FROM user_selections WHERE user_id IN (2, 3)").fetchone() == (0,)
+    tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not tables & {"selected_titles", "selected_badges"}
@@ -0,0 +1,126 @@
+# === tests/test_shards.py ===
+# DATABASE_SHARDS: routing users on the hash ring, provisioning and rebalancing.
+import pytest
+
+import accounts
+import ledger
+import migrations
+import shards
+from db import ConnectionPool, ShardRouter, shard_paths
+
+
+@pytest.fixture
+def open_router(tmp_path):
+    routers = []
+
+    def open_router(count):
+        router = ShardRouter(str(tmp_path / "xp.db"), count)
+        for pool in router.pools():
+            migrations.migrate(pool.connection())
+        routers.append(router)
+        return router
+
+    yield open_router
+    for router in routers:
+        router.close_all()
+
+
+def owners(router, user_ids):
+    return {user_id: router.shard_index(user_id) for user_id in user_ids}
+
+
+def test_ring_spreads_users_evenly_and_moves_few(tmp_path):
+    user_ids = range(1, 6001)
+    three = owners(ShardRouter(str(tmp_path / "xp.db"), 3), user_ids)
+    assert three == owners(ShardRouter(str(tmp_path / "other.db"), 3), user_ids)
+    for index in range(3):
+        assert 0.25 < list(three.values()).count(index) / len(three) < 0.42
+
+    # Adding a fourth shard only moves users onto it, about a quarter of them
+    four = owners(ShardRouter(str(tmp_path / "xp.db"), 4), user_ids)
+    moved = [user_id for user_id in user_ids if four[user_id] != three[user_id]]
+    assert {four[user_id] for user_id in moved} == {3}
+    assert 0.15 < len(moved) / len(user_ids) < 0.35
+
+
+def test_unsharded_router_uses_one_database(tmp_path):
+    router = ShardRouter(str(tmp_path / "xp.db"))
+    assert not router.sharded
+    assert router.pool_for(42) is router.directory and router.user_pools() == [router.directory]
+    assert shard_paths(str(tmp_path / "xp.db"), 2) == [str(tmp_path / "xp.shard0.db"), str(tmp_path / "xp.shard1.db")]
+
+
+def test_provision_sharded(open_router):
+    router = open_router(3)
+    created = accounts.provision_sharded(router, [(f"user{i}", "pw", "UTC") for i in range(12)] + [("user0", "pw", None)])
+    assert len(created) == 12
+    directory = router.directory.connection()
+    assert directory.execute("SELECT COUNT(*) FROM users").fetchone() == (12,)
+    assert directory.execute("SELECT COUNT(*) FROM progress").fetchone() == (0,)
+    for username, user_id in created.items():
+        for index, pool in enumerate(router.shards):
+            conn = pool.connection()
+            rows = conn.execute("SELECT COUNT(*) FROM progress WHERE user_id = ?", (user_id,)).fetchone()[0]
+            account = conn.execute("SELECT username, password, timezone FROM users WHERE id = ?", (user_id,)).fetchone()
+            if index == router.shard_index(user_id):
+                assert rows == 16 and account == (username, "", "UTC")
+            else:
+                assert rows == 0 and account is None
+    # Taken usernames are skipped, as with one database
+    assert accounts.provision_sharded(router, [("user1", "pw", None)]) == {}
+
+
+def xp_by_user(pools):
+    totals = {}
+    for pool in pools:
+        for user_id, total in pool.connection().execute("SELECT user_id, SUM(xp) FROM xp_events GROUP BY user_id"):
+            totals[user_id] = totals.get(user_id, 0) + total
+    return totals
+
+
+def assert_placed(router, user_ids):
+    for user_id in user_ids:
+        for index, pool in enumerate(router.shards):
+            rows = pool.connection().execute("SELECT COUNT(*) FROM progress WHERE user_id = ?", (user_id,)).fetchone()[0]
+            assert rows == (16 if index == router.shard_index(user_id) else 0), (user_id, index)
+
+
+def test_rebalance_splits_then_shrinks(open_router, tmp_path):
+    single = open_router(0)
+    conn = single.directory.connection()
+    user_ids = list(accounts.provision_users(conn, [(f"user{i}", "pw", None) for i in range(30)]).values())
+    for user_id in user_ids:
+        ledger.apply(conn, user_id, "Strength", 10 * user_id)
+        ledger.apply(conn, user_id, "Logic", 5)
+    before = xp_by_user([single.directory])
+
+    # One database split into three shards
+    three = open_router(3)
+    batches = []
+    moved = shards.rebalance(three, batch_size=7, on_batch=batches.append)
+    assert sum(moved.values()) == 30 and batches[-1] == 30 and len(batches) == 5
+    assert_placed(three, user_ids)
+    assert three.directory.connection().execute("SELECT COUNT(*) FROM progress").fetchone() == (0,)
+    assert three.directory.connection().execute("SELECT COUNT(*) FROM users").fetchone() == (30,)
+    assert xp_by_user(three.shards) == before
+    assert shards.rebalance(three) == {}
+
+    # Three shards down to two: the third is drained into the others
+    two = open_router(2)
+    drained = ConnectionPool(shard_paths(str(tmp_path / "xp.db"), 3)[2])
+    try:
+        shards.rebalance(two, drained=[drained])
+        assert drained.connection().execute("SELECT COUNT(*) FROM users").fetchone() == (0,)
+        assert drained.connection().execute("SELECT COUNT(*) FROM xp_events").fetchone() == (0,)
+    finally:
+        drained.close_all()
+    assert_placed(two, user_ids)
+    assert xp_by_user(two.shards) == before
+    assert two.shards[two.shard_index(user_ids[-1])].connection().execute(
+        "SELECT level FROM progress WHERE user_id = ? AND skill = 'Strength'", (user_ids[-1],)).fetchone() == (3,)
+    assert shards.rebalance(two) == {}
+
+
+def test_rebalance_needs_shards(open_router):
+    with pytest.raises(ValueError):
+        shards.rebalance(open_router(0))
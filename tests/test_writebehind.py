@@ -0,0 +1,150 @@
+# === tests/test_writebehind.py ===
+# The write-behind XP buffer: projections, flushing, partial failures, and
+# /add_xp with XP_WRITE_BEHIND on.
+import time
+
+import pytest
+
+import accounts
+import ledger
+import migrations
+import writebehind
+from catalog import BADGES_PATH, TITLES_PATH, CatalogLoader
+from db import ConnectionPool
+
+CATALOG = CatalogLoader(TITLES_PATH, BADGES_PATH)
+
+
+@pytest.fixture
+def pools(tmp_path):
+    pools = [ConnectionPool(str(tmp_path / f"part{i}.db")) for i in range(2)]
+    for pool in pools:
+        migrations.migrate(pool.connection())
+    yield pools
+    for pool in pools:
+        pool.close_all()
+
+
+@pytest.fixture
+def users(pools):
+    """One user in each database; ``connect`` picks the database by user."""
+    first = accounts.provision_users(pools[0].connection(), [("a", "pw", None)])["a"]
+    # Ids come from one directory in production, so keep them apart here too
+    second = accounts.provision_users(pools[1].connection(), [("spare", "pw", None), ("b", "pw", None)])["b"]
+    return {first: pools[0], second: pools[1]}
+
+
+def start(buffer, users, catalog=CATALOG.get, on_flush=None):
+    # A long interval, so the tests decide when to flush
+    buffer.interval = 3600
+    buffer.start(lambda user_id: users[user_id].connection(), catalog, on_flush)
+    return buffer
+
+
+def stored(pool, user_id, skill):
+    return pool.connection().execute("SELECT level, xp FROM progress WHERE user_id = ? AND skill = ?",
+                                     (user_id, skill)).fetchone()
+
+
+def test_grants_are_projected_then_flushed(users):
+    (a, pool), = list(users.items())[:1]
+    flushed = []
+    buffer = start(writebehind.XPBuffer(), users, on_flush=flushed.extend)
+    try:
+        assert buffer.stamp(a) is None
+        assert buffer.grant(pool.connection(), a, "Strength", 150) == (1, 2, 50)
+        assert buffer.grant(pool.connection(), a, "Strength", 100) == (2, 2, 150)
+        assert buffer.grant(pool.connection(), a, "Juggling", 10) is None
+        stamp = buffer.stamp(a)
+        assert stamp is not None
+        assert stored(pool, a, "Strength") == (1, 0)
+        assert buffer.overlay(a, [("Strength", "Red", 0, 1), ("Logic", "Blue", 0, 1)]) == [
+            ("Strength", "Red", 150, 2), ("Logic", "Blue", 0, 1)]
+
+        assert buffer.flush() == 2
+        assert stored(pool, a, "Strength") == (2, 150)
+        # One ledger event per grant
+        assert pool.connection().execute("SELECT xp FROM xp_events WHERE user_id = ? ORDER BY id", (a,)).fetchall() \
+            == [(150,), (100,)]
+        assert buffer.stamp(a) is None and buffer.overlay(a, [("Strength", "Red", 0, 1)]) == [("Strength", "Red", 0, 1)]
+        assert [(t["skill"], t["old_level"], t["current_level"]) for t in flushed] == [("Strength", 1, 2)]
+        assert buffer.stats()["flushed_events"] == 2
+    finally:
+        buffer.close()
+
+
+def test_flush_keeps_writes_made_meanwhile(users):
+    (a, pool), = list(users.items())[:1]
+    buffer = start(writebehind.XPBuffer(), users)
+    try:
+        buffer.grant(pool.connection(), a, "Strength", 100)
+        ledger.apply(pool.connection(), a, "Strength", 40)  # e.g. an import in another process
+        buffer.flush()
+        assert stored(pool, a, "Strength") == (2, 40)
+    finally:
+        buffer.close()
+
+
+def test_partial_flush_failure_keeps_the_rest(users):
+    (a, first), (b, second) = users.items()
+    calls = []
+
+    def flaky_catalog():
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("catalog went away")
+        return CATALOG.get()
+
+    buffer = start(writebehind.XPBuffer(), users, catalog=flaky_catalog)
+    try:
+        buffer.grant(first.connection(), a, "Logic", 100)
+        buffer.grant(second.connection(), b, "Logic", 100)
+        with pytest.raises(RuntimeError):
+            buffer.flush()
+        assert stored(first, a, "Logic") == (2, 0) and stored(second, b, "Logic") == (1, 0)
+        stats = buffer.stats()
+        assert (stats["pending_events"], stats["flush_errors"]) == (1, 1)
+        # b's projection survives until their grant is written
+        assert buffer.overlay(b, [("Logic", "Blue", 0, 1)]) == [("Logic", "Blue", 0, 2)]
+        assert buffer.overlay(a, [("Logic", "Blue", 0, 1)]) == [("Logic", "Blue", 0, 1)]
+        assert buffer.flush() == 1
+        assert stored(second, b, "Logic") == (2, 0)
+    finally:
+        buffer.close()
+
+
+def test_max_events_wakes_the_flusher_and_close_writes_the_rest(users):
+    (a, pool), = list(users.items())[:1]
+    buffer = start(writebehind.XPBuffer(max_events=3), users)
+    try:
+        for _ in range(3):
+            buffer.grant(pool.connection(), a, "Speed", 10)
+        deadline = time.monotonic() + 5
+        while buffer.stats()["pending_events"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert stored(pool, a, "Speed") == (1, 30)
+        buffer.grant(pool.connection(), a, "Speed", 10)
+    finally:
+        buffer.close()
+    assert stored(pool, a, "Speed") == (1, 40)
+
+
+def test_add_xp_with_write_behind(xp_app, user, monkeypatch):
+    buffer = writebehind.XPBuffer()
+    buffer.interval = 3600
+    buffer.start(xp_app.user_db, xp_app.catalog_loader.get, xp_app.xp_flushed)
+    monkeypatch.setattr(xp_app, "xp_buffer", buffer)
+    monkeypatch.setitem(xp_app.app.config, "XP_WRITE_BEHIND", True)
+    try:
+        etag = user.client.get("/api/stats").headers["ETag"]
+        response = user.client.post("/add_xp", json={"skill": "Vitality", "xp": 100})
+        assert response.get_json()["current_level"] == 2
+        # Served from the projection before the flush, under a new validator
+        stats = user.client.get("/api/stats", headers={"If-None-Match": etag})
+        assert stats.status_code == 200
+        assert next(row for row in stats.get_json()["stats"] if row["skill"] == "Vitality")["level"] == 2
+        buffer.flush()
+        assert xp_app.user_db(user.id).execute(
+            "SELECT level FROM progress WHERE user_id = ? AND skill = 'Vitality'", (user.id,)).fetchone() == (2,)
+    finally:
+        buffer.close()
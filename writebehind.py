@@ -0,0 +1,191 @@
+# === writebehind.py ===
+# Optional write-behind for /add_xp and /delete_xp (XP_WRITE_BEHIND=1). A
+# grant is folded into an in-memory running total per (user, skill) and
+# answered right away with the level it will have; a background thread
+# writes everything accumulated so far in one transaction (one per shard
+# with DATABASE_SHARDS) every `interval` seconds, or sooner once
+# `max_events` grants are waiting. Five quick "+10 XP" taps then cost one
+# writer-lock acquisition instead of five.
+#
+# Each grant still becomes its own ledger event (with the change it actually
+# made and its own timestamp), and the flush goes through
+# ingest.apply_events(), which re-applies those changes to whatever the
+# progress rows hold at that point, so a concurrent import cannot be lost.
+#
+# Reads that show progress overlay the projected totals (overlay() and
+# stamp()), so a user sees their own grants before they are flushed. The
+# buffer is per process: with several workers, route each user to one
+# worker (see gunicorn.conf.py) or their projections may lag each other by
+# one flush. close() writes whatever is left, at exit and when gunicorn
+# stops a worker; a hard kill loses at most one interval of grants.
+import itertools
+import logging
+import threading
+from datetime import datetime, timezone
+
+import ingest
+import levels
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_SQL = "SELECT id, xp, level FROM progress WHERE user_id = ? AND skill = ?"
+
+
+class XPBuffer:
+    def __init__(self, interval=0.05, max_events=200):
+        self.interval = interval
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        # Serializes flushes, so close() waits for one already in progress
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._totals = {}   # {user_id: {skill: projected total XP}}
+        self._stamps = {}   # {user_id: sequence number of their latest buffered grant}
+        self._pending = []  # ledger entries (user_id, skill, xp, timestamp) not yet written
+        self._sequence = itertools.count(1)
+        self._counters = {"grants": 0, "flushes": 0, "flushed_events": 0, "flush_errors": 0}
+
+    def start(self, connect, catalog, on_flush=None):
+        """Start the flusher thread.
+
+        ``connect(user_id)`` returns the calling thread's connection to the
+        database holding the user's rows (see db.user_db), ``catalog()`` the
+        current title/badge catalog and ``on_flush`` is called with the level
+        transitions (see ingest.apply_events) of every flush.
+        """
+        self._connect, self._catalog, self._on_flush = connect, catalog, on_flush
+        self._thread = threading.Thread(target=self._run, name="xp-write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # flush() has put the grants back; they go out with the next one
+                logger.exception("XP write-behind flush failed")
+
+    def grant(self, conn, user_id, skill, amount):
+        """Buffer ``amount`` XP (negative to remove). Same result as ledger.apply().
+
+        Returns ``(old_level, level, xp)`` as it will be once flushed, or None
+        if the user has no such skill.
+        """
+        with self._lock:
+            total = self._totals.get(user_id, {}).get(skill)
+        if total is None:
+            # A plain read; WAL lets it run alongside the flusher's transaction
+            row = conn.execute(PROGRESS_SQL, (user_id, skill)).fetchone()
+            if row is None:
+                return None
+            total = levels.total_xp(row[2], row[1])
+        timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+        with self._lock:
+            # Another request may have buffered a grant while the row was read
+            total = self._totals.setdefault(user_id, {}).setdefault(skill, total)
+            new_total = levels.clamp_total(total + amount)
+            self._totals[user_id][skill] = new_total
+            self._stamps[user_id] = next(self._sequence)
+            if new_total != total:
+                self._pending.append((user_id, skill, new_total - total, timestamp))
+            self._counters["grants"] += 1
+            waiting = len(self._pending)
+        if waiting >= self.max_events:
+            self._wake.set()
+
+        old_level, _ = levels.from_total(total)
+        return (old_level, *levels.from_total(new_total))
+
+    def flush(self):
+        """Write every buffered grant, in one transaction per database. Returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+            if not entries:
+                return 0
+            groups = {}
+            for entry in entries:
+                conn = self._connect(entry[0])
+                groups.setdefault(id(conn), (conn, []))[1].append(entry)
+            groups = list(groups.values())
+            transitions, done, error = [], 0, None
+            try:
+                for conn, group in groups:
+                    transitions += ingest.apply_events(conn, group, self._catalog())["transitions"]
+                    done += 1
+            except BaseException as e:
+                error = e
+            written = [entry for _, group in groups[:done] for entry in group]
+            user_ids = {user_id for user_id, _, _, _ in written}
+            with self._lock:
+                if error is not None:
+                    # Groups that were not written go out with the next flush
+                    self._pending[:0] = [entry for _, group in groups[done:] for entry in group]
+                    self._counters["flush_errors"] += 1
+                # Keep the projections that have newer grants still waiting
+                waiting = {(user_id, skill) for user_id, skill, _, _ in self._pending}
+                for user_id in user_ids:
+                    skills = self._totals.get(user_id, {})
+                    for skill in [skill for skill in skills if (user_id, skill) not in waiting]:
+                        del skills[skill]
+                    if not skills:
+                        self._totals.pop(user_id, None)
+                        self._stamps.pop(user_id, None)
+                if written:
+                    self._counters["flushes"] += 1
+                    self._counters["flushed_events"] += len(written)
+            if transitions and self._on_flush:
+                self._on_flush(transitions)
+            if error is not None:
+                raise error
+            return len(written)
+
+    def forget(self, user_id):
+        """Drop a user's projections after their rows were written by another path.
+
+        Grants still waiting are flushed first, so nothing is lost.
+        """
+        with self._lock:
+            waiting = any(entry[0] == user_id for entry in self._pending)
+        if waiting:
+            self.flush()
+        with self._lock:
+            if not any(entry[0] == user_id for entry in self._pending):
+                self._totals.pop(user_id, None)
+                self._stamps.pop(user_id, None)
+
+    def overlay(self, user_id, rows):
+        """``(skill, category, xp, level)`` rows with the user's buffered grants applied."""
+        with self._lock:
+            totals = dict(self._totals.get(user_id, ()))
+        if not totals:
+            return rows
+        overlaid = []
+        for skill, category, xp, level in rows:
+            if skill in totals:
+                level, xp = levels.from_total(totals[skill])
+            overlaid.append((skill, category, xp, level))
+        return overlaid
+
+    def stamp(self, user_id):
+        """Changes with every buffered grant of the user; None when nothing is projected. For ETags."""
+        with self._lock:
+            return self._stamps.get(user_id)
+
+    def close(self, timeout=5.0):
+        """Stop the flusher and write whatever is left."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        if self._thread is not None:
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, pending_events=len(self._pending), projected_users=len(self._totals))